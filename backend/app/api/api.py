@@ -1,17 +1,23 @@
-import shutil
 import uuid
+import hashlib
 import os
-from typing import Optional
+import json
+from typing import List, Optional
 
-from fastapi import FastAPI, UploadFile, File, HTTPException, Query
+from fastapi import FastAPI, UploadFile, File, HTTPException, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
+from fastapi.responses import FileResponse, StreamingResponse
 from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 
 from backend.app.pipeline import main_pipeline
 from backend.app.modules.prediction import main_prediction
+from backend.app.modules.gps.location_store import LocationStore, SegmentCompactor
 from backend.app.core import config
+from backend.app.core.annotations import AnnotationRenderer
+from backend.app.core.report_store import ReportStore
+from backend.app.modules.objects.vocabulary import VOCABULARY_PROFILES
 
 class PredictionRequest(BaseModel):
     start_coords: tuple
@@ -25,6 +31,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 # Use config for paths
@@ -34,73 +41,365 @@ UPLOADS_DIR.mkdir(parents=True, exist_ok=True)
 
 app.mount("/static", StaticFiles(directory=str(STATIC_DIR)), name="static")
 
-REPORT_DATABASE = []
+report_store = ReportStore(config.REPORTS_DB_PATH)
+annotation_renderer = AnnotationRenderer(config.ANNOTATION_CACHE_DIR)
 
-PRIORITY_MAP = {
-    "CRITICAL": 0,
-    "HIGH": 1,
-    "MEDIUM": 2,
-    "LOW": 3,
-    "UNKNOWN": 4
-}
+location_compactor = SegmentCompactor(
+    LocationStore(str(config.LOCATION_DB_DIR)),
+    interval=config.LOCATION_COMPACTION_INTERVAL,
+    max_segments=config.LOCATION_MAX_SEGMENTS,
+    max_dead_fraction=config.LOCATION_MAX_DEAD_FRACTION,
+    index_type=config.GPS_INDEX_TYPE
+)
+
+@app.on_event("startup")
+async def start_workers():
+    if config.USE_WORKER_POOL:
+        main_pipeline.start_worker_pool()
+    location_compactor.start()
+
+@app.on_event("shutdown")
+async def stop_workers():
+    location_compactor.stop()
+    annotation_renderer.shutdown()
+    main_pipeline.stop_worker_pool()
 
 @app.get("/")
 async def health_check():
     return {"status": "online", "system": "Roya"}
 
-@app.post("/analyze")
-async def analyze_image(file: UploadFile = File(...)):
+def save_upload(file: UploadFile) -> str:
+    """
+    Stores an upload under the SHA-256 of its bytes, so re-uploads and
+    retries of the same evidence map to the same file (and cache entries).
+    """
+    file_extension = os.path.splitext(file.filename)[1].lower()
+    tmp_path = UPLOADS_DIR / f".{uuid.uuid4()}.part"
+    digest = hashlib.sha256()
+
     try:
-        file_extension = os.path.splitext(file.filename)[1]
-        unique_filename = f"{uuid.uuid4()}{file_extension}"
-        file_path = UPLOADS_DIR / unique_filename
+        with open(tmp_path, "wb") as buffer:
+            for chunk in iter(lambda: file.file.read(1 << 20), b""):
+                digest.update(chunk)
+                buffer.write(chunk)
+    except Exception:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+    unique_filename = f"{digest.hexdigest()}{file_extension}"
+    os.replace(tmp_path, UPLOADS_DIR / unique_filename)
+    return unique_filename
+
+def upload_digest(unique_filename: str) -> str:
+    # save_upload names files after their SHA-256, so the pipeline need not hash them again
+    return os.path.splitext(unique_filename)[0]
+
+def _split_values(value: Optional[str]) -> Optional[List[str]]:
+    return [v.strip() for v in value.split(",") if v.strip()] if value else None
 
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+def _check_vocabulary(vocabulary: Optional[str]):
+    if vocabulary is not None and vocabulary not in VOCABULARY_PROFILES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown vocabulary profile: {vocabulary} (choose from {', '.join(VOCABULARY_PROFILES)})"
+        )
+
+def image_urls(unique_filename: str, report_id: str, image_index: Optional[int] = None) -> dict:
+    # The annotated image is rendered from the report's detections when first requested
+    annotated_path = report_id if image_index is None else f"{report_id}/{image_index}"
+    return {
+        "image_url": f"http://localhost:8000/static/uploads/{unique_filename}",
+        "annotated_image_url": f"http://localhost:8000/annotated/{annotated_path}"
+    }
+
+def annotation_sources(report: dict) -> List[tuple]:
+    """(image path, detections or None) for every image of a single, batch or video report."""
+    images = report["images"] if "images" in report else [report]
+    sources = []
+    for image in images:
+        detections = image.get("modules", {}).get("object_detection", {}).get("detections")
+        sources.append((image.get("target_image"), detections if isinstance(detections, list) else None))
+    return sources
+
+def store_report(result: dict) -> dict:
+    result["processed_at"] = result.get("timestamp")
+    report_store.add(result)
+    if config.ANNOTATION_PRERENDER:
+        for image_path, detections in annotation_sources(result):
+            if image_path and detections is not None:
+                annotation_renderer.prerender(image_path, detections)
+    return result
+
+def finalize_report(result: dict, unique_filename: str) -> dict:
+    result["report_id"] = str(uuid.uuid4())
+    result.update(image_urls(unique_filename, result["report_id"]))
+    result.setdefault("language", "ar")
+    return store_report(result)
+
+def sse_event(event: str, payload) -> str:
+    return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+@app.post("/analyze")
+async def analyze_image(
+    file: UploadFile = File(...),
+    use_cache: bool = Query(True, description="False re-runs every module"),
+    refresh: Optional[str] = Query(None, description="Comma-separated modules to re-run, e.g. reasoning"),
+    vocabulary: Optional[str] = Query(None, description="Object vocabulary profile: default, weapons, vehicles, people")
+):
+    _check_vocabulary(vocabulary)
+    try:
+        unique_filename = save_upload(file)
 
         # Pass string path to pipeline
-        result = await run_in_threadpool(main_pipeline.run_pipeline, str(file_path))
-
-        image_url = f"http://localhost:8000/static/uploads/{unique_filename}"
-        annotated_filename = f"{os.path.splitext(unique_filename)[0]}_annotated.jpg"
-        annotated_image_url = f"http://localhost:8000/static/uploads/{annotated_filename}"
-        
-        result["image_url"] = image_url
-        result["annotated_image_url"] = annotated_image_url
+        result = await run_in_threadpool(
+            main_pipeline.run_pipeline,
+            str(UPLOADS_DIR / unique_filename),
+            use_cache=use_cache,
+            refresh=_split_values(refresh),
+            vocabulary=vocabulary,
+            image_hash=upload_digest(unique_filename)
+        )
+
+        return finalize_report(result, unique_filename)
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
+
+@app.post("/analyze/batch")
+async def analyze_batch(files: List[UploadFile] = File(...)):
+    """
+    Analyses 1..BATCH_MAX_IMAGES stills of one incident with batched module
+    inference. Returns per-image results, one merged incident report and
+    throughput timings.
+    """
+    if not files:
+        raise HTTPException(status_code=400, detail="No images uploaded")
+    if len(files) > config.BATCH_MAX_IMAGES:
+        raise HTTPException(status_code=400, detail=f"At most {config.BATCH_MAX_IMAGES} images per batch")
+
+    try:
+        unique_filenames = [save_upload(file) for file in files]
+
+        result = await run_in_threadpool(
+            main_pipeline.run_batch_pipeline,
+            [str(UPLOADS_DIR / name) for name in unique_filenames]
+        )
+        if "error" in result:
+            raise HTTPException(status_code=500, detail=f"Analysis failed: {result['error']}")
+
         result["report_id"] = str(uuid.uuid4())
-        result["processed_at"] = result.get("timestamp")
-        result.setdefault("language", "ar")
+        for i, (image, name) in enumerate(zip(result["images"], unique_filenames)):
+            image.update(image_urls(name, result["report_id"], i))
 
-        REPORT_DATABASE.append(result)
+        return store_report(result)
 
-        return result
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
+
+@app.post("/analyze/video")
+async def analyze_video(file: UploadFile = File(...)):
+    """Analyses a CCTV clip: keyframes are sampled on scene change and run as one batch."""
+    try:
+        unique_filename = save_upload(file)
+
+        result = await run_in_threadpool(main_pipeline.run_video_pipeline, str(UPLOADS_DIR / unique_filename))
+        if "error" in result:
+            raise HTTPException(status_code=422, detail=f"Analysis failed: {result['error']}")
 
+        keyframe_dir = f"{os.path.splitext(unique_filename)[0]}_keyframes"
+        result["report_id"] = str(uuid.uuid4())
+        for i, image in enumerate(result["images"]):
+            image.update(image_urls(f"{keyframe_dir}/{os.path.basename(image['target_image'])}", result["report_id"], i))
+        result["video_url"] = f"http://localhost:8000/static/uploads/{unique_filename}"
+
+        return store_report(result)
+
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
 
-@app.get("/reports")
-async def get_reports(sort_by: Optional[str] = Query(None)):
-    if sort_by == "priority":
-        def get_priority(report):
-            modules = report.get("modules", {})
-            reasoning = modules.get("reasoning", {})
-            classification_data = reasoning.get("classification", {})
+@app.post("/analyze/stream")
+async def analyze_image_stream(
+    file: UploadFile = File(...),
+    use_cache: bool = Query(True, description="False re-runs every module"),
+    refresh: Optional[str] = Query(None, description="Comma-separated modules to re-run, e.g. reasoning"),
+    vocabulary: Optional[str] = Query(None, description="Object vocabulary profile: default, weapons, vehicles, people")
+):
+    """
+    Server-Sent Events variant of /analyze: one ``module`` event per module as
+    soon as it finishes, then a ``report`` event with the merged report (the
+    same body /analyze returns), or an ``error`` event.
+    """
+    _check_vocabulary(vocabulary)
+    try:
+        unique_filename = save_upload(file)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
+
+    def events():
+        # Sync generator: StreamingResponse iterates it in the threadpool
+        try:
+            for event, payload in main_pipeline.iter_pipeline(
+                str(UPLOADS_DIR / unique_filename), use_cache=use_cache, refresh=_split_values(refresh),
+                vocabulary=vocabulary, image_hash=upload_digest(unique_filename)
+            ):
+                if event == "report":
+                    payload = finalize_report(payload, unique_filename)
+                yield sse_event(event, payload)
+        except Exception as e:
+            yield sse_event("error", {"detail": f"Analysis failed: {str(e)}"})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+async def _annotated_image(report_id: str, image_index: int):
+    report = await run_in_threadpool(report_store.get, report_id)
+    if report is None:
+        raise HTTPException(status_code=404, detail="Report not found")
+    sources = annotation_sources(report)
+    if not 0 <= image_index < len(sources):
+        raise HTTPException(status_code=404, detail="Image not found in report")
+    image_path, detections = sources[image_index]
+    if not image_path or detections is None or not os.path.exists(image_path):
+        raise HTTPException(status_code=404, detail="No object detections to annotate")
+    try:
+        path = await run_in_threadpool(annotation_renderer.get, image_path, detections)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Annotation failed: {str(e)}")
+    return FileResponse(path, media_type="image/jpeg")
+
+@app.get("/annotated/{report_id}")
+async def get_annotated_image(report_id: str):
+    """The report's image with its object detections drawn, rendered on first request and cached."""
+    return await _annotated_image(report_id, 0)
+
+@app.get("/annotated/{report_id}/{image_index}")
+async def get_annotated_batch_image(report_id: str, image_index: int):
+    """One image of a batch or video report, annotated like /annotated/{report_id}."""
+    return await _annotated_image(report_id, image_index)
+
+@app.get("/annotations/cache")
+async def annotation_cache_status():
+    return {"prerender": config.ANNOTATION_PRERENDER, **annotation_renderer.stats()}
+
+@app.get("/workers")
+async def worker_status():
+    pool = main_pipeline.get_worker_pool()
+    return {"enabled": pool is not None, "modules": pool.stats() if pool else {}}
+
+@app.get("/objects/cascade")
+async def object_cascade_status():
+    """Escalation rate and per-tier timings of the object detection cascade (one worker's counters)."""
+    pool = main_pipeline.get_worker_pool()
+    if pool is None or not pool.serves("object_detection"):
+        return {"enabled": config.OBJECTS_CASCADE, "frames": 0}
+    return await run_in_threadpool(pool.call, "object_detection", op="cascade_stats")
+
+@app.get("/ocr/gate")
+async def ocr_gate_status():
+    """Skip rate and estimated time saved by the OCR text-presence gate (one worker's counters)."""
+    pool = main_pipeline.get_worker_pool()
+    if pool is None or not pool.serves("ocr_environment"):
+        return {"enabled": config.OCR_GATE, "images": 0}
+    return await run_in_threadpool(pool.call, "ocr_environment", op="gate_stats")
+
+@app.get("/biometrics/watchlist")
+async def biometrics_watchlist_status():
+    """Version, size and last reload of the watchlist (one worker's snapshot; workers poll independently)."""
+    pool = main_pipeline.get_worker_pool()
+    if pool is None or not pool.serves("biometrics"):
+        return {"reload_interval": config.BIOMETRICS_RELOAD_INTERVAL, "entries": None}
+    return await run_in_threadpool(pool.call, "biometrics", op="watchlist_status")
 
-            priority = "UNKNOWN"
-            if isinstance(classification_data, dict):
-                priority = classification_data.get("priority", "UNKNOWN")
-            elif isinstance(classification_data, str):
-                priority = classification_data
+@app.post("/biometrics/watchlist/reload")
+async def reload_biometrics_watchlist():
+    """Applies dataset changes now on one worker instead of waiting for its next poll."""
+    pool = main_pipeline.get_worker_pool()
+    if pool is None or not pool.serves("biometrics"):
+        raise HTTPException(status_code=503, detail="No biometrics workers running")
+    return await run_in_threadpool(pool.call, "biometrics", op="reload_watchlist")
 
-            return PRIORITY_MAP.get(priority.upper(), 99)
+@app.get("/pipeline/cache")
+async def pipeline_cache_status():
+    return {"module_versions": main_pipeline.MODULE_VERSIONS, **main_pipeline.get_pipeline_cache().stats()}
+
+@app.delete("/pipeline/cache")
+async def clear_pipeline_cache():
+    await run_in_threadpool(main_pipeline.get_pipeline_cache().clear)
+    return {"status": "cleared"}
+
+@app.get("/reasoning/cache")
+async def reasoning_cache_status():
+    from backend.app.modules.reasoning import main_reasoning
+    return {
+        "model": main_reasoning.get_reasoning_model().name,
+        "prompt_version": main_reasoning.PROMPT_VERSION,
+        **main_reasoning.cache_stats()
+    }
+
+@app.get("/reports")
+async def get_reports(
+    response: Response,
+    sort_by: Optional[str] = Query(None),
+    limit: int = Query(config.REPORTS_PAGE_SIZE, ge=1, le=config.REPORTS_MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor value from the previous page"),
+    priority: Optional[str] = Query(None, description="Comma-separated, e.g. CRITICAL,HIGH"),
+    threat_level: Optional[str] = Query(None, description="Comma-separated, e.g. HIGH"),
+    identity: Optional[str] = Query(None, description="Matched watchlist identity"),
+    since: Optional[str] = Query(None, description="ISO timestamp, inclusive"),
+    until: Optional[str] = Query(None, description="ISO timestamp, exclusive"),
+    bbox: Optional[str] = Query(None, description="min_lat,min_lng,max_lat,max_lng")
+):
+    """
+    One page of reports, oldest first or by priority. The body stays a plain
+    list; when more reports match, the cursor for the next page is returned
+    in the X-Next-Cursor header.
+    """
+    bounds = None
+    if bbox:
+        try:
+            bounds = tuple(float(v) for v in bbox.split(","))
+        except ValueError:
+            bounds = ()
+        if len(bounds) != 4:
+            raise HTTPException(status_code=400, detail="bbox must be min_lat,min_lng,max_lat,max_lng")
+
+    try:
+        reports, next_cursor = await run_in_threadpool(
+            report_store.query,
+            sort_by=sort_by,
+            limit=limit,
+            cursor=cursor,
+            priority=_split_values(priority),
+            threat_level=_split_values(threat_level),
+            identity=identity,
+            since=since,
+            until=until,
+            bbox=bounds
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-        return sorted(REPORT_DATABASE, key=get_priority)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return reports
 
-    return REPORT_DATABASE
+@app.get("/reports/{report_id}")
+async def get_report(report_id: str):
+    report = await run_in_threadpool(report_store.get, report_id)
+    if report is None:
+        raise HTTPException(status_code=404, detail="Report not found")
+    return report
 
 @app.delete("/reports")
 async def clear_reports():
-    REPORT_DATABASE.clear()
+    await run_in_threadpool(report_store.clear)
     return {"status": "cleared", "message": "Report database has been reset"}
 
 @app.post("/predict")
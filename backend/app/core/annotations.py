@@ -0,0 +1,148 @@
+import os
+import time
+import json
+import hashlib
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+THREAT_COLOR = (0, 0, 255)
+# Ultralytics' default box palette (BGR), indexed by a hash of the label
+PALETTE = [
+    (56, 56, 255), (151, 157, 255), (31, 112, 255), (29, 178, 255), (49, 210, 207), (10, 249, 72),
+    (23, 204, 146), (134, 219, 61), (52, 147, 26), (187, 212, 0), (168, 153, 44), (255, 194, 0),
+    (147, 69, 52), (255, 115, 100), (236, 24, 0), (255, 56, 132), (133, 0, 82), (255, 56, 203),
+    (200, 149, 255), (199, 55, 255)
+]
+
+
+def _color(label: str) -> tuple:
+    return PALETTE[int(hashlib.md5(label.encode("utf-8")).hexdigest(), 16) % len(PALETTE)]
+
+
+def render_annotation(image: Union[str, np.ndarray], detections: List[Dict], output_path: str) -> str:
+    """
+    Draws detection boxes (the `detections` list of an object detection
+    result) on a BGR array or image file and writes the JPEG atomically to
+    output_path. Labels use label_en, since OpenCV cannot draw Arabic text;
+    threat-tagged boxes are red.
+    """
+    canvas = cv2.imread(str(image)) if isinstance(image, (str, Path)) else image.copy()
+    if canvas is None:
+        raise ValueError(f"Could not read image: {image}")
+
+    line_width = max(round(sum(canvas.shape[:2]) / 2 * 0.003), 2)
+    font_scale = line_width / 3
+    thickness = max(line_width - 1, 1)
+    for det in detections:
+        box = det["box"]
+        label = det.get("label_en") or str(det.get("label", ""))
+        color = THREAT_COLOR if det.get("threat_tag") else _color(label)
+        p1, p2 = (int(box["x1"]), int(box["y1"])), (int(box["x2"]), int(box["y2"]))
+        cv2.rectangle(canvas, p1, p2, color, thickness=line_width, lineType=cv2.LINE_AA)
+
+        text = f"{label} {det.get('confidence', 0):.2f}"
+        (w, h), _ = cv2.getTextSize(text, 0, fontScale=font_scale, thickness=thickness)
+        outside = p1[1] >= h + 3
+        p3 = (p1[0] + w, p1[1] - h - 3 if outside else p1[1] + h + 3)
+        cv2.rectangle(canvas, p1, p3, color, -1, cv2.LINE_AA)
+        cv2.putText(canvas, text, (p1[0], p1[1] - 2 if outside else p1[1] + h + 2), 0, font_scale,
+                    (255, 255, 255), thickness=thickness, lineType=cv2.LINE_AA)
+
+    tmp_path = f"{output_path}.{threading.get_ident()}.tmp.jpg"
+    if not cv2.imwrite(tmp_path, canvas):
+        raise ValueError(f"Could not write annotated image: {output_path}")
+    os.replace(tmp_path, output_path)
+    return output_path
+
+
+class AnnotationRenderer:
+    """
+    Annotated copies of analysed images, rendered from their stored
+    detection boxes instead of during analysis. `get` renders on first
+    request; `prerender` queues the same work on a background thread.
+    Outputs are cached under cache_dir by image path and detections, so a
+    report is rendered at most once and a changed result gets a new file.
+    Concurrent requests for one image share a single render.
+    """
+
+    def __init__(self, cache_dir: str, workers: int = 1):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="annotation")
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self.rendered = 0
+        self.cache_hits = 0
+        self.render_ms = 0.0
+
+    def cache_path(self, image_path: str, detections: List[Dict]) -> Path:
+        key = hashlib.sha256(json.dumps([os.path.abspath(image_path), detections], sort_keys=True).encode("utf-8"))
+        return self.cache_dir / f"{key.hexdigest()[:32]}.jpg"
+
+    def _claim(self, key: str):
+        # The in-flight render for `key`, and whether the caller has to perform it
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                return future, False
+            future = Future()
+            self._inflight[key] = future
+            return future, True
+
+    def _render(self, future: Future, path: Path, image_path: str, detections: List[Dict]):
+        start = time.perf_counter()
+        try:
+            render_annotation(image_path, detections, str(path))
+            with self._lock:
+                self.rendered += 1
+                self.render_ms += (time.perf_counter() - start) * 1000
+            future.set_result(path)
+        except Exception as e:
+            logger.error(f"Could not render annotation for {image_path}: {e}")
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                self._inflight.pop(str(path), None)
+
+    def get(self, image_path: str, detections: List[Dict]) -> Path:
+        """Path of the annotated image, rendering it now (or waiting for a queued render) if needed."""
+        path = self.cache_path(image_path, detections)
+        if path.exists():
+            with self._lock:
+                self.cache_hits += 1
+            return path
+        future, owner = self._claim(str(path))
+        if owner:
+            self._render(future, path, image_path, detections)
+        return future.result()
+
+    def prerender(self, image_path: str, detections: List[Dict]) -> Optional[Future]:
+        """Queues a background render unless the image is cached or already being rendered."""
+        path = self.cache_path(image_path, detections)
+        if path.exists():
+            return None
+        future, owner = self._claim(str(path))
+        if owner:
+            self._executor.submit(self._render, future, path, image_path, detections)
+        return future
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "cache_dir": str(self.cache_dir),
+                "rendered": self.rendered,
+                "cache_hits": self.cache_hits,
+                "in_flight": len(self._inflight),
+                "avg_render_ms": round(self.render_ms / self.rendered, 1) if self.rendered else 0.0
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
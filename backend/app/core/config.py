@@ -21,7 +21,105 @@ INPUTS_DIR = DATA_DIR / "inputs"
 STATIC_DIR = DATA_DIR / "static"
 OUTPUT_JSON_PATH = DATA_DIR / "output.json"
 DATABASE_CACHE_PATH = DATA_DIR / "database_cache.pkl"
+LOCATION_DB_DIR = DATA_DIR / "location_db"
 DATA_TYPES_PATH = DATA_DIR / "data_types.json"
+REPORTS_DB_PATH = Path(os.environ.get("ROYA_REPORTS_DB", str(DATA_DIR / "reports.sqlite3")))
+
+# Location search index: "brute" (exact), "ivf" or "graph"; effort tunes recall vs latency
+GPS_INDEX_TYPE = os.environ.get("ROYA_GPS_INDEX", "brute")
+GPS_SEARCH_EFFORT = int(os.environ["ROYA_GPS_EFFORT"]) if os.environ.get("ROYA_GPS_EFFORT") else None
+# Location database builds: images per ResNet batch and decode/preprocess workers
+GPS_BUILD_BATCH_SIZE = int(os.environ.get("ROYA_GPS_BATCH_SIZE", "32"))
+GPS_BUILD_WORKERS = int(os.environ.get("ROYA_GPS_BUILD_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Background compaction of appended location segments (seconds between checks, segment threshold,
+# and tombstones as a fraction of the base segment's rows)
+LOCATION_COMPACTION_INTERVAL = float(os.environ.get("ROYA_GPS_COMPACT_INTERVAL", "60"))
+LOCATION_MAX_SEGMENTS = int(os.environ.get("ROYA_GPS_MAX_SEGMENTS", "4"))
+LOCATION_MAX_DEAD_FRACTION = float(os.environ.get("ROYA_GPS_MAX_DEAD_FRACTION", "0.05"))
+
+# Resident worker pool: number of warm processes per pipeline module
+USE_WORKER_POOL = os.environ.get("ROYA_WORKER_POOL", "1") == "1"
+WORKER_POOL_SIZES = {
+    "GPS": int(os.environ.get("ROYA_GPS_WORKERS", "1")),
+    "biometrics": int(os.environ.get("ROYA_BIOMETRICS_WORKERS", "1")),
+    "object_detection": int(os.environ.get("ROYA_OBJECTS_WORKERS", "1")),
+    "ocr_environment": int(os.environ.get("ROYA_OCR_WORKERS", "1")),
+    "cctv_retrieval": int(os.environ.get("ROYA_CCTV_WORKERS", "1")),
+}
+WORKER_TIMEOUT_SECONDS = float(os.environ.get("ROYA_WORKER_TIMEOUT", "300"))
+
+# Multi-image analysis: most images per request and images per YOLO forward pass
+BATCH_MAX_IMAGES = int(os.environ.get("ROYA_BATCH_MAX_IMAGES", "64"))
+OBJECTS_BATCH_SIZE = int(os.environ.get("ROYA_OBJECTS_BATCH_SIZE", "8"))
+
+# Whole-pipeline cache of per-module results keyed by image content hash
+PIPELINE_CACHE_SIZE = int(os.environ.get("ROYA_PIPELINE_CACHE_SIZE", "2048"))
+PIPELINE_CACHE_TTL = float(os.environ.get("ROYA_PIPELINE_CACHE_TTL", "604800"))
+PIPELINE_CACHE_DIR = os.environ.get("ROYA_PIPELINE_CACHE_DIR") or None
+
+# /reports page size (default and upper bound)
+REPORTS_PAGE_SIZE = int(os.environ.get("ROYA_REPORTS_PAGE_SIZE", "100"))
+REPORTS_MAX_PAGE_SIZE = int(os.environ.get("ROYA_REPORTS_MAX_PAGE_SIZE", "1000"))
+
+# Object detection cascade: a small screen model decides whether the heavy
+# YOLO-World + TTA pass is needed (on persons / high-threat candidates). Off by default: the stock
+# COCO screen has no firearm class, so a weapon without a visible person is never escalated; a
+# YOLO-World screen checkpoint (prompted with the escalation labels) avoids that
+OBJECTS_CASCADE = os.environ.get("ROYA_OBJECTS_CASCADE", "0") == "1"
+OBJECTS_SCREEN_MODEL = os.environ.get("ROYA_OBJECTS_SCREEN_MODEL", str(MODELS_DIR / "yolov8n.pt"))
+OBJECTS_SCREEN_IMGSZ = int(os.environ.get("ROYA_OBJECTS_SCREEN_IMGSZ", "640"))
+OBJECTS_SCREEN_CONF = float(os.environ.get("ROYA_OBJECTS_SCREEN_CONF", "0.25"))
+# Sliced inference for the heavy model: frames whose long side exceeds OBJECTS_TILE_MIN_SIDE are cut
+# into OBJECTS_TILE_SIZE tiles overlapping by OBJECTS_TILE_OVERLAP (fraction of a tile) and run as
+# one batch with a whole-frame view (0 disables). OBJECTS_TILE_THREADS caps torch CPU threads (0: torch default)
+OBJECTS_TILE_SIZE = int(os.environ.get("ROYA_OBJECTS_TILE_SIZE", "0"))
+OBJECTS_TILE_OVERLAP = float(os.environ.get("ROYA_OBJECTS_TILE_OVERLAP", "0.2"))
+OBJECTS_TILE_MIN_SIDE = int(os.environ.get("ROYA_OBJECTS_TILE_MIN_SIDE", "2560"))
+OBJECTS_TILE_THREADS = int(os.environ.get("ROYA_OBJECTS_TILE_THREADS", "0"))
+
+# OCR text-presence gate: frames below either threshold skip PaddleOCR
+OCR_GATE = os.environ.get("ROYA_OCR_GATE", "1") == "1"
+OCR_GATE_MIN_EDGE_DENSITY = float(os.environ.get("ROYA_OCR_GATE_MIN_EDGE_DENSITY", "0.002"))
+OCR_GATE_MIN_TEXT_REGIONS = int(os.environ.get("ROYA_OCR_GATE_MIN_TEXT_REGIONS", "6"))
+# JSON {category: [keywords]} used to tag OCR text; built-in lists when the file is absent
+OCR_KEYWORDS_PATH = os.environ.get("ROYA_OCR_KEYWORDS", str(DATA_DIR / "ocr_keywords.json"))
+
+# Watchlist matching: largest face distance counted as a match, and ranked candidates kept per face
+BIOMETRICS_TOLERANCE = float(os.environ.get("ROYA_BIOMETRICS_TOLERANCE", "0.6"))
+BIOMETRICS_TOP_K = int(os.environ.get("ROYA_BIOMETRICS_TOP_K", "3"))
+# Watchlist search: "brute" (exact matrix scan), or an approximate "ivf" / "graph" index persisted
+# in the dataset directory and used once the watchlist has at least BIOMETRICS_INDEX_MIN_ENTRIES rows
+BIOMETRICS_INDEX_TYPE = os.environ.get("ROYA_BIOMETRICS_INDEX", "brute")
+BIOMETRICS_INDEX_MIN_ENTRIES = int(os.environ.get("ROYA_BIOMETRICS_INDEX_MIN_ENTRIES", "50000"))
+BIOMETRICS_SEARCH_EFFORT = int(os.environ["ROYA_BIOMETRICS_EFFORT"]) if os.environ.get("ROYA_BIOMETRICS_EFFORT") else None
+# Seconds between watchlist polls for added/changed/removed images and metadata.json edits (0 disables)
+BIOMETRICS_RELOAD_INTERVAL = float(os.environ.get("ROYA_BIOMETRICS_RELOAD_INTERVAL", "10"))
+# Face detection cascade: biometrics waits for object detection and runs HOG only inside person
+# boxes (at least BIOMETRICS_PERSON_MIN_CONF), each padded by a fraction of its size; frames
+# without a person fall back to a full-frame scan. Off by default: it delays face matching behind
+# the whole object detection call, so enable it only where the benchmark shows a pipeline win
+BIOMETRICS_PERSON_CASCADE = os.environ.get("ROYA_BIOMETRICS_PERSON_CASCADE", "0") == "1"
+BIOMETRICS_PERSON_MIN_CONF = float(os.environ.get("ROYA_BIOMETRICS_PERSON_MIN_CONF", "0.25"))
+BIOMETRICS_PERSON_PADDING = float(os.environ.get("ROYA_BIOMETRICS_PERSON_PADDING", "0.15"))
+
+# Annotated images are rendered from stored detection boxes on first request to /annotated/... and
+# cached here, off the analysis path; ANNOTATION_PRERENDER also queues them on a background thread
+ANNOTATION_CACHE_DIR = Path(os.environ.get("ROYA_ANNOTATION_CACHE_DIR", str(DATA_DIR / "annotated")))
+ANNOTATION_PRERENDER = os.environ.get("ROYA_ANNOTATION_PRERENDER", "0") == "1"
+
+# Video ingestion: frames inspected per second, scene-change threshold (0..1),
+# longest stretch without a keyframe, and a hard cap on keyframes per clip
+VIDEO_SAMPLE_FPS = float(os.environ.get("ROYA_VIDEO_SAMPLE_FPS", "2"))
+VIDEO_CHANGE_THRESHOLD = float(os.environ.get("ROYA_VIDEO_CHANGE_THRESHOLD", "0.08"))
+VIDEO_MAX_GAP_SECONDS = float(os.environ.get("ROYA_VIDEO_MAX_GAP", "30"))
+VIDEO_MAX_KEYFRAMES = int(os.environ.get("ROYA_VIDEO_MAX_KEYFRAMES", "120"))
+
+# Reasoning engine: "gemini" or "stub" (offline rule-based model), plus its result cache
+REASONING_BACKEND = os.environ.get("ROYA_REASONING_BACKEND", "gemini")
+REASONING_CACHE_SIZE = int(os.environ.get("ROYA_REASONING_CACHE_SIZE", "512"))
+REASONING_CACHE_TTL = float(os.environ.get("ROYA_REASONING_CACHE_TTL", "86400"))
+# Set to persist cached analyses across restarts, e.g. backend/data/reasoning_cache
+REASONING_CACHE_DIR = os.environ.get("ROYA_REASONING_CACHE_DIR") or None
 
 # Ensure directories exist
 DATA_DIR.mkdir(parents=True, exist_ok=True)
@@ -0,0 +1,240 @@
+import os
+import json
+import base64
+import sqlite3
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_MAP = {
+    "CRITICAL": 0,
+    "HIGH": 1,
+    "MEDIUM": 2,
+    "LOW": 3,
+    "UNKNOWN": 4
+}
+
+THREAT_LEVELS = ["LOW", "MEDIUM", "HIGH", "CRITICAL"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS reports (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    report_id TEXT NOT NULL UNIQUE,
+    created_at TEXT,
+    priority TEXT NOT NULL,
+    priority_rank INTEGER NOT NULL,
+    threat_level TEXT,
+    lat REAL,
+    lng REAL,
+    body TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_reports_priority ON reports (priority_rank, id);
+CREATE INDEX IF NOT EXISTS idx_reports_created ON reports (created_at, id);
+CREATE INDEX IF NOT EXISTS idx_reports_threat ON reports (threat_level, id);
+CREATE INDEX IF NOT EXISTS idx_reports_location ON reports (lat, lng);
+CREATE TABLE IF NOT EXISTS report_identities (
+    identity TEXT NOT NULL,
+    report_pk INTEGER NOT NULL REFERENCES reports (id) ON DELETE CASCADE,
+    PRIMARY KEY (identity, report_pk)
+) WITHOUT ROWID;
+"""
+
+
+def _reasoning(report: Dict) -> Dict:
+    reasoning = report.get("modules", {}).get("reasoning") or report.get("incident", {}).get("reasoning") or {}
+    return reasoning if isinstance(reasoning, dict) else {}
+
+
+def _image_modules(report: Dict) -> List[Dict]:
+    # Single-image reports keep modules at the top level; batch/video reports per image
+    if "images" in report:
+        return [image.get("modules", {}) for image in report["images"]]
+    return [report.get("modules", {})]
+
+
+def report_priority(report: Dict) -> Tuple[str, int]:
+    classification_data = _reasoning(report).get("classification", {})
+
+    priority = "UNKNOWN"
+    if isinstance(classification_data, dict):
+        priority = classification_data.get("priority", "UNKNOWN")
+    elif isinstance(classification_data, str):
+        priority = classification_data
+
+    priority = str(priority).upper()
+    return priority, PRIORITY_MAP.get(priority, 99)
+
+
+def extract_fields(report: Dict) -> Dict:
+    """Pulls the indexed columns out of a pipeline report (single image, batch or video)."""
+    priority, priority_rank = report_priority(report)
+
+    threat_level = None
+    lat = lng = None
+    identities = set()
+    for modules in _image_modules(report):
+        level = modules.get("object_detection", {}).get("summary", {}).get("threat_level")
+        if level in THREAT_LEVELS and (threat_level is None or THREAT_LEVELS.index(level) > THREAT_LEVELS.index(threat_level)):
+            threat_level = level
+
+        gps = modules.get("GPS", {})
+        if lat is None and gps.get("lat") is not None:
+            lat, lng = gps.get("lat"), gps.get("lng")
+
+        for match in modules.get("biometrics", {}).get("matches", []):
+            identity = match.get("identity") if isinstance(match, dict) else None
+            if identity and identity != "Unknown":
+                identities.add(identity)
+
+    location = report.get("incident", {}).get("context", {}).get("location")
+    if location:
+        lat, lng = location.get("lat"), location.get("lng")
+
+    return {
+        "report_id": report["report_id"],
+        "created_at": report.get("processed_at") or report.get("timestamp"),
+        "priority": priority,
+        "priority_rank": priority_rank,
+        "threat_level": threat_level,
+        "lat": float(lat) if lat is not None else None,
+        "lng": float(lng) if lng is not None else None,
+        "identities": sorted(identities)
+    }
+
+
+def encode_cursor(values: List) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values).encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> List:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except Exception:
+        raise ValueError("Malformed cursor")
+    if not isinstance(values, list) or not all(isinstance(v, int) for v in values):
+        raise ValueError("Malformed cursor")
+    return values
+
+
+class ReportStore:
+    """
+    SQLite-backed report history.
+
+    The full report is stored as JSON; priority, timestamp, threat level,
+    location and matched identities are copied into indexed columns so
+    listing, filtering and sorting never parse report bodies. Pages are
+    keyset-paginated on (sort key, id), so each page costs O(page size)
+    however many reports are stored. One connection per thread, WAL mode
+    so polling readers do not block the writer.
+    """
+
+    def __init__(self, path: str):
+        self.path = str(path)
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        with self._connection() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30.0)
+            conn.execute("PRAGMA foreign_keys=ON")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def add(self, report: Dict) -> Dict:
+        fields = extract_fields(report)
+        body = json.dumps(report, ensure_ascii=False, default=str)
+        with self._write_lock:
+            conn = self._connection()
+            with conn:
+                cursor = conn.execute(
+                    "INSERT INTO reports (report_id, created_at, priority, priority_rank, threat_level, lat, lng, body) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (fields["report_id"], fields["created_at"], fields["priority"], fields["priority_rank"],
+                     fields["threat_level"], fields["lat"], fields["lng"], body)
+                )
+                conn.executemany(
+                    "INSERT OR IGNORE INTO report_identities (identity, report_pk) VALUES (?, ?)",
+                    [(identity, cursor.lastrowid) for identity in fields["identities"]]
+                )
+        return report
+
+    def get(self, report_id: str) -> Optional[Dict]:
+        row = self._connection().execute("SELECT body FROM reports WHERE report_id = ?", (report_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def query(self, sort_by: Optional[str] = None, limit: int = 100, cursor: Optional[str] = None,
+              priority: Optional[List[str]] = None, threat_level: Optional[List[str]] = None,
+              identity: Optional[str] = None, since: Optional[str] = None, until: Optional[str] = None,
+              bbox: Optional[Tuple[float, float, float, float]] = None) -> Tuple[List[Dict], Optional[str]]:
+        """
+        One page of reports in insertion order, or by priority then insertion
+        order with sort_by="priority". Returns (reports, next_cursor); pass
+        next_cursor back to continue, it is None on the last page.
+        `bbox` is (min_lat, min_lng, max_lat, max_lng).
+        """
+        where, params = [], []
+        if priority:
+            where.append(f"r.priority IN ({','.join('?' * len(priority))})")
+            params.extend(p.upper() for p in priority)
+        if threat_level:
+            where.append(f"r.threat_level IN ({','.join('?' * len(threat_level))})")
+            params.extend(t.upper() for t in threat_level)
+        if identity:
+            where.append("r.id IN (SELECT report_pk FROM report_identities WHERE identity = ?)")
+            params.append(identity)
+        if since:
+            where.append("r.created_at >= ?")
+            params.append(since)
+        if until:
+            where.append("r.created_at < ?")
+            params.append(until)
+        if bbox:
+            min_lat, min_lng, max_lat, max_lng = bbox
+            where.append("r.lat BETWEEN ? AND ? AND r.lng BETWEEN ? AND ?")
+            params.extend([min_lat, max_lat, min_lng, max_lng])
+
+        by_priority = sort_by == "priority"
+        if cursor:
+            values = decode_cursor(cursor)
+            if by_priority:
+                if len(values) != 2:
+                    raise ValueError("Cursor does not match sort order")
+                where.append("(r.priority_rank, r.id) > (?, ?)")
+            else:
+                if len(values) != 1:
+                    raise ValueError("Cursor does not match sort order")
+                where.append("r.id > ?")
+            params.extend(values)
+
+        order = "r.priority_rank, r.id" if by_priority else "r.id"
+        sql = "SELECT r.id, r.priority_rank, r.body FROM reports r"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += f" ORDER BY {order} LIMIT ?"
+        params.append(limit + 1)
+
+        rows = self._connection().execute(sql, params).fetchall()
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last_id, last_rank, _ = rows[-1]
+            next_cursor = encode_cursor([last_rank, last_id] if by_priority else [last_id])
+        return [json.loads(body) for _, _, body in rows], next_cursor
+
+    def count(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM reports").fetchone()[0]
+
+    def clear(self):
+        with self._write_lock:
+            conn = self._connection()
+            with conn:
+                conn.execute("DELETE FROM report_identities")
+                conn.execute("DELETE FROM reports")
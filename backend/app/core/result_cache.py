@@ -0,0 +1,144 @@
+import os
+import copy
+import json
+import shutil
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+def canonical_hash(payload, *parts) -> str:
+    """SHA-256 of a JSON payload serialised canonically (sorted keys, no whitespace) plus extra key parts."""
+    digest = hashlib.sha256()
+    digest.update(json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str).encode("utf-8"))
+    for part in parts:
+        digest.update(b"\x00")
+        digest.update(str(part).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    Thread-safe in-memory LRU cache with a per-entry TTL and an optional
+    on-disk JSON backend. Memory is bounded by max_entries (least recently
+    used entries are evicted first); disk entries are dropped lazily once
+    they expire. Values are copied in and out so callers may mutate them,
+    and must be JSON-serialisable when disk_dir is set.
+    """
+
+    def __init__(self, max_entries=1024, ttl_seconds=3600.0, disk_dir=None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.disk_dir = str(disk_dir) if disk_dir else None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+    def _expired(self, stored_at):
+        return self.ttl_seconds is not None and time.time() - stored_at > self.ttl_seconds
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, key[:2], f"{key}.json")
+
+    def _read_disk(self, key):
+        path = self._disk_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        if self._expired(entry["stored_at"]):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        return entry
+
+    def _write_disk(self, key, stored_at, value):
+        path = self._disk_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"stored_at": stored_at, "value": value}, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except (OSError, TypeError) as e:
+            logger.warning(f"Failed to persist cache entry {key}: {e}")
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry[0]):
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return copy.deepcopy(entry[1])
+
+        if self.disk_dir:
+            disk_entry = self._read_disk(key)
+            if disk_entry is not None:
+                with self._lock:
+                    self._store(key, disk_entry["stored_at"], copy.deepcopy(disk_entry["value"]))
+                    self.hits += 1
+                return disk_entry["value"]
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def _store(self, key, stored_at, value):
+        self._entries[key] = (stored_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def set(self, key, value):
+        stored_at = time.time()
+        value = copy.deepcopy(value)
+        with self._lock:
+            self._store(key, stored_at, value)
+        if self.disk_dir:
+            self._write_disk(key, stored_at, value)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+        if self.disk_dir:
+            try:
+                os.remove(self._disk_path(key))
+            except OSError:
+                pass
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self.disk_dir:
+            shutil.rmtree(self.disk_dir, ignore_errors=True)
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "disk_backend": self.disk_dir is not None
+            }
@@ -0,0 +1,135 @@
+import sys
+import time
+import logging
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+from typing import Dict, Optional
+
+import numpy as np
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+
+def load_rgb(image_path: str) -> Image.Image:
+    """
+    Decodes an image file upright, with its EXIF orientation applied as
+    cv2.imread does, so RGB (PIL) and BGR (OpenCV) consumers see the same
+    frame and share box coordinates.
+    """
+    with Image.open(image_path) as img:
+        return ImageOps.exif_transpose(img).convert("RGB")
+
+
+class SharedImage:
+    """
+    An upload decoded once into a named shared-memory block as an RGB uint8
+    array. `descriptor()` is a small JSON-serialisable dict that is sent to
+    pool workers instead of the pixels; workers map the same pages with
+    `open_shared_image`. The creator owns the block and must `release()` it
+    once every module has finished.
+    """
+
+    def __init__(self, shm: shared_memory.SharedMemory, shape, decode_ms: float, source: str):
+        self._shm = shm
+        self.shape = tuple(shape)
+        self.decode_ms = decode_ms
+        self.source = source
+        self.array = np.ndarray(self.shape, dtype=np.uint8, buffer=shm.buf)
+
+    @classmethod
+    def decode(cls, image_path: str) -> "SharedImage":
+        start = time.perf_counter()
+        # Same upright decode the modules' path fallbacks use (load_rgb here, cv2.imread for BGR models)
+        img = load_rgb(image_path)
+        width, height = img.size
+        shm = shared_memory.SharedMemory(create=True, size=max(1, width * height * 3))
+        try:
+            shared = cls(shm, (height, width, 3), 0.0, image_path)
+            shared.array[...] = np.asarray(img)
+        except Exception:
+            shm.close()
+            shm.unlink()
+            raise
+        shared.decode_ms = round((time.perf_counter() - start) * 1000, 2)
+        return shared
+
+    @property
+    def nbytes(self) -> int:
+        return int(np.prod(self.shape))
+
+    def descriptor(self) -> Dict:
+        return {"shm_name": self._shm.name, "shape": list(self.shape), "dtype": "uint8", "source": self.source}
+
+    def release(self):
+        if self._shm is None:
+            return
+        self.array = None
+        try:
+            self._shm.close()
+        except BufferError:
+            logger.debug(f"Shared image {self._shm.name} still has live views; unlinking anyway")
+        self._shm.unlink()
+        self._shm = None
+
+
+# Mappings whose close() failed because a caller still held a view; retried on the next open
+_deferred_close = []
+
+
+def _close_deferred():
+    for shm in list(_deferred_close):
+        try:
+            shm.close()
+            _deferred_close.remove(shm)
+        except BufferError:
+            pass
+
+
+@contextmanager
+def open_shared_image(descriptor: Dict, bgr: bool = False):
+    """
+    Maps a SharedImage descriptor in the current process and yields an
+    ndarray view of it, which callers must treat as read-only. With
+    bgr=True the yielded array is an RGB->BGR copy for OpenCV-convention
+    models. The view is only valid inside the block.
+    """
+    _close_deferred()
+    if sys.version_info >= (3, 13):
+        shm = shared_memory.SharedMemory(name=descriptor["shm_name"], track=False)
+    else:
+        shm = shared_memory.SharedMemory(name=descriptor["shm_name"])
+    view = np.ndarray(tuple(descriptor["shape"]), dtype=np.dtype(descriptor["dtype"]), buffer=shm.buf)
+    try:
+        yield np.ascontiguousarray(view[..., ::-1]) if bgr else view
+    finally:
+        del view
+        try:
+            shm.close()
+        except BufferError:
+            # The caller's `as` target still references the view
+            _deferred_close.append(shm)
+
+
+def image_io_report(shared: Optional[SharedImage], consumers: int, bgr_consumers: int = 0) -> Dict:
+    """
+    Per-request decode/copy accounting. `decodes` and `bytes_copied` are what
+    the shared buffer cost; `per_module_baseline` estimates the previous
+    behaviour, where each of `consumers` modules decoded the file itself.
+    """
+    if shared is None:
+        return {"mode": "path", "decodes": consumers}
+
+    return {
+        "mode": "shared",
+        "decode_ms": shared.decode_ms,
+        "decodes": 1,
+        "image_bytes": shared.nbytes,
+        # Only the descriptor crosses the pipe; BGR models get one channel-swapped copy each
+        "bytes_copied": shared.nbytes * bgr_consumers,
+        "per_module_baseline": {
+            "decodes": consumers,
+            "decode_ms": round(shared.decode_ms * consumers, 2),
+            "bytes_decoded": shared.nbytes * consumers
+        }
+    }
@@ -0,0 +1,399 @@
+"""
+Nearest-neighbour indexes over dense embedding matrices.
+
+Three interchangeable index types share one interface:
+
+* ``BruteForceIndex`` - exact scan, one matrix product per query batch.
+* ``IVFIndex`` - k-means partitions; ``effort`` is the number of lists probed.
+* ``GraphIndex`` - proximity graph walked with a beam search; ``effort`` is
+  the beam width.
+
+``metric`` is either ``"cosine"`` (scores are similarities, higher is better)
+or ``"l2"`` (scores are Euclidean distances, lower is better). Indexes persist
+to a single ``.npz`` file via ``save()`` / ``load_index()``. Callers that keep
+the vectors elsewhere (e.g. a memory-mapped store) can save the index without
+them and re-attach the same array on load, so the vectors are never copied.
+"""
+import heapq
+import logging
+import os
+import uuid
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+METRICS = ("cosine", "l2")
+
+
+def normalize_rows(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class VectorIndex:
+    kind = None
+
+    def __init__(self, vectors, metric="cosine", normalized=False):
+        if metric not in METRICS:
+            raise ValueError(f"Unsupported metric: {metric}")
+        self.metric = metric
+        # asarray keeps float32 memory maps as-is; pass normalized=True to skip the copy for cosine
+        vectors = np.asarray(vectors, dtype=np.float32)
+        self.vectors = normalize_rows(vectors) if metric == "cosine" and not normalized else vectors
+        self.sq_norms = (self.vectors * self.vectors).sum(axis=1) if metric == "l2" else None
+        self.fingerprint = ""
+
+    def __len__(self):
+        return len(self.vectors)
+
+    @property
+    def dim(self):
+        return self.vectors.shape[1]
+
+    def _prepare_queries(self, queries):
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        return normalize_rows(queries) if self.metric == "cosine" else queries
+
+    def _costs(self, ids, query):
+        # Lower is better for both metrics; converted back by _to_scores
+        block = self.vectors[ids]
+        dots = block @ query
+        if self.metric == "cosine":
+            return -dots
+        return self.sq_norms[ids] - 2.0 * dots + float(query @ query)
+
+    def _to_scores(self, costs):
+        if self.metric == "cosine":
+            return -costs
+        return np.sqrt(np.maximum(costs, 0.0))
+
+    def _top_k(self, ids, costs, k):
+        if len(ids) > k:
+            part = np.argpartition(costs, k - 1)[:k]
+            ids, costs = ids[part], costs[part]
+        order = np.argsort(costs, kind="stable")
+        return ids[order], costs[order]
+
+    def search(self, queries, k=1, effort=None):
+        """Returns (ids, scores) arrays of shape (n_queries, k), best match first; missing slots are -1 / nan."""
+        queries = self._prepare_queries(queries)
+        k = max(1, int(k))
+        all_ids = np.full((len(queries), k), -1, dtype=np.int64)
+        all_scores = np.full((len(queries), k), np.nan, dtype=np.float32)
+        for row, query in enumerate(queries):
+            ids, costs = self._search_one(query, k, effort)
+            all_ids[row, :len(ids)] = ids
+            all_scores[row, :len(ids)] = self._to_scores(costs)
+        return all_ids, all_scores
+
+    def _search_one(self, query, k, effort):
+        raise NotImplementedError
+
+    def _arrays(self):
+        return {}
+
+    def save(self, path, include_vectors=True):
+        # Unique per writer: several worker processes may save the same index at once
+        tmp_path = f"{path}.{os.getpid()}.{uuid.uuid4().hex}.tmp.npz"
+        arrays = self._arrays()
+        if include_vectors:
+            arrays["vectors"] = self.vectors
+        try:
+            np.savez(
+                tmp_path,
+                kind=np.array(self.kind),
+                metric=np.array(self.metric),
+                fingerprint=np.array(self.fingerprint),
+                **arrays
+            )
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    @classmethod
+    def _from_arrays(cls, data, vectors=None):
+        index = cls.__new__(cls)
+        index.metric = str(data["metric"])
+        index.vectors = data["vectors"] if vectors is None else vectors
+        index.sq_norms = (index.vectors * index.vectors).sum(axis=1) if index.metric == "l2" else None
+        index.fingerprint = str(data["fingerprint"])
+        return index
+
+
+class BruteForceIndex(VectorIndex):
+    kind = "brute"
+
+    def search(self, queries, k=1, effort=None):
+        queries = self._prepare_queries(queries)
+        k = max(1, min(int(k), len(self.vectors)))
+        dots = queries @ self.vectors.T
+        if self.metric == "cosine":
+            costs = -dots
+        else:
+            costs = self.sq_norms[None, :] - 2.0 * dots + (queries * queries).sum(axis=1)[:, None]
+        if k < costs.shape[1]:
+            part = np.argpartition(costs, k - 1, axis=1)[:, :k]
+        else:
+            part = np.tile(np.arange(costs.shape[1]), (len(queries), 1))
+        part_costs = np.take_along_axis(costs, part, axis=1)
+        order = np.argsort(part_costs, axis=1, kind="stable")
+        ids = np.take_along_axis(part, order, axis=1)
+        return ids, self._to_scores(np.take_along_axis(part_costs, order, axis=1))
+
+
+def _kmeans(vectors, n_clusters, metric, iterations=20, sample_size=100_000, seed=0):
+    rng = np.random.default_rng(seed)
+    sample = vectors
+    if len(vectors) > sample_size:
+        sample = vectors[rng.choice(len(vectors), sample_size, replace=False)]
+    centroids = sample[rng.choice(len(sample), n_clusters, replace=False)].copy()
+
+    for _ in range(iterations):
+        assign = _assign(sample, centroids, metric)
+        counts = np.bincount(assign, minlength=n_clusters)
+        filled = counts > 0
+        # Per-cluster sums in one pass over the sample sorted by cluster
+        order = np.argsort(assign, kind="stable")
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        sums = np.add.reduceat(sample[order], starts[filled], axis=0)
+        centroids[filled] = sums / counts[filled, None]
+        # Re-seed empty clusters on random points
+        centroids[~filled] = sample[rng.integers(len(sample), size=int((~filled).sum()))]
+        if metric == "cosine":
+            centroids = normalize_rows(centroids)
+    return centroids
+
+
+def _assign(vectors, centroids, metric, chunk_size=65_536):
+    assign = np.empty(len(vectors), dtype=np.int32)
+    c_norms = (centroids * centroids).sum(axis=1)
+    for start in range(0, len(vectors), chunk_size):
+        block = vectors[start:start + chunk_size]
+        dots = block @ centroids.T
+        costs = -dots if metric == "cosine" else c_norms[None, :] - 2.0 * dots
+        assign[start:start + chunk_size] = np.argmin(costs, axis=1)
+    return assign
+
+
+class IVFIndex(VectorIndex):
+    """
+    Inverted-file index: vectors bucketed by nearest k-means centroid.
+
+    With ``packed=True`` the index also keeps a copy of the vectors laid
+    out list by list, so a probe scores contiguous slices instead of
+    gathering scattered rows. That doubles vector memory for noticeably
+    lower latency on large indexes; the copy is rebuilt on load, not saved.
+    """
+    kind = "ivf"
+
+    def __init__(self, vectors, metric="cosine", normalized=False, nlist=None, nprobe=8, packed=False):
+        super().__init__(vectors, metric, normalized)
+        n = len(self.vectors)
+        nlist = nlist or max(1, int(np.sqrt(n)))
+        self.nlist = min(nlist, n)
+        self.nprobe = nprobe
+        self.centroids = _kmeans(self.vectors, self.nlist, metric)
+        assign = _assign(self.vectors, self.centroids, metric)
+        self.list_ids = np.argsort(assign, kind="stable").astype(np.int64)
+        self.offsets = np.searchsorted(assign[self.list_ids], np.arange(self.nlist + 1)).astype(np.int64)
+        self._pack(packed)
+
+    def _pack(self, packed):
+        self.centroid_sq_norms = (self.centroids * self.centroids).sum(axis=1)
+        self.packed = self.vectors[self.list_ids] if packed else None
+        self.packed_sq_norms = self.sq_norms[self.list_ids] if packed and self.metric == "l2" else None
+
+    def probe(self, query, nprobe):
+        dots = self.centroids @ query
+        costs = -dots if self.metric == "cosine" else self.centroid_sq_norms - 2.0 * dots
+        nprobe = min(max(1, int(nprobe)), self.nlist)
+        return np.argpartition(costs, nprobe - 1)[:nprobe]
+
+    def _packed_costs(self, lists, query):
+        ids, costs = [], []
+        query_sq = float(query @ query)
+        for c in lists:
+            start, end = self.offsets[c], self.offsets[c + 1]
+            if start == end:
+                continue
+            dots = self.packed[start:end] @ query
+            costs.append(-dots if self.metric == "cosine" else self.packed_sq_norms[start:end] - 2.0 * dots + query_sq)
+            ids.append(self.list_ids[start:end])
+        if not ids:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        return np.concatenate(ids), np.concatenate(costs)
+
+    def _search_one(self, query, k, effort):
+        lists = self.probe(query, effort or self.nprobe)
+        if self.packed is not None:
+            ids, costs = self._packed_costs(lists, query)
+            return self._top_k(ids, costs, k) if len(ids) else (ids, costs)
+        ids = np.concatenate([self.list_ids[self.offsets[c]:self.offsets[c + 1]] for c in lists])
+        if len(ids) == 0:
+            return ids, np.empty(0, dtype=np.float32)
+        return self._top_k(ids, self._costs(ids, query), k)
+
+    def _arrays(self):
+        return {
+            "nprobe": np.array(self.nprobe),
+            "packed": np.array(self.packed is not None),
+            "centroids": self.centroids,
+            "list_ids": self.list_ids,
+            "offsets": self.offsets,
+        }
+
+    @classmethod
+    def _from_arrays(cls, data, vectors=None):
+        index = super()._from_arrays(data, vectors)
+        index.nprobe = int(data["nprobe"])
+        index.centroids = data["centroids"]
+        index.list_ids = data["list_ids"]
+        index.offsets = data["offsets"]
+        index.nlist = len(index.centroids)
+        # Indexes saved before packing existed load unpacked
+        index._pack(bool(data["packed"]) if "packed" in data else False)
+        return index
+
+
+class GraphIndex(VectorIndex):
+    """
+    Fixed-degree proximity graph searched with a best-first beam.
+
+    The graph is built from approximate k-NN lists (found through a
+    temporary IVF partition), symmetrised and pruned to ``max_degree``
+    closest neighbours. Entry points are the nodes nearest each partition
+    centroid.
+    """
+    kind = "graph"
+
+    def __init__(self, vectors, metric="cosine", normalized=False, max_degree=16, ef_search=64, build_probe=4):
+        super().__init__(vectors, metric, normalized)
+        self.max_degree = max_degree
+        self.ef_search = ef_search
+        self._build(build_probe)
+
+    def _build(self, build_probe):
+        n = len(self.vectors)
+        degree = min(self.max_degree, max(n - 1, 1))
+        ivf = IVFIndex(self.vectors, self.metric, normalized=True, nprobe=build_probe)
+
+        src, dst, cost = [], [], []
+        for c in range(ivf.nlist):
+            members = ivf.list_ids[ivf.offsets[c]:ivf.offsets[c + 1]]
+            if len(members) == 0:
+                continue
+            lists = ivf.probe(ivf.centroids[c], build_probe)
+            cands = np.concatenate([ivf.list_ids[ivf.offsets[l]:ivf.offsets[l + 1]] for l in lists])
+            dots = self.vectors[members] @ self.vectors[cands].T
+            if self.metric == "cosine":
+                costs = -dots
+            else:
+                costs = self.sq_norms[cands][None, :] - 2.0 * dots + self.sq_norms[members][:, None]
+            costs[members[:, None] == cands[None, :]] = np.inf
+            take = min(degree, len(cands))
+            part = np.argpartition(costs, take - 1, axis=1)[:, :take]
+            src.append(np.repeat(members, take))
+            dst.append(cands[part].ravel())
+            cost.append(np.take_along_axis(costs, part, axis=1).ravel())
+
+        src = np.concatenate(src)
+        dst = np.concatenate(dst)
+        cost = np.concatenate(cost)
+        keep = np.isfinite(cost)
+        src, dst, cost = src[keep], dst[keep], cost[keep]
+
+        # Symmetrise, drop duplicate edges and keep the closest `degree` per node
+        src, dst, cost = np.concatenate([src, dst]), np.concatenate([dst, src]), np.concatenate([cost, cost])
+        order = np.lexsort((cost, dst, src))
+        src, dst, cost = src[order], dst[order], cost[order]
+        unique = np.ones(len(src), dtype=bool)
+        unique[1:] = (src[1:] != src[:-1]) | (dst[1:] != dst[:-1])
+        src, dst, cost = src[unique], dst[unique], cost[unique]
+        order = np.lexsort((cost, src))
+        src, dst = src[order], dst[order]
+        starts = np.searchsorted(src, np.arange(n))
+        rank = np.arange(len(src)) - starts[src]
+        keep = rank < degree
+
+        self.neighbors = np.full((n, degree), -1, dtype=np.int64)
+        self.neighbors[src[keep], rank[keep]] = dst[keep]
+
+        entry = []
+        for c in range(ivf.nlist):
+            members = ivf.list_ids[ivf.offsets[c]:ivf.offsets[c + 1]]
+            if len(members):
+                entry.append(members[np.argmin(self._costs(members, ivf.centroids[c]))])
+        self.entry_points = np.array(entry, dtype=np.int64)
+
+    def _search_one(self, query, k, effort):
+        ef = max(int(effort or self.ef_search), k)
+        seeds = self.entry_points
+        seed_costs = self._costs(seeds, query)
+
+        visited = set(seeds.tolist())
+        candidates = list(zip(seed_costs.tolist(), seeds.tolist()))
+        heapq.heapify(candidates)
+        # Max-heap (negated costs) of the best `ef` nodes found so far
+        best = [(-c, i) for c, i in heapq.nsmallest(ef, candidates)]
+        heapq.heapify(best)
+
+        while candidates:
+            cost, node = heapq.heappop(candidates)
+            if len(best) >= ef and cost > -best[0][0]:
+                break
+            nbrs = [n for n in self.neighbors[node].tolist() if n >= 0 and n not in visited]
+            if not nbrs:
+                continue
+            visited.update(nbrs)
+            nbrs = np.array(nbrs, dtype=np.int64)
+            for c, n in zip(self._costs(nbrs, query).tolist(), nbrs.tolist()):
+                if len(best) < ef or c < -best[0][0]:
+                    heapq.heappush(candidates, (c, n))
+                    heapq.heappush(best, (-c, n))
+                    if len(best) > ef:
+                        heapq.heappop(best)
+
+        found = sorted((-c, i) for c, i in best)[:k]
+        ids = np.array([i for _, i in found], dtype=np.int64)
+        costs = np.array([c for c, _ in found], dtype=np.float32)
+        return ids, costs
+
+    def _arrays(self):
+        return {
+            "ef_search": np.array(self.ef_search),
+            "neighbors": self.neighbors,
+            "entry_points": self.entry_points,
+        }
+
+    @classmethod
+    def _from_arrays(cls, data, vectors=None):
+        index = super()._from_arrays(data, vectors)
+        index.ef_search = int(data["ef_search"])
+        index.neighbors = data["neighbors"]
+        index.entry_points = data["entry_points"]
+        index.max_degree = index.neighbors.shape[1]
+        return index
+
+
+INDEX_TYPES = {cls.kind: cls for cls in (BruteForceIndex, IVFIndex, GraphIndex)}
+
+
+def build_index(kind, vectors, metric="cosine", **params):
+    if kind not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type: {kind} (expected one of {sorted(INDEX_TYPES)})")
+    return INDEX_TYPES[kind](vectors, metric=metric, **params)
+
+
+def load_index(path, vectors=None):
+    """Loads a saved index; `vectors` must be given if it was saved with include_vectors=False."""
+    with np.load(path, allow_pickle=False) as data:
+        kind = str(data["kind"])
+        arrays = {key: data[key] for key in data.files}
+    if vectors is None and "vectors" not in arrays:
+        raise ValueError(f"{path} was saved without vectors; pass them to load_index")
+    return INDEX_TYPES[kind]._from_arrays(arrays, vectors)
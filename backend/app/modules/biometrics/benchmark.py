@@ -0,0 +1,355 @@
+"""
+Synthetic benchmarks and recall checks for the biometrics module: watchlist
+matching, identity galleries, the approximate index and the face detection
+cascade. Run with ``python -m backend.app.modules.biometrics.benchmark``.
+"""
+import os
+import json
+import time
+import argparse
+import tempfile
+
+import face_recognition
+import numpy as np
+from PIL import Image
+
+from backend.app.core import config
+from backend.app.modules.biometrics.face_index import ENCODING_DIM
+from backend.app.modules.biometrics.main_biometrics import BiometricAnalyzer
+from backend.app.modules.biometrics.watchlist import Watchlist, WatchlistSnapshot, default_index_params, recall_check
+
+
+def _per_face_reference(known_encodings, face_encodings, tolerance):
+    # The original matching loop (two library calls per face over a list), kept as the --benchmark baseline
+    matches = []
+    for face_encoding in face_encodings:
+        hits = face_recognition.compare_faces(known_encodings, face_encoding, tolerance=tolerance)
+        face_distances = face_recognition.face_distance(known_encodings, face_encoding)
+        best_match_index = int(np.argmin(face_distances))
+        matches.append(best_match_index if hits[best_match_index] else None)
+    return matches
+
+
+def _synthetic_encodings(rng, size):
+    # Gaussian rows with roughly the norm of real dlib encodings
+    return (rng.standard_normal((size, ENCODING_DIM), dtype=np.float32) * 0.09).astype(np.float32)
+
+
+def _noisy_queries(rng, known, n, noise=0.02):
+    # Faces "seen again": watchlist rows plus noise, well within the match tolerance
+    targets = rng.integers(0, len(known), n)
+    return targets, known[targets].astype(np.float64) + rng.standard_normal((n, ENCODING_DIM)) * noise
+
+
+def _detached_analyzer(watchlist, top_k=None):
+    # Analyzer over an in-memory watchlist, without a dataset directory
+    analyzer = BiometricAnalyzer.__new__(BiometricAnalyzer)
+    analyzer.snapshot = WatchlistSnapshot(watchlist, {})
+    analyzer.tolerance, analyzer.top_k = config.BIOMETRICS_TOLERANCE, top_k or config.BIOMETRICS_TOP_K
+    analyzer.search_effort = config.BIOMETRICS_SEARCH_EFFORT
+    analyzer.person_padding = config.BIOMETRICS_PERSON_PADDING
+    return analyzer
+
+
+def run_benchmark(watchlist_sizes=(10000, 1000000), face_counts=(1, 20, 100), top_k=None,
+                  reference_max_entries=100000, seed=0):
+    """
+    Times watchlist matching on synthetic encodings. Queries are noisy copies
+    of watchlist rows (so most should match); the per-face reference runs
+    only for watchlists up to reference_max_entries, since it converts the
+    whole Python list to an array twice per face.
+    """
+    rng = np.random.default_rng(seed)
+    tolerance = config.BIOMETRICS_TOLERANCE
+    analyzer = _detached_analyzer(Watchlist([], []), top_k)
+
+    def timed(fn):
+        start = time.perf_counter()
+        out = fn()
+        return out, round((time.perf_counter() - start) * 1000, 2)
+
+    results = []
+    for size in watchlist_sizes:
+        known = _synthetic_encodings(rng, size)
+        watchlist, build_ms = timed(lambda: Watchlist(known, [f"id_{i}.jpg" for i in range(size)]))
+        analyzer.snapshot = WatchlistSnapshot(watchlist, {})
+        known_list = list(known.astype(np.float64)) if size <= reference_max_entries else None
+        runs = []
+
+        for n_faces in face_counts:
+            targets, faces = _noisy_queries(rng, known, n_faces)
+            matches, matrix_ms = timed(lambda: analyzer._match_faces(faces))
+            row = {
+                "faces": n_faces,
+                "matrix_ms": matrix_ms,
+                "matched": sum(m[0] is not None for m in matches),
+                "correct": int(sum(m[0] == t for m, t in zip(matches, targets)))
+            }
+            if known_list is not None:
+                reference, reference_ms = timed(lambda: _per_face_reference(known_list, faces, tolerance))
+                row["per_face_ms"] = reference_ms
+                row["speedup"] = round(reference_ms / matrix_ms, 1) if matrix_ms else None
+                row["results_match"] = reference == [m[0] for m in matches]
+            runs.append(row)
+
+        results.append({
+            "watchlist": size,
+            "top_k": analyzer.top_k,
+            "build_ms": build_ms,
+            "matrix_mb": round(analyzer.watchlist.nbytes / 2**20, 1),
+            "runs": runs
+        })
+        del known, known_list
+    return results
+
+
+def run_gallery_benchmark(n_identities=10000, photos_per_identity=5, face_counts=(1, 20, 100), pose_noise=0.035, seed=0):
+    """
+    Identity galleries against the two alternatives on synthetic people:
+    scanning every gallery row (same answers, more comparisons) and keeping
+    one photo per person (the old behaviour, fewer correct matches). Each
+    photo and each query face is the person's centre plus `pose_noise`, so
+    photo-to-face distances sit around the match tolerance.
+    """
+    rng = np.random.default_rng(seed)
+    centres = _synthetic_encodings(rng, n_identities)
+    rows = np.repeat(centres, photos_per_identity, axis=0)
+    rows = rows + rng.standard_normal(rows.shape).astype(np.float32) * pose_noise
+    identities = np.repeat(np.arange(n_identities), photos_per_identity)
+    names = [f"id_{i}_{j}.jpg" for i in range(n_identities) for j in range(photos_per_identity)]
+
+    gallery = Watchlist(rows, names, [f"id_{i}" for i in identities])
+    first_photo = Watchlist(rows[::photos_per_identity], [f"id_{i}" for i in range(n_identities)])
+    tolerance = config.BIOMETRICS_TOLERANCE
+
+    runs = []
+    for n_faces in face_counts:
+        targets = rng.integers(0, n_identities, n_faces)
+        faces = centres[targets].astype(np.float64) + rng.standard_normal((n_faces, ENCODING_DIM)) * pose_noise
+
+        start = time.perf_counter()
+        ids, dists, _, rows_checked = gallery.search_identities(faces, k=config.BIOMETRICS_TOP_K, tolerance=tolerance)
+        gallery_ms = (time.perf_counter() - start) * 1000
+
+        # Nearest row over the whole gallery (the plain matrix scan) gives the same best identity
+        start = time.perf_counter()
+        full_rows, _ = gallery.search(faces, k=1, exact=True)
+        full_ms = (time.perf_counter() - start) * 1000
+        full_best = gallery.row_identity[full_rows[:, 0]].tolist()
+
+        single_idx, single_dist = first_photo.search(faces, k=1)
+        runs.append({
+            "faces": n_faces,
+            "gallery_ms": round(gallery_ms, 2),
+            "full_scan_ms": round(full_ms, 2),
+            "centroids_compared": n_faces * gallery.n_identities,
+            "rows_compared": int(rows_checked),
+            "full_scan_rows": n_faces * len(gallery),
+            "results_match": full_best == ids[:, 0].tolist(),
+            "correct_gallery": int(np.sum((ids[:, 0] == targets) & (dists[:, 0] <= tolerance))),
+            "correct_first_photo_only": int(np.sum((single_idx[:, 0] == targets) & (single_dist[:, 0] <= tolerance)))
+        })
+
+    return {
+        "identities": n_identities,
+        "photos_per_identity": photos_per_identity,
+        "gallery_rows": len(gallery),
+        "runs": runs
+    }
+
+
+def run_index_benchmark(size=1000000, index_type="ivf", efforts=(2, 4, 8, 16, 32), n_queries=200,
+                        index_file=None, seed=0, **index_params):
+    """
+    Builds (or reloads from index_file) an approximate index over a synthetic
+    watchlist and runs recall_check at each effort level, to pick the
+    effort that meets the recall target at acceptable latency.
+    """
+    rng = np.random.default_rng(seed)
+    watchlist = Watchlist(_synthetic_encodings(rng, size), [f"id_{i}.jpg" for i in range(size)])
+    index_params = {**default_index_params(index_type, size), **index_params}
+
+    start = time.perf_counter()
+    watchlist.attach_index(index_type, index_file or os.path.join(tempfile.gettempdir(), f"roya_watchlist_bench_{index_type}_{size}.npz"),
+                           **index_params)
+    build_s = round(time.perf_counter() - start, 1)
+
+    _, queries = _noisy_queries(rng, watchlist.matrix, n_queries)
+    return {
+        "watchlist": size,
+        "index": index_type,
+        "load_or_build_s": build_s,
+        "checks": [
+            recall_check(watchlist, queries, k=config.BIOMETRICS_TOP_K, effort=effort, tolerance=config.BIOMETRICS_TOLERANCE)
+            for effort in efforts
+        ]
+    }
+
+
+def _synthetic_scene(portrait, frame_size, n_people, rng, person_height=540):
+    # A flat grey frame with `n_people` copies of `portrait` scaled to person size, at random non-overlapping cells
+    width, height = frame_size
+    frame = np.full((height, width, 3), 96, dtype=np.uint8)
+    person_width = max(1, person_height * portrait.width // max(1, portrait.height))
+    person = np.asarray(portrait.convert("RGB").resize((person_width, person_height)))
+    cols, rows = width // (person_width * 2), height // person_height
+    boxes = []
+    for cell in rng.permutation(cols * rows)[:n_people]:
+        x = int(cell % cols) * person_width * 2 + int(rng.integers(0, person_width))
+        y = int(cell // cols) * person_height
+        frame[y:y + person_height, x:x + person_width] = person
+        boxes.append([x, y, x + person_width, y + person_height])
+    return frame, boxes
+
+
+def _same_faces(a, b, min_iou=0.5):
+    # How many locations in `a` have a counterpart in `b` overlapping by at least min_iou
+    def iou(p, q):
+        inter_h = min(p[2], q[2]) - max(p[0], q[0])
+        inter_w = min(p[1], q[1]) - max(p[3], q[3])
+        if inter_h <= 0 or inter_w <= 0:
+            return 0.0
+        inter = inter_h * inter_w
+        return inter / float((p[2] - p[0]) * (p[1] - p[3]) + (q[2] - q[0]) * (q[1] - q[3]) - inter)
+    return sum(1 for p in a if any(iou(p, q) >= min_iou for q in b))
+
+
+def _object_detection_timer():
+    # Per-frame latency of object detection as the pipeline runs it (the person cascade waits for it)
+    from backend.app.modules.objects import main_objects
+
+    model = main_objects.load_model()
+    screen_model = main_objects.load_screen_model() if config.OBJECTS_CASCADE else None
+
+    def detect(frame):
+        bgr = np.ascontiguousarray(frame[..., ::-1])
+        start = time.perf_counter()
+        if screen_model is not None:
+            main_objects.detect_objects_cascade(screen_model, model, "frame.jpg", image=bgr)
+        else:
+            main_objects.detect_objects(model, "frame.jpg", image=bgr)
+        return (time.perf_counter() - start) * 1000
+
+    return detect
+
+
+def run_cascade_benchmark(image_path, person_boxes=None, frame_size=(3840, 2160), people=(1, 4, 8), repeats=3, seed=0,
+                          objects_ms=None):
+    """
+    Per-frame face detection latency, full frame vs. person crops. With
+    `person_boxes` (e.g. from main_objects' JSON) `image_path` is the frame
+    itself; otherwise it is a portrait pasted `people` times into a
+    synthetic frame of `frame_size`, with the paste rectangles as boxes.
+    Reports the median of `repeats` runs and how many full-frame faces the
+    cascade also found.
+
+    Also reports pipeline latency: with the cascade, biometrics only starts
+    once object detection has finished, so its result is ready after
+    objects + crops instead of the full-frame scan run alongside object
+    detection. `objects_ms` is that object detection latency; by default it
+    is measured on each frame with the configured object detection models.
+    """
+    analyzer = _detached_analyzer(Watchlist([], []))
+    if person_boxes is not None:
+        scenes = [(analyzer._load_image(image_path), person_boxes)]
+    else:
+        rng = np.random.default_rng(seed)
+        with Image.open(image_path) as portrait:
+            scenes = [_synthetic_scene(portrait, frame_size, n, rng) for n in people]
+    detect_objects = _object_detection_timer() if objects_ms is None else None
+
+    def timed(frame, boxes):
+        runs = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            _, locations, _, detection = analyzer._detect_faces(image_path, image=frame, person_boxes=boxes)
+            runs.append((time.perf_counter() - start) * 1000)
+        return float(np.median(runs)), locations, detection
+
+    results = []
+    for frame, boxes in scenes:
+        full_ms, full_faces, _ = timed(frame, None)
+        cascade_ms, cascade_faces, detection = timed(frame, boxes)
+        frame_objects_ms = objects_ms
+        if detect_objects is not None:
+            frame_objects_ms = float(np.median([detect_objects(frame) for _ in range(repeats)]))
+        # Biometrics result ready, and both vision modules done, measured from dispatch
+        full_ready, cascade_ready = full_ms, frame_objects_ms + cascade_ms
+        full_done = max(full_ms, frame_objects_ms)
+        results.append({
+            "frame": f"{frame.shape[1]}x{frame.shape[0]}",
+            "persons": len(boxes),
+            "full_frame_ms": round(full_ms, 1),
+            "cascade_ms": round(cascade_ms, 1),
+            "speedup": round(full_ms / cascade_ms, 2) if cascade_ms else None,
+            "object_detection_ms": round(frame_objects_ms, 1),
+            "pipeline": {
+                "biometrics_ready_full_frame_ms": round(full_ready, 1),
+                "biometrics_ready_cascade_ms": round(cascade_ready, 1),
+                "vision_done_full_frame_ms": round(full_done, 1),
+                "vision_done_cascade_ms": round(cascade_ready, 1),
+                "speedup": round(full_done / cascade_ready, 2) if cascade_ready else None
+            },
+            "cascade_mode": detection["mode"],
+            "crop_coverage": detection.get("coverage"),
+            "faces_full_frame": len(full_faces),
+            "faces_cascade": len(cascade_faces),
+            "full_frame_faces_found": _same_faces(full_faces, cascade_faces)
+        })
+    return {"repeats": repeats, "padding": analyzer.person_padding, "scenes": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Biometrics benchmarks")
+    parser.add_argument("--input", "-i", default=str(config.INPUTS_DIR / "target.jpg"),
+                        help="Portrait (or, with --objects, the frame) for --benchmark-cascade")
+    parser.add_argument("--db", "-d", default=str(config.BIOMETRIC_DATASET_DIR), help="Dataset directory for --recall-check")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--benchmark", action="store_true",
+                       help="Benchmark watchlist matching (1/20/100 faces vs 10k/1M entries) on synthetic encodings")
+    group.add_argument("--benchmark-index", type=int, metavar="N",
+                       help="Recall/latency of the approximate index on N synthetic encodings, across effort levels")
+    group.add_argument("--benchmark-gallery", type=int, metavar="N_IDENTITIES",
+                       help="Centroid-prefiltered identity galleries vs. a full row scan and vs. one photo per person")
+    group.add_argument("--recall-check", action="store_true",
+                       help="Recall of the approximate index against exact search on the dataset's own watchlist")
+    group.add_argument("--benchmark-cascade", action="store_true",
+                       help="Face detection latency, full frame vs. person crops (--input is a portrait pasted into "
+                            "synthetic 4K frames, or the frame itself with --objects)")
+    parser.add_argument("--objects", help="main_objects JSON for --input; its person boxes drive --benchmark-cascade")
+    parser.add_argument("--objects-ms", type=float,
+                        help="Object detection latency per frame for --benchmark-cascade (default: measured with YOLO)")
+    parser.add_argument("--index", choices=["ivf", "graph"], default=None, help="Approximate index type (default: ROYA_BIOMETRICS_INDEX)")
+    parser.add_argument("--effort", type=int, action="append", help="Index effort to check (repeatable)")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        result = run_benchmark()
+    elif args.benchmark_cascade:
+        boxes = None
+        if args.objects:
+            from backend.app.pipeline.main_pipeline import person_boxes
+            with open(args.objects, "r", encoding="utf-8") as f:
+                boxes = person_boxes(json.load(f)) or []
+        result = run_cascade_benchmark(args.input, person_boxes=boxes, objects_ms=args.objects_ms)
+    elif args.benchmark_gallery:
+        result = run_gallery_benchmark(args.benchmark_gallery)
+    elif args.benchmark_index:
+        result = run_index_benchmark(args.benchmark_index, args.index or "ivf", args.effort or (2, 4, 8, 16, 32))
+    else:
+        index_type = args.index or config.BIOMETRICS_INDEX_TYPE
+        if index_type == "brute":
+            parser.error("--recall-check needs an approximate index: pass --index or set ROYA_BIOMETRICS_INDEX")
+        analyzer = BiometricAnalyzer(db_path=args.db, index_type=index_type, min_index_entries=0)
+        if not len(analyzer.watchlist):
+            parser.error(f"No watchlist encodings in {args.db}")
+        _, queries = _noisy_queries(np.random.default_rng(0), analyzer.watchlist.matrix, min(500, len(analyzer.watchlist)))
+        result = [
+            recall_check(analyzer.watchlist, queries, k=analyzer.top_k, effort=effort, tolerance=analyzer.tolerance)
+            for effort in (args.effort or [analyzer.search_effort])
+        ]
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+import hashlib
+import logging
+import os
+import uuid
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILENAME = "encodings_index.npz"
+INDEX_VERSION = 1
+VALID_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+ENCODING_DIM = 128
+
+
+def file_digest(path, chunk_size=1 << 20):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class FaceEncodingIndex:
+    """
+    Persistent watchlist encodings stored next to metadata.json.
+
+    Every image is recorded with its relative path, mtime, size and SHA-1, plus
+    all face encodings found in it. refresh() re-encodes only files that were
+    added or whose content changed; an mtime/size change with an identical
+    hash just updates the stat fields.
+    """
+
+    def __init__(self, db_path, encode_fn):
+        self.db_path = db_path
+        self.index_path = os.path.join(db_path, INDEX_FILENAME)
+        # encode_fn(path) -> list of 128-d encodings, or None if the file could not be read
+        self.encode_fn = encode_fn
+        self.entries = {}
+
+    def load(self):
+        self.entries = {}
+        if not os.path.exists(self.index_path):
+            return False
+
+        try:
+            with np.load(self.index_path, allow_pickle=False) as data:
+                if int(data['version']) != INDEX_VERSION:
+                    logger.info("Encoding index version changed, rebuilding")
+                    return False
+                paths = data['paths']
+                mtimes = data['mtimes']
+                sizes = data['sizes']
+                hashes = data['hashes']
+                counts = data['face_counts']
+                encodings = data['encodings']
+        except Exception as e:
+            logger.warning(f"Failed to read encoding index {self.index_path}: {e}")
+            return False
+
+        offsets = np.concatenate([[0], np.cumsum(counts)])
+        for i, path in enumerate(paths):
+            self.entries[str(path)] = {
+                "mtime": float(mtimes[i]),
+                "size": int(sizes[i]),
+                "sha1": str(hashes[i]),
+                "encodings": encodings[offsets[i]:offsets[i + 1]]
+            }
+        return True
+
+    def save(self):
+        paths = sorted(self.entries)
+        encodings = [self.entries[p]["encodings"] for p in paths]
+        # Unique per writer: every pool worker's reloader may save after the same dataset change
+        tmp_path = f"{self.index_path}.{os.getpid()}.{uuid.uuid4().hex}.tmp.npz"
+        try:
+            np.savez(
+                tmp_path,
+                version=np.array(INDEX_VERSION),
+                paths=np.array(paths, dtype=str),
+                mtimes=np.array([self.entries[p]["mtime"] for p in paths], dtype=np.float64),
+                sizes=np.array([self.entries[p]["size"] for p in paths], dtype=np.int64),
+                hashes=np.array([self.entries[p]["sha1"] for p in paths], dtype=str),
+                face_counts=np.array([len(e) for e in encodings], dtype=np.int32),
+                encodings=(np.vstack(encodings) if encodings else np.empty((0, ENCODING_DIM))).astype(np.float64)
+            )
+            os.replace(tmp_path, self.index_path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def scan(self):
+        found = {}
+        for root, dirs, files in os.walk(self.db_path):
+            for filename in files:
+                if filename.lower().endswith(VALID_EXTENSIONS):
+                    filepath = os.path.join(root, filename)
+                    relpath = os.path.relpath(filepath, self.db_path).replace(os.sep, '/')
+                    try:
+                        stat = os.stat(filepath)
+                    except OSError:
+                        continue
+                    found[relpath] = (stat.st_mtime, stat.st_size)
+        return found
+
+    def refresh(self):
+        """Bring the index in line with the dataset directory; returns (added, changed, removed)."""
+        if not self.entries:
+            self.load()
+
+        found = self.scan()
+        added, changed, removed = [], [], []
+        dirty = False
+
+        for relpath in list(self.entries):
+            if relpath not in found:
+                del self.entries[relpath]
+                removed.append(relpath)
+                dirty = True
+
+        for relpath, (mtime, size) in sorted(found.items()):
+            entry = self.entries.get(relpath)
+            if entry and entry["mtime"] == mtime and entry["size"] == size:
+                continue
+
+            filepath = os.path.join(self.db_path, relpath)
+            try:
+                sha1 = file_digest(filepath)
+            except OSError:
+                continue
+
+            if entry and entry["sha1"] == sha1:
+                entry["mtime"], entry["size"] = mtime, size
+                dirty = True
+                continue
+
+            encodings = self.encode_fn(filepath)
+            if encodings is None:
+                # Unreadable right now; leave it out so the next refresh retries
+                continue
+
+            self.entries[relpath] = {
+                "mtime": mtime,
+                "size": size,
+                "sha1": sha1,
+                "encodings": np.asarray(encodings, dtype=np.float64).reshape(-1, ENCODING_DIM)
+            }
+            (changed if entry else added).append(relpath)
+            dirty = True
+
+        if dirty:
+            try:
+                self.save()
+            except Exception as e:
+                logger.warning(f"Failed to write encoding index {self.index_path}: {e}")
+
+        if added or changed or removed:
+            logger.info(f"Encoding index updated: {len(added)} added, {len(changed)} changed, {len(removed)} removed")
+
+        return added, changed, removed
+
+    def items(self):
+        for relpath in sorted(self.entries):
+            yield relpath, self.entries[relpath]["encodings"]
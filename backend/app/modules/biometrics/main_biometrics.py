@@ -1,6 +1,9 @@
 import json
 import os
 import sys
+import time
+import logging
+import threading
 import warnings
 import base64
 import argparse
@@ -10,19 +13,87 @@ import face_recognition
 import numpy as np
 from PIL import Image
 from backend.app.core import config
+from backend.app.core.shared_image import load_rgb, open_shared_image
+from backend.app.modules.biometrics.face_index import FaceEncodingIndex
+from backend.app.modules.biometrics.watchlist import (
+    WATCHLIST_INDEX_FILENAME, Watchlist, WatchlistSnapshot, default_index_params, watchlist_version, write_watchlist_version
+)
+
+logger = logging.getLogger(__name__)
+
+# Once padded person crops cover this much of the frame, one full-frame HOG pass is cheaper
+PERSON_CROP_MAX_COVERAGE = 0.6
+
+
+def _stat_key(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def person_regions(person_boxes, shape, padding):
+    """
+    Person boxes ([x1, y1, x2, y2] in frame pixels) padded by `padding` times
+    their width/height, clipped to the frame and merged where they overlap,
+    so no face is searched (or found) twice. Returned as face_recognition
+    style (top, right, bottom, left) tuples.
+    """
+    height, width = shape[:2]
+    regions = []
+    for x1, y1, x2, y2 in person_boxes:
+        pad_x, pad_y = padding * (x2 - x1), padding * (y2 - y1)
+        top, left = max(0, int(y1 - pad_y)), max(0, int(x1 - pad_x))
+        bottom, right = min(height, int(np.ceil(y2 + pad_y))), min(width, int(np.ceil(x2 + pad_x)))
+        if bottom > top and right > left:
+            regions.append((top, right, bottom, left))
+
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(regions)):
+            for j in range(i + 1, len(regions)):
+                a, b = regions[i], regions[j]
+                if a[0] < b[2] and b[0] < a[2] and a[3] < b[1] and b[3] < a[1]:
+                    regions[i] = (min(a[0], b[0]), max(a[1], b[1]), max(a[2], b[2]), min(a[3], b[3]))
+                    del regions[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return regions
+
 
 class BiometricAnalyzer:
-    def __init__(self, db_path="biometric_dataset"):
+    def __init__(self, db_path="biometric_dataset", index_type=None, min_index_entries=None, publish_version=False):
         self.db_path = db_path
-        self.known_face_encodings = []
-        self.known_face_names = []
-        self.metadata = {}
+        # Resident workers publish each new snapshot's version for the pipeline cache (see reload)
+        self.publish_version = publish_version
+        self.tolerance = config.BIOMETRICS_TOLERANCE
+        self.top_k = config.BIOMETRICS_TOP_K
+        self.index_type = index_type or config.BIOMETRICS_INDEX_TYPE
+        self.min_index_entries = config.BIOMETRICS_INDEX_MIN_ENTRIES if min_index_entries is None else min_index_entries
+        self.search_effort = config.BIOMETRICS_SEARCH_EFFORT
+        self.person_padding = config.BIOMETRICS_PERSON_PADDING
+        self.snapshot = WatchlistSnapshot(Watchlist([], []), {})
+        self.face_index = None
+        self._metadata_key = False
+        self._unreadable_metadata_key = None
+        self._reload_lock = threading.Lock()
         
         if not os.path.exists(self.db_path):
             os.makedirs(self.db_path)
             
-        self._load_metadata()
-        self._load_database()
+        self.reload(force=True)
+
+    @property
+    def watchlist(self):
+        return self.snapshot.watchlist
+
+    @property
+    def metadata(self):
+        return self.snapshot.metadata
 
     def _localize_identity(self, info, matched):
         name_en = info.get("name_en") or info.get("name") or "Unknown"
@@ -54,45 +125,125 @@ class BiometricAnalyzer:
             "is_wanted": bool(info.get("is_wanted", matched))
         }
 
-    def _load_metadata(self):
-        metadata_path = os.path.join(self.db_path, "metadata.json")
-        if os.path.exists(metadata_path):
-            try:
-                with open(metadata_path, 'r', encoding='utf-8') as f:
-                    self.metadata = json.load(f)
-            except Exception:
-                pass
+    def _read_metadata(self, metadata_path):
+        if not os.path.exists(metadata_path):
+            return {}
+        with open(metadata_path, 'r', encoding='utf-8') as f:
+            metadata = json.load(f)
+        if not isinstance(metadata, dict):
+            raise ValueError("expected an object keyed by image filename")
+        return metadata
 
     def _load_image(self, path):
         try:
-            img = Image.open(path)
-            img = img.convert("RGB")
-            return np.array(img)
+            return np.array(load_rgb(path))
         except Exception:
             return None
 
-    def _load_database(self):
-        if not os.path.exists(self.db_path):
-            return
+    def _encode_file(self, filepath):
+        img = self._load_image(filepath)
+        if img is None:
+            return None
+        try:
+            return face_recognition.face_encodings(img)
+        except Exception:
+            return None
 
-        valid_extensions = ('.jpg', '.jpeg', '.png', '.bmp')
-        
-        for root, dirs, files in os.walk(self.db_path):
-            for filename in files:
-                if filename.lower().endswith(valid_extensions):
-                    filepath = os.path.join(root, filename)
-                    try:
-                        img = self._load_image(filepath)
-                        if img is None:
-                            continue
-                            
-                        encodings = face_recognition.face_encodings(img)
-                        
-                        if encodings:
-                            self.known_face_encodings.append(encodings[0])
-                            self.known_face_names.append(filename)
-                    except Exception:
-                        pass
+    @staticmethod
+    def _identity_key(relpath, info):
+        # Explicit identity_id wins; otherwise photos in a sub-directory belong to that person
+        if info.get("identity_id"):
+            return str(info["identity_id"])
+        parts = relpath.split('/')
+        return parts[0] if len(parts) > 1 else parts[-1]
+
+    @staticmethod
+    def _selected_faces(info, face_count):
+        # The first face by default; metadata "faces" may list face indices or be "all"
+        faces = info.get("faces", [0])
+        if faces == "all":
+            return range(face_count)
+        return [i for i in faces if isinstance(i, int) and 0 <= i < face_count]
+
+    def _build_watchlist(self, metadata):
+        """
+        Gallery rows for every selected face of every image, grouped into
+        identities via metadata.json (see _identity_key). Rows are named and
+        described by their path relative to the dataset directory, so photos
+        with the same filename in different person directories stay apart.
+        """
+        encodings, names, identities = [], [], []
+        for relpath, file_encodings in self.face_index.items():
+            info = metadata.get(relpath) or {}
+            identity = self._identity_key(relpath, info)
+            for face in self._selected_faces(info, len(file_encodings)):
+                encodings.append(file_encodings[face])
+                names.append(relpath)
+                identities.append(identity)
+        watchlist = Watchlist(encodings, names, identities)
+
+        # Below the threshold an exact scan is already fast, and always exact
+        if self.index_type != "brute" and len(watchlist) >= self.min_index_entries:
+            watchlist.attach_index(self.index_type, os.path.join(self.db_path, WATCHLIST_INDEX_FILENAME),
+                                   **default_index_params(self.index_type, len(watchlist)))
+        return watchlist
+
+    def reload(self, force=False):
+        """
+        Brings the watchlist in line with the dataset directory and
+        metadata.json. Only added or changed images are encoded (see
+        FaceEncodingIndex.refresh); the new matrix, index and metadata are
+        built off to the side and published as one snapshot. With
+        publish_version its version is then written next to metadata.json,
+        so cached results are only reused while they match the snapshot
+        workers actually serve. Returns the change summary, or None when
+        nothing changed.
+        """
+        with self._reload_lock:
+            start = time.perf_counter()
+            if self.face_index is None:
+                self.face_index = FaceEncodingIndex(self.db_path, self._encode_file)
+            added, changed, removed = self.face_index.refresh()
+
+            previous = self.snapshot
+            metadata = previous.metadata
+            metadata_path = os.path.join(self.db_path, "metadata.json")
+            metadata_key = _stat_key(metadata_path)
+            metadata_changed = metadata_key not in (self._metadata_key, self._unreadable_metadata_key)
+            if metadata_changed:
+                try:
+                    metadata = self._read_metadata(metadata_path)
+                    self._metadata_key = metadata_key
+                except Exception as e:
+                    # Most likely caught mid-edit; keep the previous metadata until the file changes again
+                    logger.warning(f"Could not read {metadata_path}, keeping previous metadata: {e}")
+                    self._unreadable_metadata_key = metadata_key
+                    metadata_changed = False
+
+            images_changed = bool(added or changed or removed)
+            if not (images_changed or metadata_changed or force):
+                return None
+
+            # Metadata edits can regroup identities, so they rebuild the gallery too (the index file is reused)
+            watchlist = self._build_watchlist(metadata)
+            changes = {
+                "added": len(added),
+                "changed": len(changed),
+                "removed": len(removed),
+                "metadata_changed": metadata_changed
+            }
+            file_hashes = ((relpath, entry["sha1"]) for relpath, entry in self.face_index.entries.items())
+            self.snapshot = WatchlistSnapshot(
+                watchlist, metadata, watchlist_version(file_hashes, metadata),
+                reload_ms=round((time.perf_counter() - start) * 1000, 2), changes=changes
+            )
+            if self.publish_version:
+                write_watchlist_version(self.db_path, self.snapshot.version)
+
+        if previous.version != self.snapshot.version:
+            logger.info(f"Watchlist {previous.version} -> {self.snapshot.version}: {len(watchlist)} entries, "
+                        f"{changes} in {self.snapshot.reload_ms} ms")
+        return changes
 
     def _save_face_crop(self, image_arr, box, face_id):
         try:
@@ -112,104 +263,295 @@ class BiometricAnalyzer:
         except Exception:
             return None
 
-    def detect_and_identify(self, img_path):
-        result_json = {
+    def _match_faces(self, face_encodings, top_k=None, snapshot=None):
+        """
+        Watchlist identities for every query face, matched in bulk: centroid
+        bounds pick candidate identities, then only their gallery rows are
+        compared. Returns (identity, distance, candidates) per face: identity
+        is None when the nearest identity is farther than the tolerance (a
+        match is distance <= tolerance, as in face_recognition.compare_faces),
+        and candidates lists up to top_k (identity, distance, row) triples.
+        Indices refer to `snapshot` (default: the current one).
+        """
+        watchlist = (snapshot or self.snapshot).watchlist
+        if not len(watchlist) or not len(face_encodings):
+            return [(None, None, [])] * len(face_encodings)
+
+        identities, distances, rows, _ = watchlist.search_identities(
+            face_encodings, k=top_k or self.top_k, effort=self.search_effort, tolerance=self.tolerance
+        )
+        matches = []
+        for ids, dists, best_rows in zip(identities, distances, rows):
+            candidates = [(int(i), float(d), int(r)) for i, d, r in zip(ids, dists, best_rows) if i >= 0]
+            best_identity, best_distance, _ = candidates[0]
+            matches.append((best_identity if best_distance <= self.tolerance else None, best_distance, candidates))
+        return matches
+
+    def _identity_info(self, snapshot, identity):
+        """Metadata for an identity: an entry keyed by the identity itself, else its first described image."""
+        name = snapshot.watchlist.identity_names[identity]
+        if name in snapshot.metadata:
+            return snapshot.metadata[name]
+        for image in snapshot.watchlist.identity_images(identity):
+            if image in snapshot.metadata:
+                return snapshot.metadata[image]
+        return None
+
+    def _candidate(self, snapshot, identity, distance, row):
+        name = snapshot.watchlist.identity_names[identity]
+        info = self._identity_info(snapshot, identity) or {}
+        return {
+            "identity": name,
+            "name_en": info.get("name_en") or info.get("name") or name,
+            "matched_image": snapshot.watchlist.names[row],
+            "distance": round(distance, 4),
+            "confidence": round(max(0.0, 1.0 - distance), 4),
+            "within_tolerance": distance <= self.tolerance
+        }
+
+    def _build_match(self, snapshot, image_arr, face_id, location, match):
+        top, right, bottom, left = location
+        best_match_index, best_distance, candidates = match
+
+        filename = "Unknown"
+        identity_info = {
+            "name": "غير معروف",
+            "name_en": "Unknown",
+            "description": "لم يتم العثور على تطابق في قاعدة البيانات.",
+            "description_en": "No match found in database.",
+            "location": "غير معروف",
+            "location_en": "Unknown",
+            "id_number": "غير معروف",
+            "id_number_en": "Unknown",
+            "phone_number": "غير معروف",
+            "phone_number_en": "Unknown",
+            "is_wanted": False
+        }
+        confidence = 0.0
+        matched_flag = False
+        
+        matched_image = None
+        gallery_size = 0
+        if best_match_index is not None:
+            filename = snapshot.watchlist.identity_names[best_match_index]
+            matched_image = snapshot.watchlist.names[candidates[0][2]]
+            gallery_size = snapshot.watchlist.identity_size(best_match_index)
+            confidence = max(0.0, 1.0 - best_distance)
+            matched_flag = True
+            
+            info = self._identity_info(snapshot, best_match_index)
+            if info is not None:
+                # Grouped identities may only carry metadata like identity_id; name them after the identity
+                identity_info = info if (info.get("name_en") or info.get("name")) else {**info, "name_en": filename}
+            else:
+                identity_info["name_en"] = filename
+                identity_info["name"] = filename
+                identity_info["description_en"] = "Match found but no metadata available."
+                identity_info["description"] = "تم العثور على تطابق بدون بيانات إضافية."
+                identity_info["id_number_en"] = "Unknown"
+                identity_info["phone_number_en"] = "Unknown"
+                identity_info["is_wanted"] = True
+
+        identity_info = self._localize_identity(identity_info, matched_flag)
+
+        box = {
+            "x": left,
+            "y": top,
+            "w": right - left,
+            "h": bottom - top
+        }
+        
+        face_path = self._save_face_crop(image_arr, (top, right, bottom, left), face_id)
+        
+        return {
+            "face_id": face_id,
+            "identity": filename,
+            "info": identity_info,
+            "confidence": float(confidence),
+            "matched_image": matched_image,
+            "gallery_size": gallery_size,
+            "candidates": [self._candidate(snapshot, *candidate) for candidate in candidates],
+            "box": box,
+            "face_crop_path": face_path
+        }
+
+    def _empty_result(self, snapshot):
+        return {
             "meta": {
                 "timestamp": datetime.now().isoformat(),
-                "faces_detected": 0
+                "faces_detected": 0,
+                "watchlist": snapshot.describe()
             },
             "matches": []
         }
 
-        if not os.path.exists(img_path):
-            return result_json
+    def _locate_faces(self, image, person_boxes=None):
+        """
+        HOG face locations in frame coordinates, plus a description of the
+        search. With person boxes only padded crops around them are scanned;
+        no boxes (None), no persons, or crops covering most of the frame
+        scan the full frame.
+        """
+        if person_boxes is None:
+            return face_recognition.face_locations(image, model="hog"), {"mode": "full_frame"}
 
-        try:
+        regions = person_regions(person_boxes, image.shape, self.person_padding)
+        height, width = image.shape[:2]
+        coverage = sum((bottom - top) * (right - left) for top, right, bottom, left in regions) / float(height * width)
+        if not regions or coverage > PERSON_CROP_MAX_COVERAGE:
+            return face_recognition.face_locations(image, model="hog"), {
+                "mode": "full_frame",
+                "fallback": "crop_coverage" if regions else "no_person",
+                "persons": len(person_boxes)
+            }
+
+        face_locations = []
+        for top, right, bottom, left in regions:
+            crop = np.ascontiguousarray(image[top:bottom, left:right])
+            face_locations.extend(
+                (t + top, r + left, b + top, l + left)
+                for t, r, b, l in face_recognition.face_locations(crop, model="hog")
+            )
+        return face_locations, {
+            "mode": "person_crops",
+            "persons": len(person_boxes),
+            "regions": len(regions),
+            "coverage": round(coverage, 4)
+        }
+
+    def _detect_faces(self, img_path, image=None, person_boxes=None):
+        if image is not None:
+            unknown_image = image
+        elif not os.path.exists(img_path):
+            return None, [], [], None
+        else:
             unknown_image = self._load_image(img_path)
-            if unknown_image is None:
-                return result_json
-            
-            face_locations = face_recognition.face_locations(unknown_image, model="hog")
-            face_encodings = face_recognition.face_encodings(unknown_image, face_locations)
-            
+        if unknown_image is None:
+            return None, [], [], None
+        start = time.perf_counter()
+        face_locations, detection = self._locate_faces(unknown_image, person_boxes)
+        # Encodings come from the full frame so landmarks near a crop edge keep their context
+        face_encodings = face_recognition.face_encodings(unknown_image, face_locations)
+        detection["ms"] = round((time.perf_counter() - start) * 1000, 1)
+        return unknown_image, face_locations, face_encodings, detection
+
+    def detect_and_identify(self, img_path, image=None, person_boxes=None):
+        return self.detect_and_identify_batch([img_path], images=[image], person_boxes=[person_boxes])[0]
+
+    def detect_and_identify_batch(self, img_paths, images=None, person_boxes=None):
+        """
+        Detects and encodes faces per image, then matches every face from
+        every image against the watchlist in a single bulk comparison.
+        `images` optionally holds already-decoded RGB arrays per path and
+        `person_boxes` per-image person boxes that restrict face detection
+        (see _locate_faces). The whole batch is matched against the
+        snapshot current at the start.
+        """
+        snapshot = self.snapshot
+        results = [self._empty_result(snapshot) for _ in img_paths]
+        images = images or [None] * len(img_paths)
+        person_boxes = person_boxes or [None] * len(img_paths)
+        detected = []
+        for result_json, img_path, image, boxes in zip(results, img_paths, images, person_boxes):
+            try:
+                image_arr, face_locations, face_encodings, detection = self._detect_faces(img_path, image=image, person_boxes=boxes)
+            except Exception:
+                continue
             result_json["meta"]["faces_detected"] = len(face_locations)
-            
-            for i, ((top, right, bottom, left), face_encoding) in enumerate(zip(face_locations, face_encodings)):
-                filename = "Unknown"
-                identity_info = {
-                    "name": "غير معروف",
-                    "name_en": "Unknown",
-                    "description": "لم يتم العثور على تطابق في قاعدة البيانات.",
-                    "description_en": "No match found in database.",
-                    "location": "غير معروف",
-                    "location_en": "Unknown",
-                    "id_number": "غير معروف",
-                    "id_number_en": "Unknown",
-                    "phone_number": "غير معروف",
-                    "phone_number_en": "Unknown",
-                    "is_wanted": False
-                }
-                confidence = 0.0
-                matched_flag = False
-                
-                if self.known_face_encodings:
-                    matches = face_recognition.compare_faces(self.known_face_encodings, face_encoding, tolerance=0.6)
-                    face_distances = face_recognition.face_distance(self.known_face_encodings, face_encoding)
-                    
-                    best_match_index = np.argmin(face_distances)
-                    
-                    if matches[best_match_index]:
-                        filename = self.known_face_names[best_match_index]
-                        confidence = max(0.0, 1.0 - face_distances[best_match_index])
-                        matched_flag = True
-                        
-                        if filename in self.metadata:
-                            identity_info = self.metadata[filename]
-                        else:
-                            identity_info["name_en"] = filename
-                            identity_info["name"] = filename
-                            identity_info["description_en"] = "Match found but no metadata available."
-                            identity_info["description"] = "تم العثور على تطابق بدون بيانات إضافية."
-                            identity_info["id_number_en"] = "Unknown"
-                            identity_info["phone_number_en"] = "Unknown"
-                            identity_info["is_wanted"] = True
-
-                identity_info = self._localize_identity(identity_info, matched_flag)
-
-                box = {
-                    "x": left,
-                    "y": top,
-                    "w": right - left,
-                    "h": bottom - top
-                }
-                
-                face_path = self._save_face_crop(unknown_image, (top, right, bottom, left), i)
-                
-                match_data = {
-                    "face_id": i,
-                    "identity": filename,
-                    "info": identity_info,
-                    "confidence": float(confidence),
-                    "box": box,
-                    "face_crop_path": face_path
-                }
-                
-                result_json["matches"].append(match_data)
+            if detection is not None:
+                result_json["meta"]["face_detection"] = detection
+            detected.append((result_json, image_arr, face_locations, face_encodings))
 
+        all_encodings = [enc for _, _, _, encodings in detected for enc in encodings]
+        try:
+            all_matches = self._match_faces(all_encodings, snapshot=snapshot)
         except Exception:
-            pass
+            return results
+
+        offset = 0
+        for result_json, image_arr, face_locations, face_encodings in detected:
+            matches = all_matches[offset:offset + len(face_encodings)]
+            offset += len(face_encodings)
+            try:
+                for i, (location, match) in enumerate(zip(face_locations, matches)):
+                    result_json["matches"].append(self._build_match(snapshot, image_arr, i, location, match))
+            except Exception:
+                pass
+
+        return results
+
+class WatchlistReloader:
+    """
+    Background thread that polls the dataset directory every `interval`
+    seconds and applies changes through BiometricAnalyzer.reload(). Matches
+    keep running on the previous snapshot while a reload encodes new images.
+    """
+
+    def __init__(self, analyzer, interval=10.0):
+        self.analyzer = analyzer
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="watchlist-reloader", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.analyzer.reload()
+            except Exception as e:
+                logger.error(f"Watchlist reload failed: {e}")
+
+
+def create_worker():
+    """Entry point for the resident worker pool: encodes the watchlist once per process."""
+    analyzer = BiometricAnalyzer(db_path=str(config.BIOMETRIC_DATASET_DIR), publish_version=True)
+    if config.BIOMETRICS_RELOAD_INTERVAL > 0:
+        WatchlistReloader(analyzer, config.BIOMETRICS_RELOAD_INTERVAL).start()
+
+    def analyze(image_path, image=None, person_boxes=None):
+        if image is not None:
+            with open_shared_image(image) as pixels:
+                return analyzer.detect_and_identify(image_path, image=pixels, person_boxes=person_boxes)
+        return analyzer.detect_and_identify(image_path, person_boxes=person_boxes)
+
+    def analyze_batch(image_paths, person_boxes=None):
+        return analyzer.detect_and_identify_batch(image_paths, person_boxes=person_boxes)
+
+    def watchlist_status():
+        snapshot = analyzer.snapshot
+        return {**snapshot.describe(), "last_changes": snapshot.changes}
+
+    def reload_watchlist():
+        changes = analyzer.reload()
+        return {**watchlist_status(), "reloaded": changes is not None}
 
-        return result_json
+    return {
+        "analyze": analyze,
+        "analyze_batch": analyze_batch,
+        "watchlist_status": watchlist_status,
+        "reload_watchlist": reload_watchlist
+    }
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Biometric Identity Agent")
     parser.add_argument("--input", "-i", default=str(config.INPUTS_DIR / "target.jpg"), help="Path to input image")
     parser.add_argument("--db", "-d", default=str(config.BIOMETRIC_DATASET_DIR), help="Path to dataset directory")
+    parser.add_argument("--person-boxes", help="JSON list of [x1, y1, x2, y2] person boxes to restrict face detection to")
     
     args = parser.parse_args()
     
     analyzer = BiometricAnalyzer(db_path=args.db)
-    result = analyzer.detect_and_identify(args.input)
+    result = analyzer.detect_and_identify(args.input, person_boxes=json.loads(args.person_boxes) if args.person_boxes else None)
     try:
         sys.stdout.reconfigure(encoding="utf-8")
     except Exception:
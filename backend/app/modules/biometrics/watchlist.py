@@ -0,0 +1,417 @@
+import os
+import json
+import time
+import uuid
+import hashlib
+import logging
+from datetime import datetime
+
+import numpy as np
+
+from backend.app.core.vector_index import build_index, load_index
+from backend.app.modules.biometrics.face_index import ENCODING_DIM
+
+logger = logging.getLogger(__name__)
+
+# Watchlist rows scored per matrix product; bounds the (faces x rows) scratch buffer
+CHUNK_ROWS = 65536
+# Approximate index persisted next to metadata.json when an ANN mode is configured
+WATCHLIST_INDEX_FILENAME = "watchlist_index.npz"
+# Version of the snapshot the biometrics workers last published; read by the pipeline cache
+WATCHLIST_VERSION_FILENAME = "watchlist_version.json"
+# Keep (faces x identities) centroid distances between the two bound passes up to this many cells
+CENTROID_CACHE_CELLS = 1 << 24
+# Slack on the triangle-inequality bounds: float32 centroid distances can be off by ~1e-3 near zero
+BOUND_EPSILON = 2e-3
+# Rows fetched from an approximate index per requested identity, since one identity can own several rows
+ANN_ROWS_PER_IDENTITY = 4
+
+
+def watchlist_version(file_hashes, metadata):
+    """
+    Content version of a watchlist: a short digest of every (image path,
+    SHA-1) pair and the identity metadata. Identical across worker
+    processes that loaded the same dataset, unlike a reload counter.
+    """
+    digest = hashlib.sha1()
+    for relpath, sha1 in sorted(file_hashes):
+        digest.update(f"{relpath}\x00{sha1}\n".encode("utf-8"))
+    digest.update(json.dumps(metadata, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+    return digest.hexdigest()[:12]
+
+
+def write_watchlist_version(db_path, version):
+    path = os.path.join(db_path, WATCHLIST_VERSION_FILENAME)
+    tmp_path = f"{path}.{os.getpid()}.{uuid.uuid4().hex}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": version, "pid": os.getpid(), "published_at": time.time()}, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning(f"Could not publish watchlist version to {path}: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def read_watchlist_version(db_path):
+    """The last published snapshot version, or None if no worker has published one."""
+    try:
+        with open(os.path.join(db_path, WATCHLIST_VERSION_FILENAME), "r", encoding="utf-8") as f:
+            return json.load(f).get("version")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class WatchlistSnapshot:
+    """
+    Everything a match reads: the watchlist, the identity metadata and the
+    version they were loaded as. A reload builds a new snapshot and swaps
+    the analyzer's reference in one assignment; a batch keeps the snapshot
+    it started with, so it never sees a half-applied reload and is never
+    blocked by one.
+    """
+
+    def __init__(self, watchlist, metadata, version="empty", reload_ms=0.0, changes=None):
+        self.watchlist = watchlist
+        self.metadata = metadata
+        self.version = version
+        self.reload_ms = reload_ms
+        self.changes = changes or {}
+        self.loaded_at = datetime.now().isoformat()
+
+    def describe(self):
+        return {
+            "version": self.version,
+            "entries": len(self.watchlist),
+            "identities": self.watchlist.n_identities,
+            "index": self.watchlist.index.kind if self.watchlist.index is not None else "brute",
+            "loaded_at": self.loaded_at,
+            "reload_ms": self.reload_ms
+        }
+
+
+def default_index_params(kind, size):
+    """
+    Build parameters for the watchlist index. IVF gets ~4*sqrt(n) lists
+    (smaller lists than the generic sqrt(n), so each probe reads less) and
+    a packed layout; the graph index keeps its defaults.
+    """
+    if kind == "ivf":
+        return {"nlist": max(1, 4 * int(np.sqrt(size))), "packed": True}
+    return {}
+
+
+class Watchlist:
+    """
+    Watchlist encodings as one contiguous float32 matrix with precomputed
+    squared row norms, plus the image name and identity of each row.
+
+    search() scores every query face against every row at once using
+    ||q - k||^2 = ||q||^2 + ||k||^2 - 2 q.k in one matrix product, keeps the k nearest rows per
+    face, then recomputes those few distances exactly in float64 so the
+    tolerance comparison matches face_recognition.face_distance.
+
+    Rows sharing an identity form that identity's gallery. Each identity
+    has a centroid and a radius (farthest gallery row from the centroid);
+    search_identities() uses them to skip identities that cannot be among
+    the nearest before looking at individual rows.
+
+    With an approximate index attached (attach_index) the candidates come
+    from the index instead of the full scan; the exact re-ranking is the same.
+    """
+
+    def __init__(self, encodings, names, identities=None):
+        matrix = np.asarray(encodings, dtype=np.float32).reshape(-1, ENCODING_DIM)
+        self.matrix = np.ascontiguousarray(matrix)
+        self.names = list(names)
+        if len(self.names) != len(self.matrix):
+            raise ValueError(f"{len(self.names)} names for {len(self.matrix)} encodings")
+        identities = self.names if identities is None else list(identities)
+        if len(identities) != len(self.matrix):
+            raise ValueError(f"{len(identities)} identities for {len(self.matrix)} encodings")
+        self.sq_norms = np.einsum("ij,ij->i", self.matrix, self.matrix)
+        self.index = None
+
+        # Identities in first-seen order; row_identity maps each row to one
+        identity_ids = {}
+        self.row_identity = np.array([identity_ids.setdefault(i, len(identity_ids)) for i in identities], dtype=np.int64)
+        self.identity_names = list(identity_ids)
+        self._build_gallery()
+
+    def _build_gallery(self):
+        n_identities = len(self.identity_names)
+        counts = np.bincount(self.row_identity, minlength=n_identities)
+        # Rows grouped by identity: identity i owns identity_rows[identity_offsets[i]:identity_offsets[i + 1]]
+        self.identity_rows = np.argsort(self.row_identity, kind="stable")
+        self.identity_offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+
+        if n_identities == len(self.matrix):
+            # One row per identity (row i is identity i): rows are their own centroids, no copy needed
+            self.centroids = self.matrix
+            self.radii = np.zeros(n_identities, dtype=np.float32)
+        else:
+            grouped = self.matrix[self.identity_rows]
+            self.centroids = np.add.reduceat(grouped, self.identity_offsets[:-1], axis=0) / counts[:, None].astype(np.float32)
+            spread = np.linalg.norm(grouped - np.repeat(self.centroids, counts, axis=0), axis=1)
+            self.radii = np.maximum.reduceat(spread, self.identity_offsets[:-1]).astype(np.float32)
+        self.centroids = np.ascontiguousarray(self.centroids, dtype=np.float32)
+        self.centroid_sq_norms = np.einsum("ij,ij->i", self.centroids, self.centroids)
+
+    def __len__(self):
+        return len(self.names)
+
+    @property
+    def n_identities(self):
+        return len(self.identity_names)
+
+    def identity_size(self, identity):
+        return int(self.identity_offsets[identity + 1] - self.identity_offsets[identity])
+
+    def identity_images(self, identity):
+        rows = self.identity_rows[self.identity_offsets[identity]:self.identity_offsets[identity + 1]]
+        return list(dict.fromkeys(self.names[row] for row in rows))
+
+    @property
+    def nbytes(self):
+        total = self.matrix.nbytes + self.sq_norms.nbytes + self.radii.nbytes
+        if self.centroids is not self.matrix:
+            total += self.centroids.nbytes
+        return total
+
+    def fingerprint(self):
+        digest = hashlib.sha1(memoryview(self.matrix).cast("B"))
+        digest.update("\x00".join(self.names).encode("utf-8"))
+        return digest.hexdigest()
+
+    def attach_index(self, kind, index_file, **params):
+        """
+        Loads the persisted `kind` index ("ivf" or "graph", l2 metric) from
+        index_file, or builds and saves it when missing or built for other
+        encodings. The index references self.matrix rather than copying it.
+        """
+        fingerprint = self.fingerprint()
+        if os.path.exists(index_file):
+            try:
+                index = load_index(index_file, vectors=self.matrix)
+                if index.kind == kind and index.fingerprint == fingerprint:
+                    self.index = index
+                    logger.info(f"Loaded {kind} watchlist index from {index_file}")
+                    return self.index
+                logger.info("Watchlist index is stale, rebuilding")
+            except Exception as e:
+                logger.warning(f"Failed to load watchlist index {index_file}: {e}")
+
+        start = time.perf_counter()
+        index = build_index(kind, self.matrix, metric="l2", **params)
+        index.fingerprint = fingerprint
+        logger.info(f"Built {kind} watchlist index over {len(self)} encodings in {time.perf_counter() - start:.1f}s")
+        try:
+            index.save(index_file, include_vectors=False)
+        except Exception as e:
+            logger.warning(f"Failed to persist watchlist index {index_file}: {e}")
+        self.index = index
+        return self.index
+
+    def search(self, queries, k=1, effort=None, exact=False, chunk_rows=CHUNK_ROWS):
+        """
+        k nearest watchlist rows per query face. Returns (indices, distances),
+        both shaped (faces, k) and sorted nearest first; slots without a
+        candidate (watchlist smaller than k, or an index that found fewer)
+        hold -1 / inf. `effort` is passed to the approximate index; exact=True
+        scans every row even when one is attached.
+        """
+        exact_queries = np.asarray(queries, dtype=np.float64).reshape(-1, ENCODING_DIM)
+        queries = exact_queries.astype(np.float32)
+        n_queries = len(queries)
+        indices = np.full((n_queries, k), -1, dtype=np.int64)
+        distances = np.full((n_queries, k), np.inf)
+        if not n_queries or not len(self) or k < 1:
+            return indices, distances
+
+        if self.index is not None and not exact:
+            candidate_idx, _ = self.index.search(queries, k=k, effort=effort)
+        else:
+            candidate_idx = self._scan(queries, k, chunk_rows)
+
+        # Exact distances for the survivors; the expanded form loses precision near zero
+        found = candidate_idx >= 0
+        exact_distances = np.linalg.norm(
+            self.matrix[np.where(found, candidate_idx, 0)].astype(np.float64) - exact_queries[:, None, :], axis=2
+        )
+        exact_distances[~found] = np.inf
+        order = np.argsort(exact_distances, axis=1, kind="stable")
+        keep = candidate_idx.shape[1]
+        indices[:, :keep] = np.where(
+            np.take_along_axis(found, order, axis=1), np.take_along_axis(candidate_idx, order, axis=1), -1
+        )
+        distances[:, :keep] = np.take_along_axis(exact_distances, order, axis=1)
+        return indices, distances
+
+    def _scan(self, queries, k, chunk_rows):
+        # ||q||^2 is constant per face, so ranking only needs ||k||^2 - 2 q.k
+        candidate_idx, candidate_d2 = [], []
+        for start in range(0, len(self), chunk_rows):
+            block = self.matrix[start:start + chunk_rows]
+            d2 = queries @ block.T
+            d2 *= -2.0
+            d2 += self.sq_norms[start:start + len(block)]
+            if len(block) > k:
+                top = np.argpartition(d2, k - 1, axis=1)[:, :k]
+            else:
+                top = np.broadcast_to(np.arange(len(block)), (len(queries), len(block)))
+            candidate_idx.append(top + start)
+            candidate_d2.append(np.take_along_axis(d2, top, axis=1))
+
+        candidate_idx = np.concatenate(candidate_idx, axis=1)
+        candidate_d2 = np.concatenate(candidate_d2, axis=1)
+        keep = min(k, candidate_idx.shape[1])
+        if candidate_idx.shape[1] > keep:
+            top = np.argpartition(candidate_d2, keep - 1, axis=1)[:, :keep]
+            candidate_idx = np.take_along_axis(candidate_idx, top, axis=1)
+        return candidate_idx
+
+    def _centroid_distances(self, queries, start, end):
+        d2 = queries @ self.centroids[start:end].T
+        d2 *= -2.0
+        d2 += self.centroid_sq_norms[start:end]
+        d2 += np.einsum("ij,ij->i", queries, queries)[:, None]
+        return np.sqrt(np.maximum(d2, 0.0, out=d2), out=d2)
+
+    def _bounded_identities(self, queries, k, chunk_rows, tolerance=None):
+        """
+        Candidate identities per face. By the triangle inequality a face at
+        distance d from a centroid is within [d - radius, d + radius] of every
+        row of that identity. T, the k-th smallest upper bound, is a distance
+        that at least k identities are known to beat, so identities whose
+        lower bound exceeds T cannot be in the top k and are skipped.
+
+        With a tolerance, T is further capped at max(T1, tolerance): the
+        nearest identity and every identity within tolerance still survive,
+        but far-off runners-up are no longer expanded just to fill k slots.
+        """
+        n_queries, n_identities = len(queries), self.n_identities
+        keep_blocks = n_queries * n_identities <= CENTROID_CACHE_CELLS
+        blocks, upper = [], []
+        for start in range(0, n_identities, chunk_rows):
+            end = min(start + chunk_rows, n_identities)
+            dist = self._centroid_distances(queries, start, end)
+            ub = dist + self.radii[start:end]
+            upper.append(np.partition(ub, k - 1, axis=1)[:, :k] if end - start > k else ub)
+            if keep_blocks:
+                blocks.append(dist)
+
+        upper = np.sort(np.concatenate(upper, axis=1), axis=1)
+        threshold = upper[:, k - 1] if upper.shape[1] >= k else np.full(n_queries, np.inf, dtype=np.float32)
+        if tolerance is not None:
+            threshold = np.minimum(threshold, np.maximum(upper[:, 0], tolerance))
+        # Upper bounds may be underestimated and lower bounds overestimated by up to BOUND_EPSILON each
+        threshold = threshold + 2 * BOUND_EPSILON
+
+        candidates = [[] for _ in range(n_queries)]
+        for block_no, start in enumerate(range(0, n_identities, chunk_rows)):
+            end = min(start + chunk_rows, n_identities)
+            dist = blocks[block_no] if keep_blocks else self._centroid_distances(queries, start, end)
+            rows, cols = np.nonzero(dist - self.radii[start:end] <= threshold[:, None])
+            splits = np.searchsorted(rows, np.arange(1, n_queries))
+            for q, cols_q in enumerate(np.split(cols, splits)):
+                if len(cols_q):
+                    candidates[q].append(cols_q + start)
+        return [np.concatenate(c) if c else np.empty(0, dtype=np.int64) for c in candidates]
+
+    def _identity_minimums(self, query, identities):
+        """Exact distance from one face to each given identity (its nearest row), and that row."""
+        starts = self.identity_offsets[identities]
+        counts = self.identity_offsets[identities + 1] - starts
+        group_starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        positions = np.repeat(starts - group_starts, counts) + np.arange(int(counts.sum()))
+        rows = self.identity_rows[positions]
+        distances = np.linalg.norm(self.matrix[rows].astype(np.float64) - query, axis=1)
+        order = np.lexsort((distances, np.repeat(np.arange(len(identities)), counts)))
+        best = order[group_starts]
+        return distances[best], rows[best], len(rows)
+
+    def search_identities(self, queries, k=1, effort=None, exact=False, tolerance=None, chunk_rows=CHUNK_ROWS):
+        """
+        k nearest identities per face, where an identity's distance is the
+        exact distance to its nearest gallery row. Returns (identities,
+        distances, rows, rows_checked): the first three shaped (faces, k),
+        nearest first, -1 / inf where fewer than k identities exist; `rows`
+        is the gallery row that produced each distance and rows_checked the
+        number of exact row distances computed, for comparison with a full
+        scan (faces x rows).
+
+        Passing the match tolerance lets the centroid bound prune harder:
+        the nearest identity and all identities within tolerance are still
+        exact, but slots beyond them may stay empty (-1 / inf).
+        """
+        exact_queries = np.asarray(queries, dtype=np.float64).reshape(-1, ENCODING_DIM)
+        n_queries = len(exact_queries)
+        identities = np.full((n_queries, k), -1, dtype=np.int64)
+        distances = np.full((n_queries, k), np.inf)
+        best_rows = np.full((n_queries, k), -1, dtype=np.int64)
+        if not n_queries or not len(self) or k < 1:
+            return identities, distances, best_rows, 0
+
+        if self.index is not None and not exact:
+            # The index ranks rows; its candidates' identities are then scored on their whole gallery
+            rows, _ = self.search(exact_queries, k=k * ANN_ROWS_PER_IDENTITY, effort=effort)
+            candidates = [np.unique(self.row_identity[r[r >= 0]]) for r in rows]
+        else:
+            candidates = self._bounded_identities(exact_queries.astype(np.float32), k, chunk_rows, tolerance)
+
+        rows_checked = 0
+        for q, candidate_ids in enumerate(candidates):
+            if not len(candidate_ids):
+                continue
+            id_distances, id_rows, checked = self._identity_minimums(exact_queries[q], candidate_ids)
+            rows_checked += checked
+            order = np.argsort(id_distances, kind="stable")[:k]
+            identities[q, :len(order)] = candidate_ids[order]
+            distances[q, :len(order)] = id_distances[order]
+            best_rows[q, :len(order)] = id_rows[order]
+        return identities, distances, best_rows, rows_checked
+
+
+def recall_check(watchlist, queries, k=1, effort=None, tolerance=0.6):
+    """
+    Compares the attached approximate index with an exact scan on the same
+    queries. recall_at_k is the share of exact top-k rows the index also
+    returned; match_recall only counts faces whose exact best row is within
+    tolerance and asks whether the index returned that same best row, i.e.
+    how many watchlist hits the approximation would have missed.
+    """
+    if watchlist.index is None:
+        raise ValueError("No approximate index attached to the watchlist")
+    queries = np.asarray(queries, dtype=np.float64).reshape(-1, ENCODING_DIM)
+
+    # One face per call for both, so the latencies are per-query figures
+    start = time.perf_counter()
+    exact = [watchlist.search(query, k=k, exact=True) for query in queries]
+    exact_ms = (time.perf_counter() - start) * 1000
+    exact_idx = np.vstack([idx for idx, _ in exact])
+    exact_dist = np.vstack([dist for _, dist in exact])
+
+    start = time.perf_counter()
+    approx_idx = np.vstack([watchlist.search(query, k=k, effort=effort)[0] for query in queries])
+    approx_ms = (time.perf_counter() - start) * 1000
+
+    hits = total = 0
+    for approx_row, exact_row in zip(approx_idx, exact_idx):
+        wanted = set(exact_row[exact_row >= 0].tolist())
+        hits += len(wanted & set(approx_row.tolist()))
+        total += len(wanted)
+
+    matched = exact_dist[:, 0] <= tolerance
+    n_queries = max(len(queries), 1)
+    return {
+        "queries": len(queries),
+        "k": k,
+        "effort": effort,
+        "index": watchlist.index.kind,
+        "recall_at_k": round(hits / total, 4) if total else None,
+        "top1_recall": round(float(np.mean(approx_idx[:, 0] == exact_idx[:, 0])), 4) if len(queries) else None,
+        "exact_matches": int(matched.sum()),
+        "match_recall": round(float(np.mean(approx_idx[matched, 0] == exact_idx[matched, 0])), 4) if matched.any() else None,
+        "ann_ms_per_query": round(approx_ms / n_queries, 4),
+        "exact_ms_per_query": round(exact_ms / n_queries, 4)
+    }
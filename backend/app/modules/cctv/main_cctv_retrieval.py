@@ -4,12 +4,15 @@ import argparse
 import sys
 import os
 import io
+import time
+import random
 
 # Force UTF-8 for stdout
 sys.stdout.reconfigure(encoding='utf-8')
 
 from backend.app.core import config
 from backend.app.modules.gps.location_recognizer import LocationRecognizer
+from backend.app.modules.cctv.spatial_index import CameraIndex
 
 CCTV_NAME_MAP = {
     "Al-Dawaa Pharmacy #291": "صيدلية الدواء رقم 291",
@@ -34,17 +37,6 @@ def haversine_distance(lat1, lon1, lat2, lon2):
     r = 6371000 # Radius of earth in meters
     return c * r
 
-def load_registry(file_path):
-    try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        print(json.dumps({"error": f"Registry file not found: {file_path}"}))
-        sys.exit(1)
-    except json.JSONDecodeError:
-        print(json.dumps({"error": f"Invalid JSON in registry file: {file_path}"}))
-        sys.exit(1)
-
 def get_coordinates_from_image(image_path):
     if not os.path.exists(image_path):
         print(json.dumps({"error": f"Image file not found: {image_path}"}))
@@ -54,7 +46,8 @@ def get_coordinates_from_image(image_path):
         recognizer = LocationRecognizer(
             csv_file=str(config.DATA_DIR / 'dataset.csv'),
             image_folder=str(config.DATA_DIR / 'images'),
-            cache_file=str(config.DATABASE_CACHE_PATH)
+            cache_file=str(config.DATABASE_CACHE_PATH),
+            store_dir=str(config.LOCATION_DB_DIR)
         )
         
         result = recognizer.find_location(image_path)
@@ -69,70 +62,72 @@ def get_coordinates_from_image(image_path):
         print(json.dumps({"error": f"Error in location recognition: {str(e)}"}))
         sys.exit(1)
 
-def main():
-    # Default coordinates (Riyadh) 
-    DEFAULT_LAT = 24.585417
-    DEFAULT_LON = 46.585833
-    
-    parser = argparse.ArgumentParser(description='CCTV Retrieval Tool')
-    parser.add_argument('--lat', type=float, help='Latitude of the target location')
-    parser.add_argument('--lng', type=float, help='Longitude of the target location')
-    parser.add_argument('--image', type=str, help='Path to image for location inference')
-    
-    args = parser.parse_args()
-    
-    target_lat = DEFAULT_LAT
-    target_lng = DEFAULT_LON
-    
-    if args.image:
-        target_lat, target_lng = get_coordinates_from_image(args.image)
-    elif args.lat is not None and args.lng is not None:
-        target_lat = args.lat
-        target_lng = args.lng
+# Default coordinates (Riyadh)
+DEFAULT_LAT = 24.585417
+DEFAULT_LON = 46.585833
 
-    # Load Mock Database
-    registry_path = config.CCTV_DIR / 'cctv_registry.json'
-    cctv_registry = load_registry(registry_path)
+def read_registry(file_path):
+    with open(file_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def load_registry(file_path):
+    try:
+        return read_registry(file_path)
+    except FileNotFoundError:
+        print(json.dumps({"error": f"Registry file not found: {file_path}"}))
+        sys.exit(1)
+    except json.JSONDecodeError:
+        print(json.dumps({"error": f"Invalid JSON in registry file: {file_path}"}))
+        sys.exit(1)
+
+_index_cache = {}
 
+def get_camera_index(registry_path):
+    """Registry loaded once into a spatial index; reloaded only when the file changes."""
+    registry_path = str(registry_path)
+    mtime = os.stat(registry_path).st_mtime_ns
+    cached = _index_cache.get(registry_path)
+    if cached is None or cached[0] != mtime:
+        cached = (mtime, CameraIndex(read_registry(registry_path)))
+        _index_cache[registry_path] = cached
+    return cached[1]
+
+def linear_scan(target_lat, target_lng, cctv_registry, radius_m=500):
+    """Reference scan over every camera; kept for benchmarking the spatial index."""
     results = []
-    
     for cam in cctv_registry:
         dist = haversine_distance(target_lat, target_lng, cam["lat"], cam["lng"])
-        # Filter logic (e.g., only within 500m)
-        if dist <= 500:
-            business_name_en = cam["business_name"]
-            business_name_ar = CCTV_NAME_MAP.get(business_name_en, business_name_en)
-            results.append({
-                "business_name": business_name_ar,
-                "business_name_en": business_name_en,
-                "lat": cam["lat"],
-                "lng": cam["lng"],
-                "distance_val": dist, # Keep numeric for sorting
-                "distance": f"{int(dist)} متر",
-                "distance_en": f"{int(dist)}m"
-            })
+        if dist <= radius_m:
+            results.append((dist, cam))
+    results.sort(key=lambda x: x[0])
+    return results
 
-    # Sort by distance
-    results.sort(key=lambda x: x["distance_val"])
+def search_cameras(target_lat, target_lng, camera_index, radius_m=500, k=None):
+    if k:
+        positions, dists = camera_index.nearest(target_lat, target_lng, k, max_radius_m=radius_m)
+    else:
+        positions, dists = camera_index.radius_query(target_lat, target_lng, radius_m)
 
-    # Add rank and remove raw distance_val
     final_nodes = []
-    for idx, item in enumerate(results):
+    for idx, (position, dist) in enumerate(zip(positions, dists)):
+        cam = camera_index.camera(position)
+        business_name_en = cam["business_name"]
+        business_name_ar = CCTV_NAME_MAP.get(business_name_en, business_name_en)
         final_nodes.append({
             "rank": idx + 1,
-            "business_name": item["business_name"],
-            "business_name_en": item["business_name_en"],
+            "business_name": business_name_ar,
+            "business_name_en": business_name_en,
             "gps": {
-                "lat": item["lat"],
-                "lng": item["lng"]
+                "lat": cam["lat"],
+                "lng": cam["lng"]
             },
-            "distance": item["distance"],
-            "distance_en": item["distance_en"]
+            "distance": f"{int(dist)} متر",
+            "distance_en": f"{int(dist)}m"
         })
 
-    output = {
+    return {
         "meta": {
-            "search_radius": "500m",
+            "search_radius": f"{int(radius_m)}m",
             "target_coords": {
                 "lat": target_lat,
                 "lng": target_lng
@@ -142,6 +137,105 @@ def main():
         "cctv_nodes": final_nodes
     }
 
+def create_worker():
+    """Entry point for the resident worker pool."""
+    registry_path = config.CCTV_DIR / 'cctv_registry.json'
+
+    def analyze(lat, lng, radius_m=500, k=None):
+        return search_cameras(lat, lng, get_camera_index(registry_path), radius_m=radius_m, k=k)
+
+    return {"analyze": analyze}
+
+def _matches_scan(expected, index, positions, dists, tolerance_m=1e-3):
+    # Same cameras in the same order at the same distances as linear_scan
+    if len(expected) != len(positions):
+        return False
+    return all(
+        cam["business_name"] == index.camera(position)["business_name"] and abs(dist - found_dist) <= tolerance_m
+        for (dist, cam), position, found_dist in zip(expected, positions, dists)
+    )
+
+def run_benchmark(n_cameras, n_queries=200, radius_m=500, k=10, seed=0):
+    """
+    Linear haversine scan vs. the grid index over a synthetic registry
+    around Riyadh. Index results are checked against the scan camera by
+    camera; k-NN is checked on queries with at least k cameras in radius_m.
+    """
+    rng = random.Random(seed)
+    registry = [
+        {
+            "business_name": f"Camera {i}",
+            "lat": DEFAULT_LAT + rng.uniform(-0.5, 0.5),
+            "lng": DEFAULT_LON + rng.uniform(-0.5, 0.5)
+        }
+        for i in range(n_cameras)
+    ]
+    queries = [(DEFAULT_LAT + rng.uniform(-0.5, 0.5), DEFAULT_LON + rng.uniform(-0.5, 0.5)) for _ in range(n_queries)]
+
+    start = time.perf_counter()
+    index = CameraIndex(registry)
+    build_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    expected = [linear_scan(lat, lng, registry, radius_m) for lat, lng in queries]
+    linear_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    found = [index.radius_query(lat, lng, radius_m) for lat, lng in queries]
+    radius_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    knn = [index.nearest(lat, lng, k) for lat, lng in queries]
+    knn_s = time.perf_counter() - start
+
+    mismatches = sum(1 for exp, (ids, dists) in zip(expected, found) if not _matches_scan(exp, index, ids, dists))
+    knn_checked = [(exp[:k], result) for exp, result in zip(expected, knn) if len(exp) >= k]
+    knn_mismatches = sum(1 for exp, (ids, dists) in knn_checked if not _matches_scan(exp, index, ids, dists))
+
+    return {
+        "cameras": n_cameras,
+        "queries": n_queries,
+        "radius_m": radius_m,
+        "index_build_ms": round(build_s * 1000, 2),
+        "linear_scan_ms_per_query": round(linear_s / n_queries * 1000, 4),
+        "index_radius_ms_per_query": round(radius_s / n_queries * 1000, 4),
+        "index_knn_ms_per_query": round(knn_s / n_queries * 1000, 4),
+        "speedup": round(linear_s / radius_s, 1) if radius_s > 0 else None,
+        "result_mismatches": mismatches,
+        "knn_queries_checked": len(knn_checked),
+        "knn_mismatches": knn_mismatches
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='CCTV Retrieval Tool')
+    parser.add_argument('--lat', type=float, help='Latitude of the target location')
+    parser.add_argument('--lng', type=float, help='Longitude of the target location')
+    parser.add_argument('--image', type=str, help='Path to image for location inference')
+    parser.add_argument('--radius', type=float, default=500, help='Search radius in meters')
+    parser.add_argument('--k', type=int, default=None, help='Return only the k nearest cameras within the radius')
+    parser.add_argument('--benchmark', type=int, metavar='N_CAMERAS', help='Benchmark linear scan vs. spatial index on N synthetic cameras')
+    
+    args = parser.parse_args()
+
+    if args.benchmark:
+        print(json.dumps(run_benchmark(args.benchmark, radius_m=args.radius, k=args.k or 10), indent=2))
+        return
+    
+    target_lat = DEFAULT_LAT
+    target_lng = DEFAULT_LON
+    
+    if args.image:
+        target_lat, target_lng = get_coordinates_from_image(args.image)
+    elif args.lat is not None and args.lng is not None:
+        target_lat = args.lat
+        target_lng = args.lng
+
+    # Load Mock Database
+    registry_path = config.CCTV_DIR / 'cctv_registry.json'
+    camera_index = CameraIndex(load_registry(registry_path))
+
+    output = search_cameras(target_lat, target_lng, camera_index, radius_m=args.radius, k=args.k)
+
     # Print JSON to stdout
     print(json.dumps(output, indent=2, ensure_ascii=False))
 
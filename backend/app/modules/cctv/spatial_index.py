@@ -0,0 +1,106 @@
+import math
+import logging
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_M = 6371000
+
+
+def haversine_vectorized(lat, lng, lats, lngs) -> np.ndarray:
+    """Great-circle distance in meters from one point to arrays of points (all in decimal degrees)."""
+    lat1 = math.radians(lat)
+    lng1 = math.radians(lng)
+    lat2 = np.radians(lats)
+    lng2 = np.radians(lngs)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class CameraIndex:
+    """
+    Uniform lat/lng grid over camera positions.
+
+    Cameras are sorted by grid cell so each row of cells covering a query is
+    one contiguous slice found with searchsorted; candidates are then refined
+    with a vectorised haversine. Longitude wrap-around at the antimeridian is
+    not handled.
+    """
+
+    def __init__(self, cameras: List[Dict], cell_deg: float = 0.01):
+        self.cell_deg = cell_deg
+        self.n_rows = int(math.ceil(180.0 / cell_deg)) + 1
+        self.n_cols = int(math.ceil(360.0 / cell_deg)) + 1
+
+        lats = np.array([float(cam["lat"]) for cam in cameras], dtype=np.float64)
+        lngs = np.array([float(cam["lng"]) for cam in cameras], dtype=np.float64)
+        keys = self._cell_key(self._row(lats), self._col(lngs))
+
+        order = np.argsort(keys, kind="stable")
+        self.cameras = [cameras[i] for i in order]
+        self.lats = lats[order]
+        self.lngs = lngs[order]
+        self.keys = keys[order]
+
+    def __len__(self):
+        return len(self.cameras)
+
+    def _row(self, lat):
+        return np.floor((np.asarray(lat) + 90.0) / self.cell_deg).astype(np.int64)
+
+    def _col(self, lng):
+        return np.floor((np.asarray(lng) + 180.0) / self.cell_deg).astype(np.int64)
+
+    def _cell_key(self, row, col):
+        return row * self.n_cols + col
+
+    def _candidates(self, lat: float, lng: float, radius_m: float) -> np.ndarray:
+        dlat = math.degrees(radius_m / EARTH_RADIUS_M)
+        # Widest longitude span is at the bounding-box edge nearest the pole
+        max_abs_lat = min(abs(lat) + dlat, 89.999)
+        dlng = min(dlat / math.cos(math.radians(max_abs_lat)), 180.0)
+
+        row_min = max(0, int(self._row(lat - dlat)))
+        row_max = min(self.n_rows - 1, int(self._row(lat + dlat)))
+        col_min = max(0, int(self._col(lng - dlng)))
+        col_max = min(self.n_cols - 1, int(self._col(lng + dlng)))
+
+        rows = np.arange(row_min, row_max + 1)
+        starts = np.searchsorted(self.keys, self._cell_key(rows, col_min), side="left")
+        ends = np.searchsorted(self.keys, self._cell_key(rows, col_max), side="right")
+        slices = [np.arange(s, e) for s, e in zip(starts, ends) if e > s]
+        return np.concatenate(slices) if slices else np.empty(0, dtype=np.int64)
+
+    def radius_query(self, lat: float, lng: float, radius_m: float) -> Tuple[np.ndarray, np.ndarray]:
+        """Cameras within radius_m, nearest first. Returns (positions, distances_m)."""
+        ids = self._candidates(lat, lng, radius_m)
+        if len(ids) == 0:
+            return ids, np.empty(0)
+        dists = haversine_vectorized(lat, lng, self.lats[ids], self.lngs[ids])
+        keep = dists <= radius_m
+        ids, dists = ids[keep], dists[keep]
+        order = np.argsort(dists, kind="stable")
+        return ids[order], dists[order]
+
+    def nearest(self, lat: float, lng: float, k: int, max_radius_m: float = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        k nearest cameras, optionally capped at max_radius_m. The search
+        radius doubles from one cell until k cameras fall inside it, which
+        guarantees they are the true k nearest.
+        """
+        if len(self.cameras) == 0 or k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+
+        radius = math.radians(self.cell_deg) * EARTH_RADIUS_M
+        limit = max_radius_m if max_radius_m is not None else math.pi * EARTH_RADIUS_M
+        while True:
+            radius = min(radius, limit)
+            ids, dists = self.radius_query(lat, lng, radius)
+            if len(ids) >= k or radius >= limit:
+                return ids[:k], dists[:k]
+            radius *= 2
+
+    def camera(self, position: int) -> Dict:
+        return self.cameras[position]
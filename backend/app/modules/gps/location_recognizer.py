@@ -1,26 +1,79 @@
 import os
+import time
 import pickle
 import logging
-from typing import Optional, Dict
+from typing import Optional, Dict, List
 
 import torch
 import torch.nn as nn
+from torch.utils.data import Dataset, DataLoader
 from torchvision import models, transforms
 from PIL import Image
 import pandas as pd
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
+
+from backend.app.core.shared_image import load_rgb
+from backend.app.core.vector_index import load_index, normalize_rows
+from backend.app.modules.gps.location_store import LocationColumns, LocationStore, build_base_index
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# Most tombstoned base rows a search over-fetches past; beyond that it falls back to an exact scan
+TOMBSTONE_OVERFETCH = 256
+
+class _ImageRowDataset(Dataset):
+    """Decodes and preprocesses database images inside DataLoader workers."""
+
+    def __init__(self, rows: List[Dict], image_folder: str, preprocess: transforms.Compose):
+        self.rows = rows
+        self.image_folder = image_folder
+        self.preprocess = preprocess
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, i):
+        path = os.path.join(self.image_folder, self.rows[i]['filename'])
+        try:
+            img = load_rgb(path)
+            return self.preprocess(img), i
+        except Exception as e:
+            logger.error(f"Failed to extract features from {path}: {e}")
+            return None, i
+
+
+def _collate_valid(batch):
+    batch = [(tensor, i) for tensor, i in batch if tensor is not None]
+    if not batch:
+        return None, []
+    tensors, indices = zip(*batch)
+    return torch.stack(tensors), list(indices)
+
+
 class LocationRecognizer:
-    def __init__(self, csv_file: str, image_folder: str, cache_file: str = None):
+    def __init__(self, csv_file: str, image_folder: str, cache_file: str = None,
+                 index_type: str = "brute", index_params: Optional[Dict] = None, index_file: str = None,
+                 batch_size: int = 32, num_workers: Optional[int] = None, rebuild: bool = False,
+                 store_dir: str = None):
         self.csv_file = csv_file
         self.image_folder = image_folder
         self.cache_file = cache_file # Defaults handled by caller or config
         self.database_matrix = None
         self.database_metadata = None
+        self.base_alive = None
+        self.delta_matrix = None
+        self.delta_metadata = LocationColumns.from_rows([])
+        self.generation = 0
+        self._manifest_mtime = None
+        self.store = LocationStore(store_dir or f"{os.path.splitext(cache_file)[0]}_segments")
+        self.index_type = index_type
+        self.index_params = index_params or {}
+        self.index_file = index_file or self.store.index_path(index_type)
+        self.index = None
+        self.batch_size = batch_size
+        self.num_workers = min(4, os.cpu_count() or 1) if num_workers is None else num_workers
+        self.rebuild = rebuild
 
         self.model = self._setup_model()
         self.preprocess = self._setup_preprocessing()
@@ -42,9 +95,10 @@ class LocationRecognizer:
             transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
         ])
 
-    def _extract_features(self, image_path: str) -> Optional[np.ndarray]:
+    def _extract_features(self, image_path: str, image: Optional[np.ndarray] = None) -> Optional[np.ndarray]:
         try:
-            img = Image.open(image_path).convert("RGB")
+            # `image` is an already-decoded RGB array (e.g. a shared-memory view); otherwise decode the file
+            img = Image.fromarray(image) if image is not None else load_rgb(image_path)
             img_tensor = self.preprocess(img).unsqueeze(0)
 
             with torch.no_grad():
@@ -55,63 +109,249 @@ class LocationRecognizer:
             logger.error(f"Failed to extract features from {image_path}: {e}")
             return None
 
+    def _extract_features_batch(self, image_paths: List[str]):
+        """
+        Embeds many query images with stacked ResNet forwards of up to
+        batch_size images. Returns the feature matrix and the positions in
+        `image_paths` it covers; unreadable images are skipped.
+        """
+        tensors, valid = [], []
+        for i, image_path in enumerate(image_paths):
+            try:
+                tensors.append(self.preprocess(load_rgb(image_path)))
+                valid.append(i)
+            except Exception as e:
+                logger.error(f"Failed to extract features from {image_path}: {e}")
+
+        if not tensors:
+            return np.empty((0, 2048), dtype=np.float32), valid
+
+        vectors = []
+        with torch.no_grad():
+            for start in range(0, len(tensors), self.batch_size):
+                batch = torch.stack(tensors[start:start + self.batch_size])
+                vectors.append(self.model(batch).flatten(1).numpy())
+        return np.vstack(vectors), valid
+
     def _load_or_build_database(self):
-        if os.path.exists(self.cache_file):
-            self._load_cached_database()
-        else:
+        if self.rebuild:
             self._build_database()
+        elif self.store.is_empty():
+            if os.path.exists(self.cache_file):
+                self._import_cached_database()
+            else:
+                self._build_database()
+        self._load_segments()
 
-    def _load_cached_database(self):
+    def _import_cached_database(self):
+        # One-off migration of the legacy single-file pickle into the segment store
         with open(self.cache_file, 'rb') as f:
             cache = pickle.load(f)
-            self.database_matrix = cache['vectors']
-            self.database_metadata = cache['metadata']
-        logger.info(f"Loaded {len(self.database_matrix)} images from cache")
+        self.store.replace_all(cache['vectors'], cache['metadata'])
+        logger.info(f"Imported {len(cache['metadata'])} images from cache {self.cache_file}")
+
+    def _load_segments(self):
+        for _ in range(3):
+            manifest_mtime = self.store.manifest_mtime()
+            manifest = self.store.read_manifest()
+            try:
+                segments = [(seg, *self.store.read_segment(seg)) for seg in manifest["segments"]]
+                break
+            except FileNotFoundError:
+                # Compacted between reading the manifest and the segments; retry
+                continue
+        else:
+            raise RuntimeError(f"Could not read a consistent snapshot of {self.store.root}")
+
+        tombstones = manifest["tombstones"]
+        if segments:
+            base_segment, base_vectors, base_metadata = segments[0]
+        else:
+            # Empty store: nothing to search until the first segment is written
+            base_segment = {"file": "", "seq": 0, "rows": 0}
+            base_vectors, base_metadata = np.empty((0, 2048), dtype=np.float32), LocationColumns.from_rows([])
+
+        delta_vectors, delta_columns = [], []
+        for seg, vectors, metadata in segments[1:]:
+            alive = LocationStore.alive_mask(seg, metadata, tombstones)
+            delta_vectors.append(vectors[alive])
+            delta_columns.append(metadata.take(alive))
+        delta_metadata = LocationColumns.concat(delta_columns)
+
+        self.database_matrix = base_vectors
+        self.database_metadata = base_metadata
+        self.base_alive = LocationStore.alive_mask(base_segment, base_metadata, tombstones)
+        self.delta_matrix = np.vstack(delta_vectors) if len(delta_metadata) else None
+        self.delta_metadata = delta_metadata
+        self.generation = manifest["generation"]
+        self._manifest_mtime = manifest_mtime
+
+        fingerprint = LocationStore.base_fingerprint(base_segment)
+        if not len(base_metadata):
+            # An index over zero rows is never built (IVF/graph cannot train on it)
+            self.index = None
+        elif self.index is None or self.index.fingerprint != fingerprint:
+            self._load_or_build_index(fingerprint)
+
+        logger.info(f"Loaded location database generation {self.generation}: "
+                    f"{int(self.base_alive.sum())} base + {len(delta_metadata)} delta images")
+
+    def refresh(self) -> bool:
+        """Picks up segments written since the last load; a single stat() when nothing changed."""
+        if self.store.manifest_mtime() == self._manifest_mtime:
+            return False
+        self._load_segments()
+        return True
+
+    def _embed_rows(self, rows: List[Dict]):
+        """
+        Batched feature extraction: DataLoader workers decode/preprocess in
+        parallel and feed fixed-size batches to ResNet50. Returns the vector
+        matrix and the metadata of the rows that were embedded, in order.
+        """
+        loader = DataLoader(
+            _ImageRowDataset(rows, self.image_folder, self.preprocess),
+            batch_size=self.batch_size,
+            num_workers=self.num_workers,
+            collate_fn=_collate_valid
+        )
+
+        vectors = []
+        metadata = []
+        done = 0
+        start = time.perf_counter()
+        log_every = max(1, 100 // self.batch_size)
+
+        with torch.no_grad():
+            for batch_no, (tensors, indices) in enumerate(loader, 1):
+                done += self.batch_size
+                if tensors is not None:
+                    vectors.append(self.model(tensors).flatten(1).numpy())
+                    metadata.extend(rows[i] for i in indices)
+                if batch_no % log_every == 0:
+                    logger.info(f"Processed {min(done, len(rows))}/{len(rows)}")
+
+        elapsed = time.perf_counter() - start
+        rate = len(metadata) / elapsed if elapsed > 0 else 0.0
+        logger.info(f"Embedded {len(metadata)} images in {elapsed:.1f}s ({rate:.1f} images/sec, "
+                    f"batch_size={self.batch_size}, workers={self.num_workers})")
+
+        matrix = np.vstack(vectors) if vectors else np.empty((0, 2048), dtype=np.float32)
+        return matrix, metadata
 
     def _build_database(self):
         logger.info("Building database...")
+        rows = self._read_dataset_rows()
+
+        vectors, metadata = self._embed_rows(rows)
+        self.store.replace_all(vectors, metadata)
+        logger.info(f"Database built: {len(metadata)} images indexed")
+
+    def _read_dataset_rows(self) -> List[Dict]:
         df = pd.read_csv(self.csv_file)
-        database_vectors = []
-        database_metadata = []
-
-        total_images = len(df)
-        for idx, row in df.iterrows():
-            fname = row['filename']
-            full_path = os.path.join(self.image_folder, fname)
-
-            if os.path.exists(full_path):
-                vec = self._extract_features(full_path)
-                if vec is not None:
-                    database_vectors.append(vec)
-                    database_metadata.append({
-                        'filename': fname,
-                        'lat': row['lat'],
-                        'lng': row['lng']
-                    })
-                    if (idx + 1) % 100 == 0:
-                        logger.info(f"Processed {idx + 1}/{total_images}")
-
-        self.database_matrix = np.vstack(database_vectors)
-        self.database_metadata = database_metadata
-
-        with open(self.cache_file, 'wb') as f:
-            pickle.dump({
-                'vectors': self.database_matrix,
-                'metadata': self.database_metadata
-            }, f)
-        logger.info(f"Database built: {len(self.database_matrix)} images indexed")
-
-    def find_location(self, query_image_path: str, confidence_threshold: float = 0.3, verbose: bool = False) -> Optional[Dict]:
-        query_vec = self._extract_features(query_image_path)
-        if query_vec is None:
-            logger.error(f"Failed to process image: {query_image_path}")
-            return None
+        return [
+            {'filename': row['filename'], 'lat': row['lat'], 'lng': row['lng']}
+            for row in df.to_dict('records')
+            if os.path.exists(os.path.join(self.image_folder, row['filename']))
+        ]
+
+    def add_images(self, rows: List[Dict]) -> int:
+        """Embeds rows ({'filename', 'lat', 'lng'}, images under image_folder) into a new segment."""
+        vectors, metadata = self._embed_rows(rows)
+        self.store.append(vectors, metadata)
+        self.refresh()
+        return len(metadata)
+
+    def remove_images(self, filenames: List[str]) -> int:
+        removed = self.store.tombstone(filenames)
+        self.refresh()
+        return removed
+
+    def sync_with_dataset(self) -> Dict[str, int]:
+        """Adds rows new to (or moved in) the CSV and tombstones rows no longer listed in it."""
+        self.refresh()
+        current = {
+            row['filename']: (row['lat'], row['lng'])
+            for row, keep in zip(self.database_metadata, self.base_alive) if keep
+        }
+        current.update((row['filename'], (row['lat'], row['lng'])) for row in self.delta_metadata)
+
+        wanted = set(pd.read_csv(self.csv_file)['filename'])
+        rows = self._read_dataset_rows()
+        changed = [row for row in rows if current.get(row['filename']) != (row['lat'], row['lng'])]
+        removed = [fname for fname in current if fname not in wanted]
+
+        added = self.add_images(changed) if changed else 0
+        self.remove_images(removed)
+        return {"added": added, "removed": len(removed)}
+
+    def _load_or_build_index(self, fingerprint: str):
+        if os.path.exists(self.index_file):
+            try:
+                index = load_index(self.index_file, vectors=self.database_matrix)
+                if index.kind == self.index_type and index.fingerprint == fingerprint:
+                    self.index = index
+                    logger.info(f"Loaded {self.index_type} index from {self.index_file}")
+                    return
+                logger.info("Location index is stale, rebuilding")
+            except Exception as e:
+                logger.warning(f"Failed to load location index {self.index_file}: {e}")
+
+        self.index = build_base_index(self.database_matrix, fingerprint, self.index_type, self.index_file, **self.index_params)
+
+    def search_batch(self, query_vecs: np.ndarray, top_k: int = 1, effort: Optional[int] = None) -> List[List[Dict]]:
+        """
+        Ranked matches for each row of `query_vecs`, in one index call.
+        Tombstoned base rows are filtered out of an over-fetch capped at
+        TOMBSTONE_OVERFETCH (the compactor clears them once they pass a
+        fraction of the base); a query left with fewer than top_k live base
+        hits falls back to an exact scan of the live base rows.
+        """
+        queries = normalize_rows(np.atleast_2d(query_vecs))
+        n_alive = int(self.base_alive.sum())
+        dead = len(self.base_alive) - n_alive
+        if self.index is not None:
+            ids, scores = self.index.search(query_vecs, k=top_k + min(dead, TOMBSTONE_OVERFETCH), effort=effort)
+        else:
+            ids = np.full((len(queries), 0), -1, dtype=np.int64)
+            scores = np.empty((len(queries), 0), dtype=np.float32)
+
+        # Delta segments are small between compactions and are scanned exactly
+        delta_scores = None
+        if self.delta_matrix is not None:
+            delta_scores = queries @ self.delta_matrix.T
 
-        scores = cosine_similarity(query_vec, self.database_matrix)
-        best_match_index = np.argmax(scores)
-        best_score = scores[0][best_match_index]
+        ranked = []
+        for row in range(len(ids)):
+            matches = [
+                (float(score), self.database_metadata[i])
+                for i, score in zip(ids[row], scores[row]) if i >= 0 and self.base_alive[i]
+            ]
+            if dead and len(matches) < min(top_k, n_alive):
+                matches = self._exact_live_matches(queries[row], top_k)
+            if delta_scores is not None:
+                for i in np.argsort(-delta_scores[row])[:top_k]:
+                    matches.append((float(delta_scores[row, i]), self.delta_metadata[i]))
 
-        result = self.database_metadata[best_match_index]
+            matches.sort(key=lambda m: -m[0])
+            ranked.append([{**meta, 'confidence': score} for score, meta in matches[:top_k]])
+        return ranked
+
+    def _exact_live_matches(self, query: np.ndarray, top_k: int):
+        scores = np.where(self.base_alive, self.database_matrix @ query, -np.inf)
+        best = np.argsort(-scores)[:top_k]
+        return [(float(scores[i]), self.database_metadata[int(i)]) for i in best if self.base_alive[i]]
+
+    def search(self, query_vec: np.ndarray, top_k: int = 1, effort: Optional[int] = None) -> List[Dict]:
+        return self.search_batch(query_vec, top_k=top_k, effort=effort)[0]
+
+    def _location_result(self, matches: List[Dict], confidence_threshold: float, verbose: bool, top_k: int) -> Optional[Dict]:
+        if not matches:
+            logger.error("Location index returned no candidates")
+            return None
+
+        result = matches[0]
+        best_score = result['confidence']
 
         if best_score < confidence_threshold:
             logger.warning(f"Low confidence: {best_score:.4f}")
@@ -119,4 +359,37 @@ class LocationRecognizer:
         if verbose:
             logger.info(f"Match: {result['filename']} | Confidence: {best_score:.4f} | GPS: ({result['lat']}, {result['lng']})")
 
-        return {**result, 'confidence': best_score}
+        if top_k > 1:
+            return {**result, 'candidates': matches}
+        return result
+
+    def find_location(self, query_image_path: str, confidence_threshold: float = 0.3, verbose: bool = False,
+                      top_k: int = 1, effort: Optional[int] = None, image: Optional[np.ndarray] = None) -> Optional[Dict]:
+        """
+        Best-matching location for an image. `effort` trades recall for latency
+        on approximate indexes (IVF lists probed / graph beam width). With
+        top_k > 1 the ranked matches are included under 'candidates'. Pass
+        `image` (RGB uint8) to skip decoding `query_image_path`.
+        """
+        self.refresh()
+
+        query_vec = self._extract_features(query_image_path, image=image)
+        if query_vec is None:
+            logger.error(f"Failed to process image: {query_image_path}")
+            return None
+
+        return self._location_result(self.search(query_vec, top_k=top_k, effort=effort), confidence_threshold, verbose, top_k)
+
+    def find_locations(self, query_image_paths: List[str], confidence_threshold: float = 0.3, verbose: bool = False,
+                       top_k: int = 1, effort: Optional[int] = None) -> List[Optional[Dict]]:
+        """find_location for many images: one batched ResNet pass and one index search. None for images that failed."""
+        self.refresh()
+
+        query_vecs, valid = self._extract_features_batch(query_image_paths)
+        results = [None] * len(query_image_paths)
+        if not valid:
+            return results
+
+        for pos, matches in zip(valid, self.search_batch(query_vecs, top_k=top_k, effort=effort)):
+            results[pos] = self._location_result(matches, confidence_threshold, verbose, top_k)
+        return results
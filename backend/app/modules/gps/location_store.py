@@ -0,0 +1,371 @@
+import os
+import json
+import time
+import shutil
+import pickle
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from backend.app.core.vector_index import build_index, normalize_rows
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "manifest.json"
+LOCK_NAME = ".lock"
+STALE_LOCK_SECONDS = 3600
+
+
+class LocationColumns:
+    """
+    Columnar (filename, lat, lng) metadata. Columns are usually read-only
+    memory maps; rows are materialised as dicts only when accessed.
+    """
+
+    def __init__(self, filenames: np.ndarray, lats: np.ndarray, lngs: np.ndarray):
+        self.filenames = filenames
+        self.lats = lats
+        self.lngs = lngs
+
+    @classmethod
+    def from_rows(cls, rows: List[Dict]) -> "LocationColumns":
+        return cls(
+            np.array([row['filename'].encode('utf-8') for row in rows], dtype=np.bytes_) if rows else np.empty(0, dtype='S1'),
+            np.array([row['lat'] for row in rows], dtype=np.float64),
+            np.array([row['lng'] for row in rows], dtype=np.float64)
+        )
+
+    @classmethod
+    def concat(cls, parts: List["LocationColumns"]) -> "LocationColumns":
+        if not parts:
+            return cls.from_rows([])
+        return cls(
+            np.concatenate([p.filenames for p in parts]),
+            np.concatenate([p.lats for p in parts]),
+            np.concatenate([p.lngs for p in parts])
+        )
+
+    def take(self, selector) -> "LocationColumns":
+        return LocationColumns(self.filenames[selector], self.lats[selector], self.lngs[selector])
+
+    def __len__(self):
+        return len(self.filenames)
+
+    def __getitem__(self, i) -> Dict:
+        return {
+            'filename': self.filenames[i].decode('utf-8'),
+            'lat': float(self.lats[i]),
+            'lng': float(self.lngs[i])
+        }
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+class LocationStore:
+    """
+    Append-only, segmented location database.
+
+    Every write produces a new immutable segment and atomically replaces manifest.json, which lists the live segments in
+    order and the tombstoned filenames. Each segment carries a sequence
+    number; a tombstone hides rows of that filename in segments up to its
+    own sequence, so re-adding an image after removing it works. Compaction
+    folds all live rows into one base segment and clears the tombstones.
+
+    A segment is a directory of .npy files: ``vectors.npy`` holds the
+    L2-normalised float32 embeddings as one contiguous array, and
+    ``filename.npy`` / ``lat.npy`` / ``lng.npy`` hold the metadata columns.
+    Segments are opened with mmap, so loading is near-instant and every
+    process serving the same store shares the same page-cache pages.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self.manifest_path = os.path.join(root, MANIFEST_NAME)
+        os.makedirs(root, exist_ok=True)
+
+    def read_manifest(self) -> Dict:
+        if not os.path.exists(self.manifest_path):
+            return {"generation": 0, "next_seq": 1, "segments": [], "tombstones": {}}
+        with open(self.manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def manifest_mtime(self) -> int:
+        try:
+            return os.stat(self.manifest_path).st_mtime_ns
+        except FileNotFoundError:
+            return 0
+
+    def _write_manifest(self, manifest: Dict):
+        manifest["generation"] += 1
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        os.replace(tmp_path, self.manifest_path)
+
+    @contextmanager
+    def _writer_lock(self, timeout: float = 60.0):
+        # Cross-process single-writer lock; readers never take it
+        lock_path = os.path.join(self.root, LOCK_NAME)
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                break
+            except FileExistsError:
+                try:
+                    if time.time() - os.stat(lock_path).st_mtime > STALE_LOCK_SECONDS:
+                        os.remove(lock_path)
+                        continue
+                except FileNotFoundError:
+                    continue
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"Timed out waiting for {lock_path}")
+                time.sleep(0.1)
+        try:
+            os.write(fd, str(os.getpid()).encode())
+            os.close(fd)
+            yield
+        finally:
+            try:
+                os.remove(lock_path)
+            except FileNotFoundError:
+                pass
+
+    def _segment_path(self, name: str) -> str:
+        return os.path.join(self.root, name)
+
+    def _write_segment(self, seq: int, vectors: np.ndarray, metadata) -> Dict:
+        if not isinstance(metadata, LocationColumns):
+            metadata = LocationColumns.from_rows(metadata)
+        name = f"segment-{seq:08d}"
+        tmp_dir = self._segment_path(name) + ".tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        np.save(os.path.join(tmp_dir, "vectors.npy"), normalize_rows(vectors))
+        np.save(os.path.join(tmp_dir, "filename.npy"), metadata.filenames)
+        np.save(os.path.join(tmp_dir, "lat.npy"), metadata.lats)
+        np.save(os.path.join(tmp_dir, "lng.npy"), metadata.lngs)
+        os.replace(tmp_dir, self._segment_path(name))
+        return {"file": name, "seq": seq, "rows": len(metadata)}
+
+    def read_segment(self, segment: Dict) -> Tuple[np.ndarray, LocationColumns]:
+        path = self._segment_path(segment["file"])
+        if segment["file"].endswith(".pkl"):
+            # Pickled segments from older stores; rewritten by the next compaction
+            with open(path, 'rb') as f:
+                data = pickle.load(f)
+            return normalize_rows(data['vectors']), LocationColumns.from_rows(data['metadata'])
+
+        def column(name):
+            return np.load(os.path.join(path, f"{name}.npy"), mmap_mode='r')
+
+        return column("vectors"), LocationColumns(column("filename"), column("lat"), column("lng"))
+
+    def index_path(self, index_type: str) -> str:
+        return os.path.join(self.root, f"{index_type}.index.npz")
+
+    @staticmethod
+    def base_fingerprint(segment: Dict) -> str:
+        # Segment files are immutable, so the base segment's name identifies its contents
+        return f"{segment['file']}:{segment['rows']}"
+
+    def is_empty(self) -> bool:
+        return not self.read_manifest()["segments"]
+
+    def replace_all(self, vectors: np.ndarray, metadata) -> Dict:
+        """Writes a fresh base segment that supersedes everything in the store."""
+        with self._writer_lock():
+            manifest = self.read_manifest()
+            old = manifest["segments"]
+            seq = manifest["next_seq"]
+            manifest["segments"] = [self._write_segment(seq, vectors, metadata)]
+            manifest["tombstones"] = {}
+            manifest["next_seq"] = seq + 1
+            self._write_manifest(manifest)
+        self._remove_segment_files(old)
+        return manifest
+
+    def append(self, vectors: np.ndarray, metadata) -> Optional[Dict]:
+        """Adds rows as a new segment; older rows with the same filenames are superseded."""
+        if not metadata:
+            return None
+        with self._writer_lock():
+            manifest = self.read_manifest()
+            seq = manifest["next_seq"]
+            segment = self._write_segment(seq, vectors, metadata)
+            for row in metadata:
+                manifest["tombstones"][row['filename']] = seq - 1
+            manifest["segments"].append(segment)
+            manifest["next_seq"] = seq + 1
+            self._write_manifest(manifest)
+        logger.info(f"Appended segment {segment['file']} with {segment['rows']} rows")
+        return segment
+
+    def tombstone(self, filenames: List[str]) -> int:
+        if not filenames:
+            return 0
+        with self._writer_lock():
+            manifest = self.read_manifest()
+            seq = manifest["next_seq"]
+            for fname in filenames:
+                manifest["tombstones"][fname] = seq
+            # Consume the sequence so rows appended later stay visible
+            manifest["next_seq"] = seq + 1
+            self._write_manifest(manifest)
+        logger.info(f"Tombstoned {len(filenames)} rows")
+        return len(filenames)
+
+    @staticmethod
+    def alive_mask(segment: Dict, metadata: LocationColumns, tombstones: Dict[str, int]) -> np.ndarray:
+        dead = [fname.encode('utf-8') for fname, seq in tombstones.items() if seq >= segment["seq"]]
+        if not dead:
+            return np.ones(len(metadata), dtype=bool)
+        return ~np.isin(metadata.filenames, np.array(dead, dtype=np.bytes_))
+
+    def compact(self, min_segments: int = 2, on_segment=None) -> bool:
+        """
+        Merges every live row into a single base segment. Returns True if a
+        compaction was published. `on_segment(segment, vectors)` runs after
+        the new segment is written but before the manifest is published; it
+        is skipped when no live rows remain.
+
+        The writer lock is only held to reserve the new segment's sequence
+        and to publish: reading, writing and on_segment (e.g. a base index
+        build) run without it, so appends and tombstones are not blocked.
+        Rows they add meanwhile stay in the manifest after the new base.
+        """
+        manifest = self.read_manifest()
+        if len(manifest["segments"]) < min_segments and not manifest["tombstones"]:
+            return False
+
+        with self._writer_lock():
+            manifest = self.read_manifest()
+            old = manifest["segments"]
+            if not old:
+                return False
+            # Reserve a sequence: later appends/tombstones get higher ones and so apply on top of the new base
+            seq = manifest["next_seq"]
+            manifest["next_seq"] = seq + 1
+            self._write_manifest(manifest)
+        tombstones = manifest["tombstones"]
+
+        vectors, columns = [], []
+        for segment in old:
+            seg_vectors, seg_metadata = self.read_segment(segment)
+            alive = self.alive_mask(segment, seg_metadata, tombstones)
+            vectors.append(seg_vectors[alive])
+            columns.append(seg_metadata.take(alive))
+
+        vectors = np.vstack(vectors)
+        metadata = LocationColumns.concat(columns)
+        segment = self._write_segment(seq, vectors, metadata)
+        try:
+            if on_segment is not None and len(metadata):
+                on_segment(segment, vectors)
+
+            with self._writer_lock():
+                current = self.read_manifest()
+                current_files = {s["file"] for s in current["segments"]}
+                if not all(s["file"] in current_files for s in old):
+                    # Another compaction published first; its base already covers these rows
+                    logger.info(f"Discarding compaction into {segment['file']}: store changed underneath")
+                    self._remove_segment_files([segment])
+                    return False
+                old_files = {s["file"] for s in old}
+                current["segments"] = [segment] + [s for s in current["segments"] if s["file"] not in old_files]
+                # Tombstones older than the reserved sequence are applied in the new base
+                current["tombstones"] = {fname: t for fname, t in current["tombstones"].items() if t >= seq}
+                self._write_manifest(current)
+        except BaseException:
+            self._remove_segment_files([segment])
+            raise
+
+        self._remove_segment_files(old)
+        logger.info(f"Compacted {len(old)} segments into {segment['file']} ({len(metadata)} rows)")
+        return True
+
+    def _remove_segment_files(self, segments: List[Dict]):
+        # Readers that still map the old files keep them alive until they reload
+        for segment in segments:
+            path = self._segment_path(segment["file"])
+            try:
+                if os.path.isdir(path):
+                    shutil.rmtree(path)
+                else:
+                    os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"Could not remove old segment {segment['file']}: {e}")
+
+
+def build_base_index(vectors: np.ndarray, fingerprint: str, index_type: str, index_file: str, **params):
+    logger.info(f"Building {index_type} index over {len(vectors)} vectors...")
+    # Store vectors are already normalised; the index references them instead of copying
+    index = build_index(index_type, vectors, metric="cosine", normalized=True, **params)
+    index.fingerprint = fingerprint
+    try:
+        index.save(index_file, include_vectors=False)
+    except Exception as e:
+        logger.warning(f"Failed to persist location index {index_file}: {e}")
+    return index
+
+
+class SegmentCompactor:
+    """
+    Background thread that compacts the store once enough segments or
+    tombstones pile up. With `index_type` set it also builds the persisted
+    base index for the new segment before publishing it, so serving
+    processes load that index instead of each rebuilding it.
+    """
+
+    def __init__(self, store: LocationStore, interval: float = 60.0, max_segments: int = 4, max_tombstones: int = 1000,
+                 index_type: Optional[str] = None, index_params: Optional[Dict] = None, max_dead_fraction: float = 0.05):
+        self.store = store
+        self.index_type = index_type
+        self.index_params = index_params or {}
+        self.interval = interval
+        self.max_segments = max_segments
+        self.max_tombstones = max_tombstones
+        self.max_dead_fraction = max_dead_fraction
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="location-compactor", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                if self.due(self.store.read_manifest()):
+                    self.store.compact(min_segments=1, on_segment=self._build_index if self.index_type else None)
+            except Exception as e:
+                logger.error(f"Location store compaction failed: {e}")
+
+    def due(self, manifest: Dict) -> bool:
+        """
+        Too many segments or tombstones. Tombstones are also counted against
+        the base segment's size, since searches over-fetch the base index
+        by the number of dead rows.
+        """
+        segments, tombstones = manifest["segments"], len(manifest["tombstones"])
+        if len(segments) >= self.max_segments or tombstones >= self.max_tombstones:
+            return True
+        return bool(segments) and tombstones > 0 and tombstones >= self.max_dead_fraction * segments[0]["rows"]
+
+    def _build_index(self, segment: Dict, vectors: np.ndarray):
+        build_base_index(vectors, self.store.base_fingerprint(segment), self.index_type,
+                         self.store.index_path(self.index_type), **self.index_params)
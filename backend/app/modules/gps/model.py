@@ -6,6 +6,7 @@ import os
 import numpy as np
 from backend.app.modules.gps.location_recognizer import LocationRecognizer
 from backend.app.core import config
+from backend.app.core.shared_image import open_shared_image
 
 logging.basicConfig(
     level=logging.INFO,
@@ -14,22 +15,96 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+def convert_numpy(obj):
+    if isinstance(obj, np.integer):
+        return int(obj)
+    elif isinstance(obj, np.floating):
+        return float(obj)
+    elif isinstance(obj, np.ndarray):
+        return obj.tolist()
+    return obj
+
+def load_recognizer(**overrides):
+    options = {
+        "index_type": config.GPS_INDEX_TYPE,
+        "batch_size": config.GPS_BUILD_BATCH_SIZE,
+        "num_workers": config.GPS_BUILD_WORKERS,
+        **overrides
+    }
+    return LocationRecognizer(
+        csv_file=str(config.DATA_DIR / 'dataset.csv'),
+        image_folder=str(config.DATA_DIR / 'images'),
+        cache_file=str(config.DATABASE_CACHE_PATH),
+        store_dir=str(config.LOCATION_DB_DIR),
+        **options
+    )
+
+def locate(recognizer, image_path, top_k=1, effort=None, image=None):
+    result = recognizer.find_location(image_path, top_k=top_k, effort=effort or config.GPS_SEARCH_EFFORT, image=image)
+
+    if result:
+        return {k: convert_numpy(v) for k, v in result.items()}
+    return {"error": "No location found"}
+
+def locate_batch(recognizer, image_paths, top_k=1, effort=None):
+    results = recognizer.find_locations(image_paths, top_k=top_k, effort=effort or config.GPS_SEARCH_EFFORT)
+    return [
+        {k: convert_numpy(v) for k, v in result.items()} if result else {"error": "No location found"}
+        for result in results
+    ]
+
+def create_worker():
+    """Entry point for the resident worker pool: loads ResNet50 and the location database once per process."""
+    recognizer = load_recognizer()
+
+    def analyze(image_path, top_k=1, effort=None, image=None):
+        if image is not None:
+            with open_shared_image(image) as pixels:
+                return locate(recognizer, image_path, top_k=top_k, effort=effort, image=pixels)
+        if not os.path.exists(image_path):
+            raise FileNotFoundError(f"Image file not found: {image_path}")
+        return locate(recognizer, image_path, top_k=top_k, effort=effort)
+
+    def analyze_batch(image_paths, top_k=1, effort=None):
+        return locate_batch(recognizer, image_paths, top_k=top_k, effort=effort)
+
+    return {"analyze": analyze, "analyze_batch": analyze_batch}
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Location Recognition Module")
     parser.add_argument("image_path", nargs="?", help="Path to the input image")
     parser.add_argument("--image", dest="image_arg", help="Path to the input image (alternative)")
-    
+    parser.add_argument("--top-k", type=int, default=1, help="Number of ranked candidate locations to return")
+    parser.add_argument("--effort", type=int, default=None, help="Search effort for approximate indexes (IVF probes / graph beam width)")
+    parser.add_argument("--rebuild", action="store_true", help="Re-embed the whole location database before running")
+    parser.add_argument("--batch-size", type=int, default=config.GPS_BUILD_BATCH_SIZE, help="Images per ResNet batch when building the database")
+    parser.add_argument("--workers", type=int, default=config.GPS_BUILD_WORKERS, help="Image decode/preprocess workers when building the database")
+    parser.add_argument("--sync", action="store_true", help="Embed rows added to dataset.csv and tombstone rows removed from it")
+    parser.add_argument("--remove", nargs="+", metavar="FILENAME", help="Tombstone images from the location database")
+    parser.add_argument("--compact", action="store_true", help="Merge all location segments into one")
+
     args = parser.parse_args()
-    
+
     image_path = args.image_path or args.image_arg
-    
+    build_options = {"batch_size": args.batch_size, "num_workers": args.workers, "rebuild": args.rebuild}
+
+    if args.sync or args.remove or args.compact:
+        recognizer = load_recognizer(**build_options)
+        summary = {"generation": recognizer.generation}
+        if args.sync:
+            summary.update(recognizer.sync_with_dataset())
+        if args.remove:
+            summary["removed"] = recognizer.remove_images(args.remove)
+        if args.compact:
+            summary["compacted"] = recognizer.store.compact(min_segments=1)
+            recognizer.refresh()
+        summary["generation"] = recognizer.generation
+        print(json.dumps(summary))
+        sys.exit(0)
+
     if not image_path:
         logger.info("No image path provided. Running default initialization test.")
-        recognizer = LocationRecognizer(
-            csv_file=str(config.DATA_DIR / 'dataset.csv'),
-            image_folder=str(config.DATA_DIR / 'images'),
-            cache_file=str(config.DATABASE_CACHE_PATH)
-        )
+        recognizer = load_recognizer(**build_options)
         logger.info("LocationRecognizer initialized successfully")
         sys.exit(0)
 
@@ -38,30 +113,10 @@ if __name__ == "__main__":
         sys.exit(1)
 
     try:
-        recognizer = LocationRecognizer(
-            csv_file=str(config.DATA_DIR / 'dataset.csv'),
-            image_folder=str(config.DATA_DIR / 'images'),
-            cache_file=str(config.DATABASE_CACHE_PATH)
-        )
-        
-        result = recognizer.find_location(image_path)
-        
-        if result:
-            def convert_numpy(obj):
-                if isinstance(obj, np.integer):
-                    return int(obj)
-                elif isinstance(obj, np.floating):
-                    return float(obj)
-                elif isinstance(obj, np.ndarray):
-                    return obj.tolist()
-                return obj
-                
-            clean_result = {k: convert_numpy(v) for k, v in result.items()}
-            print(json.dumps(clean_result))
-        else:
-            print(json.dumps({"error": "No location found"}))
-            
+        recognizer = load_recognizer(**build_options)
+        print(json.dumps(locate(recognizer, image_path, top_k=args.top_k, effort=args.effort)))
+
     except Exception as e:
         logger.error(f"Error in main execution: {e}")
         print(json.dumps({"error": str(e)}))
-        sys.exit(1)
\ No newline at end of file
+        sys.exit(1)
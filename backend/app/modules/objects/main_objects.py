@@ -2,26 +2,24 @@ import argparse
 import json
 import sys
 import os
+import time
+import hashlib
+import uuid
 import cv2
+import numpy as np
+import torch
+from contextlib import contextmanager
 from datetime import datetime
 from ultralytics import YOLO
+from ultralytics.engine.results import Results
 
 from backend.app.core import config
+from backend.app.core.annotations import render_annotation
+from backend.app.core.shared_image import open_shared_image
+from backend.app.modules.objects.vocabulary import CUSTOM_VOCABULARY, VOCABULARY_PROFILES
 
 MODEL_NAME = str(config.MODELS_DIR / "yolov8x-worldv2.pt") 
-
-# Custom Vocabulary for YOLO-World
-CUSTOM_VOCABULARY = [
-    # Standard Objects
-    "person", "man", "woman", "child",
-    "bicycle", "car", "motorcycle", "bus", "truck", 
-    "backpack", "handbag", "suitcase", "luggage",
-    
-    # Weapons - High Threat
-    "knife", "kitchen knife", "dagger", "blade", "sharp object",
-    "scissors", "shears",
-    "gun", "pistol", "handgun", "revolver", "rifle", "shotgun", "firearm", "weapon", "assault rifle", "machine gun"
-]
+SCREEN_MODEL_NAME = config.OBJECTS_SCREEN_MODEL
 
 AR_LABELS = {
     "person": "شخص",
@@ -88,14 +86,74 @@ def calculate_threat(detections):
 
     return "LOW", set()
 
-def main():
-    parser = argparse.ArgumentParser(description="Security Object Detection Pipeline")
-    parser.add_argument("image_path", type=str, help="Path to the input image")
-    parser.add_argument("--output", type=str, default=None, help="Path to save the annotated output image")
-    parser.add_argument("--conf", type=float, default=0.05, help="Confidence threshold")
-    parser.add_argument("--imgsz", type=int, default=1280, help="Inference image size")
-    args = parser.parse_args()
+VOCAB_CACHE_DIR = config.MODELS_DIR / "vocab_cache"
+
+# In-process copies of the text embeddings, keyed like the files on disk
+_text_features = {}
+
+def vocabulary_key(model_name, classes):
+    digest = hashlib.sha256(json.dumps([os.path.basename(model_name), list(classes)]).encode("utf-8"))
+    return digest.hexdigest()[:32]
+
+def _attach_text_features(model, classes, txt_feats):
+    # Mirrors YOLO.set_classes without running the text encoder
+    world = model.model
+    world.txt_feats = txt_feats
+    world.model[-1].nc = len(classes)
+    world.names = list(classes)
+    if model.predictor is not None:
+        model.predictor.model.names = list(classes)
+
+def apply_vocabulary(model, classes, model_name=MODEL_NAME):
+    """
+    Points a YOLO-World model at `classes`. Text embeddings are encoded once
+    per (model, vocabulary), persisted under models/vocab_cache and reused
+    from memory afterwards, so switching profiles costs a tensor assignment.
+    """
+    classes = list(classes)
+    key = vocabulary_key(model_name, classes)
+    if getattr(model, "_vocabulary_key", None) == key:
+        return
+
+    if not hasattr(model.model, "txt_feats"):
+        # Older Ultralytics without exposed text features: encode every time
+        model.set_classes(classes)
+        model._vocabulary_key = key
+        return
+
+    cache_path = VOCAB_CACHE_DIR / f"{key}.pt"
+    txt_feats = _text_features.get(key)
+    if txt_feats is None and cache_path.exists():
+        try:
+            txt_feats = torch.load(cache_path, map_location="cpu")
+        except Exception as e:
+            sys.stderr.write(f"Warning: Ignoring unreadable vocabulary cache {cache_path}: {e}\n")
+
+    if txt_feats is None:
+        model.set_classes(classes)
+        txt_feats = model.model.txt_feats.detach().cpu()
+        try:
+            VOCAB_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+            # Unique per writer: several workers may encode the same vocabulary at once
+            tmp_path = cache_path.with_suffix(f".{os.getpid()}.{uuid.uuid4().hex}.tmp")
+            torch.save(txt_feats, tmp_path)
+            os.replace(tmp_path, cache_path)
+        except Exception as e:
+            sys.stderr.write(f"Warning: Could not persist vocabulary embeddings: {e}\n")
+    else:
+        _attach_text_features(model, classes, txt_feats)
+
+    _text_features[key] = txt_feats
+    model._vocabulary_key = key
 
+def resolve_vocabulary(profile):
+    if profile is None:
+        return CUSTOM_VOCABULARY
+    if profile not in VOCABULARY_PROFILES:
+        raise ValueError(f"Unknown vocabulary profile: {profile} (choose from {', '.join(VOCABULARY_PROFILES)})")
+    return VOCABULARY_PROFILES[profile]
+
+def load_model():
     try:
         model = YOLO(MODEL_NAME)
     except Exception as e:
@@ -107,37 +165,181 @@ def main():
 
     if "world" in MODEL_NAME:
         try:
-            model.set_classes(CUSTOM_VOCABULARY)
+            apply_vocabulary(model, CUSTOM_VOCABULARY)
         except Exception as e:
             sys.stderr.write(f"Warning: Could not set custom classes: {e}\n")
 
-    results = model.predict(
-        args.image_path, 
-        conf=args.conf, 
+    return model
+
+def _predict(model, source, conf, imgsz):
+    return model.predict(
+        source, 
+        conf=conf, 
         augment=True, 
         verbose=False, 
-        imgsz=args.imgsz,
+        imgsz=imgsz,
         agnostic_nms=True,
         iou=0.5
     )
-    
-    result = results[0]
-    
-    annotated_img = result.plot()
-    
-    if args.output:
-        output_path = args.output
-    else:
-        base_name = os.path.basename(args.image_path)
-        output_path = f"detected_{base_name}"
-        
-    cv2.imwrite(output_path, annotated_img)
-    
+
+# Cross-tile merge: any-class IoU (the model's own agnostic NMS threshold), and the share of a
+# tile-edge-cut box lying inside a same-class box above which it is taken as a partial copy
+TILE_MERGE_IOU = 0.5
+TILE_MERGE_IOS = 0.6
+# Boxes this close to a tile border inside the frame are treated as cut by it
+TILE_EDGE_PX = 2
+
+def tile_windows(width, height, tile_size, overlap):
+    """
+    (x1, y1, x2, y2) windows of at most tile_size covering a width x height
+    frame, neighbours overlapping by `overlap` of a tile; the last row and
+    column are aligned to the frame edge.
+    """
+    stride = max(1, int(tile_size * (1 - overlap)))
+
+    def starts(length):
+        if length <= tile_size:
+            return [0]
+        return list(range(0, length - tile_size, stride)) + [length - tile_size]
+
+    return [(x, y, min(x + tile_size, width), min(y + tile_size, height))
+            for y in starts(height) for x in starts(width)]
+
+def merge_tile_detections(boxes, scores, classes, cut, iou=TILE_MERGE_IOU, ios=TILE_MERGE_IOS):
+    """
+    Greedy cross-tile NMS over frame-coordinate boxes; returns kept indices.
+    Uncut boxes are visited first, then by score. A box is dropped when it
+    overlaps a kept one by IoU >= iou (any class), or when it is cut by a
+    tile border and at least `ios` of it lies inside a kept box of the
+    same class (the partial copy of an object split between tiles).
+    """
+    areas = np.maximum(boxes[:, 2] - boxes[:, 0], 0) * np.maximum(boxes[:, 3] - boxes[:, 1], 0)
+    order = np.lexsort((-scores, cut))
+    keep = []
+    while order.size:
+        i, rest = order[0], order[1:]
+        keep.append(i)
+        inter = (np.clip(np.minimum(boxes[i, 2], boxes[rest, 2]) - np.maximum(boxes[i, 0], boxes[rest, 0]), 0, None) *
+                 np.clip(np.minimum(boxes[i, 3], boxes[rest, 3]) - np.maximum(boxes[i, 1], boxes[rest, 1]), 0, None))
+        overlap = inter / np.maximum(areas[i] + areas[rest] - inter, 1e-9)
+        inside = inter / np.maximum(areas[rest], 1e-9)
+        drop = (overlap >= iou) | (cut[rest] & (classes[rest] == classes[i]) & (inside >= ios))
+        order = rest[~drop]
+    return np.array(keep, dtype=np.int64)
+
+@contextmanager
+def _thread_budget(threads):
+    # Caps torch's intra-op CPU threads for the duration of a call (0 leaves them alone)
+    previous = torch.get_num_threads()
+    if threads:
+        torch.set_num_threads(threads)
+    try:
+        yield
+    finally:
+        if threads:
+            torch.set_num_threads(previous)
+
+def _predict_tiled(model, frame, image_path, conf, imgsz, tile_size, overlap):
+    """
+    Sliced inference on one BGR frame: every tile plus the whole frame go
+    through _predict as a single batch, tile boxes are shifted to frame
+    coordinates and merged with merge_tile_detections. Returns a Results
+    for the full frame (so parse_result handles it like any other) and a
+    summary for meta.tiling.
+    """
+    start = time.perf_counter()
+    height, width = frame.shape[:2]
+    windows = tile_windows(width, height, tile_size, overlap)
+    tiles = [np.ascontiguousarray(frame[y1:y2, x1:x2]) for x1, y1, x2, y2 in windows]
+    with _thread_budget(config.OBJECTS_TILE_THREADS):
+        results = _predict(model, tiles + [frame], conf, imgsz)
+
+    parts, cut = [], []
+    for (x1, y1, x2, y2), result in zip(windows + [(0, 0, width, height)], results):
+        data = result.boxes.data.detach().cpu().clone()
+        data[:, [0, 2]] += x1
+        data[:, [1, 3]] += y1
+        parts.append(data)
+        # Only borders inside the frame cut objects; the frame edge is a real edge
+        edges = data[:, :4].numpy()
+        cut.append(((x1 > 0) & (edges[:, 0] - x1 <= TILE_EDGE_PX)) | ((x2 < width) & (x2 - edges[:, 2] <= TILE_EDGE_PX)) |
+                   ((y1 > 0) & (edges[:, 1] - y1 <= TILE_EDGE_PX)) | ((y2 < height) & (y2 - edges[:, 3] <= TILE_EDGE_PX)))
+
+    data = torch.cat(parts)
+    boxes = data.numpy()
+    keep = merge_tile_detections(boxes[:, :4], boxes[:, 4], boxes[:, 5], np.concatenate(cut))
+    merged = Results(orig_img=frame, path=str(image_path), names=results[-1].names, boxes=data[torch.from_numpy(keep)])
+    return merged, {
+        "tiles": len(windows),
+        "tile_size": tile_size,
+        "overlap": overlap,
+        "raw_detections": int(len(data)),
+        "merged_detections": int(len(keep)),
+        "ms": round((time.perf_counter() - start) * 1000, 1)
+    }
+
+def _predict_frames(model, sources, image_paths, conf, imgsz, tile_size=None, overlap=None):
+    """
+    _predict over a list of paths or BGR arrays, slicing frames whose long
+    side exceeds OBJECTS_TILE_MIN_SIDE (see _predict_tiled); the rest still
+    run as one batch. Returns the results and, per source, its tiling
+    summary or None. tile_size 0 disables slicing.
+    """
+    tile_size = config.OBJECTS_TILE_SIZE if tile_size is None else tile_size
+    overlap = config.OBJECTS_TILE_OVERLAP if overlap is None else overlap
+    if not tile_size:
+        return _predict(model, sources, conf, imgsz), [None] * len(sources)
+
+    frames = [source if isinstance(source, np.ndarray) else cv2.imread(str(source)) for source in sources]
+    # Unreadable paths go through _predict unchanged, which reports them as before
+    direct = [i for i, frame in enumerate(frames) if frame is None or max(frame.shape[:2]) <= config.OBJECTS_TILE_MIN_SIDE]
+    results, tiling = [None] * len(sources), [None] * len(sources)
+    if direct:
+        batch = [sources[i] if frames[i] is None else frames[i] for i in direct]
+        for i, result in zip(direct, _predict(model, batch, conf, imgsz)):
+            results[i] = result
+    for i, frame in enumerate(frames):
+        if results[i] is None:
+            results[i], tiling[i] = _predict_tiled(model, frame, image_paths[i], conf, imgsz, tile_size, overlap)
+    return results, tiling
+
+def _with_tiling(output, tiling):
+    if tiling is not None:
+        output["meta"]["tiling"] = tiling
+    return output
+
+def detect_objects(model, image_path, output_path=None, conf=0.05, imgsz=1280, image=None, tile_size=None):
+    # `image` is an already-decoded BGR array; image_path then only names the output
+    results, tiling = _predict_frames(model, [image if image is not None else image_path], [image_path], conf, imgsz,
+                                      tile_size=tile_size)
+    return _with_tiling(parse_result(model, results[0], image_path, output_path=output_path, imgsz=imgsz), tiling[0])
+
+def detect_objects_batch(model, image_paths, output_paths=None, conf=0.05, imgsz=1280, batch_size=None, tile_size=None):
+    """
+    detect_objects over many images: each predict call receives a list of up
+    to batch_size images, which Ultralytics runs as one batched forward pass.
+    Frames large enough to be sliced run as one batch of their own tiles.
+    """
+    batch_size = batch_size or config.OBJECTS_BATCH_SIZE
+    output_paths = output_paths or [None] * len(image_paths)
+    outputs = []
+    for start in range(0, len(image_paths), batch_size):
+        chunk = image_paths[start:start + batch_size]
+        results, tiling = _predict_frames(model, chunk, chunk, conf, imgsz, tile_size=tile_size)
+        for offset, result in enumerate(results):
+            i = start + offset
+            outputs.append(_with_tiling(
+                parse_result(model, result, image_paths[i], output_path=output_paths[i], imgsz=imgsz), tiling[offset]
+            ))
+    return outputs
+
+def parse_result(model, result, image_path, output_path=None, imgsz=1280, keep_labels=None):
+    # Annotation is rendered only when an output_path is asked for; the API renders it lazily from the detections
     parsed_detections = []
     
     for box in result.boxes:
         x1, y1, x2, y2 = box.xyxy[0].tolist()
-        conf = float(box.conf[0])
+        box_conf = float(box.conf[0])
         cls_id = int(box.cls[0])
         
         if hasattr(model, 'names'):
@@ -145,13 +347,16 @@ def main():
         else:
             label_en = str(cls_id)
 
+        if keep_labels is not None and label_en not in keep_labels:
+            continue
+
         label_localized = translate_label(label_en)
 
         parsed_detections.append({
             "label": label_localized,
             "label_en": label_en,
             "class_id": cls_id,
-            "confidence": round(conf, 2),
+            "confidence": round(box_conf, 2),
             "box": {
                 "x1": int(x1),
                 "y1": int(y1),
@@ -172,12 +377,15 @@ def main():
             "threat_tag": i in threat_indices
         })
 
-    output = {
+    if output_path:
+        render_annotation(result.orig_img, final_detections, output_path)
+
+    return {
         "meta": {
             "timestamp": datetime.now().isoformat(),
             "model": MODEL_NAME,
             "output_image": output_path,
-            "imgsz": args.imgsz
+            "imgsz": imgsz
         },
         "summary": {
             "total_objects": len(final_detections),
@@ -187,6 +395,186 @@ def main():
         "detections": final_detections
     }
 
+# The screen escalates to the heavy model when it sees any of these
+ESCALATION_LABELS = {"person"} | HIGH_THREAT_LABELS
+
+def load_screen_model():
+    model = YOLO(SCREEN_MODEL_NAME)
+    if "world" in os.path.basename(SCREEN_MODEL_NAME):
+        try:
+            model.set_classes(sorted(ESCALATION_LABELS))
+        except Exception as e:
+            sys.stderr.write(f"Warning: Could not set screen classes: {e}\n")
+    return model
+
+class CascadeStats:
+    """Running per-process counters for the detection cascade."""
+
+    def __init__(self):
+        self.frames = 0
+        self.escalations = 0
+        self.screen_ms = 0.0
+        self.heavy_ms = 0.0
+
+    def record(self, escalated, screen_ms, heavy_ms):
+        self.frames += 1
+        self.escalations += int(escalated)
+        self.screen_ms += screen_ms
+        self.heavy_ms += heavy_ms
+
+    def snapshot(self):
+        return {
+            "frames": self.frames,
+            "escalations": self.escalations,
+            "escalation_rate": round(self.escalations / self.frames, 4) if self.frames else 0.0,
+            "avg_screen_ms": round(self.screen_ms / self.frames, 1) if self.frames else 0.0,
+            "avg_heavy_ms": round(self.heavy_ms / self.escalations, 1) if self.escalations else 0.0
+        }
+
+def screen_candidates(result, screen_conf):
+    """Escalation-worthy labels the screen found at or above screen_conf."""
+    found = set()
+    for box in result.boxes:
+        label_en = result.names[int(box.cls[0])]
+        if label_en in ESCALATION_LABELS and float(box.conf[0]) >= screen_conf:
+            found.add(label_en)
+    return sorted(found)
+
+def _screen(screen_model, source, imgsz, screen_conf):
+    # Plain single-scale inference: no TTA, low resolution
+    return screen_model.predict(source, conf=screen_conf, verbose=False, imgsz=imgsz)
+
+def detect_objects_cascade(screen_model, model, image_path, output_path=None, conf=0.05, imgsz=1280, image=None,
+                           screen_imgsz=None, screen_conf=None, stats=None, tile_size=None, vocabulary=None):
+    return detect_objects_cascade_batch(
+        screen_model, model, [image_path], output_paths=[output_path], conf=conf, imgsz=imgsz,
+        images=[image] if image is not None else None, screen_imgsz=screen_imgsz, screen_conf=screen_conf, stats=stats,
+        tile_size=tile_size, vocabulary=vocabulary
+    )[0]
+
+def detect_objects_cascade_batch(screen_model, model, image_paths, output_paths=None, conf=0.05, imgsz=1280, images=None,
+                                 screen_imgsz=None, screen_conf=None, stats=None, batch_size=None, tile_size=None,
+                                 vocabulary=None):
+    """
+    Two-tier detection. The small screen model runs on every frame at
+    screen_imgsz; only frames where it sees a person or a high-threat
+    candidate at screen_conf are re-run through the heavy open-vocabulary
+    model with TTA (sliced, for large frames, see _predict_frames). Other
+    frames keep the screen's detections of the vocabulary classes (the
+    resolved profile the heavy model uses; CUSTOM_VOCABULARY by default).
+    Each result's meta.cascade records the tier taken and per-tier timings.
+    """
+    screen_imgsz = screen_imgsz or config.OBJECTS_SCREEN_IMGSZ
+    screen_conf = config.OBJECTS_SCREEN_CONF if screen_conf is None else screen_conf
+    batch_size = batch_size or config.OBJECTS_BATCH_SIZE
+    output_paths = output_paths or [None] * len(image_paths)
+    sources = images or image_paths
+    vocabulary = set(vocabulary or CUSTOM_VOCABULARY)
+
+    outputs = [None] * len(image_paths)
+    for start in range(0, len(image_paths), batch_size):
+        chunk = list(range(start, min(start + batch_size, len(image_paths))))
+
+        t0 = time.perf_counter()
+        screened = _screen(screen_model, [sources[i] for i in chunk], screen_imgsz, screen_conf)
+        screen_ms = (time.perf_counter() - t0) * 1000 / len(chunk)
+
+        escalate = []
+        cascade = {}
+        for i, result in zip(chunk, screened):
+            candidates = screen_candidates(result, screen_conf)
+            cascade[i] = {"tier": "heavy" if candidates else "screen", "escalated": bool(candidates),
+                          "screen_candidates": candidates, "screen_ms": round(screen_ms, 1), "heavy_ms": 0.0}
+            if candidates:
+                escalate.append(i)
+            else:
+                outputs[i] = parse_result(screen_model, result, image_paths[i], output_path=output_paths[i],
+                                          imgsz=screen_imgsz, keep_labels=vocabulary)
+
+        if escalate:
+            t0 = time.perf_counter()
+            heavy, tiling = _predict_frames(model, [sources[i] for i in escalate], [image_paths[i] for i in escalate],
+                                            conf, imgsz, tile_size=tile_size)
+            heavy_ms = (time.perf_counter() - t0) * 1000 / len(escalate)
+            for i, result, frame_tiling in zip(escalate, heavy, tiling):
+                cascade[i]["heavy_ms"] = round(heavy_ms, 1)
+                outputs[i] = _with_tiling(
+                    parse_result(model, result, image_paths[i], output_path=output_paths[i], imgsz=imgsz), frame_tiling
+                )
+
+        for i in chunk:
+            if stats is not None:
+                stats.record(cascade[i]["escalated"], cascade[i]["screen_ms"], cascade[i]["heavy_ms"])
+            outputs[i]["meta"]["model"] = MODEL_NAME if cascade[i]["escalated"] else SCREEN_MODEL_NAME
+            outputs[i]["meta"]["cascade"] = cascade[i]
+
+    return outputs
+
+def create_worker():
+    """Entry point for the resident worker pool: loads YOLO once per process."""
+    model = load_model()
+    screen_model = load_screen_model() if config.OBJECTS_CASCADE else None
+    stats = CascadeStats()
+
+    def use_vocabulary(profile):
+        if "world" in MODEL_NAME:
+            apply_vocabulary(model, resolve_vocabulary(profile))
+
+    def run(image_path, output_path, conf, imgsz, image=None, cascade=None, vocabulary=None):
+        use_vocabulary(vocabulary)
+        if screen_model is not None and cascade is not False:
+            return detect_objects_cascade(screen_model, model, image_path, output_path=output_path, conf=conf,
+                                          imgsz=imgsz, image=image, stats=stats,
+                                          vocabulary=resolve_vocabulary(vocabulary))
+        return detect_objects(model, image_path, output_path=output_path, conf=conf, imgsz=imgsz, image=image)
+
+    def analyze(image_path, output_path=None, conf=0.05, imgsz=1280, image=None, cascade=None, vocabulary=None):
+        if image is not None:
+            with open_shared_image(image, bgr=True) as pixels:
+                return run(image_path, output_path, conf, imgsz, image=pixels, cascade=cascade, vocabulary=vocabulary)
+        return run(image_path, output_path, conf, imgsz, cascade=cascade, vocabulary=vocabulary)
+
+    def analyze_batch(image_paths, output_paths=None, conf=0.05, imgsz=1280, cascade=None, vocabulary=None):
+        use_vocabulary(vocabulary)
+        if screen_model is not None and cascade is not False:
+            return detect_objects_cascade_batch(screen_model, model, image_paths, output_paths=output_paths,
+                                                conf=conf, imgsz=imgsz, stats=stats,
+                                                vocabulary=resolve_vocabulary(vocabulary))
+        return detect_objects_batch(model, image_paths, output_paths=output_paths, conf=conf, imgsz=imgsz)
+
+    def cascade_stats():
+        return {"enabled": screen_model is not None, **stats.snapshot()}
+
+    return {"analyze": analyze, "analyze_batch": analyze_batch, "cascade_stats": cascade_stats}
+
+def main():
+    parser = argparse.ArgumentParser(description="Security Object Detection Pipeline")
+    parser.add_argument("image_path", type=str, help="Path to the input image")
+    parser.add_argument("--output", type=str, default=None, help="Path to save the annotated output image")
+    parser.add_argument("--conf", type=float, default=0.05, help="Confidence threshold")
+    parser.add_argument("--imgsz", type=int, default=1280, help="Inference image size")
+    parser.add_argument("--vocabulary", choices=sorted(VOCABULARY_PROFILES), default=None,
+                        help="Vocabulary profile for the open-vocabulary model")
+    parser.add_argument("--cascade", action=argparse.BooleanOptionalAction, default=config.OBJECTS_CASCADE,
+                        help="Screen with the small model first and run the heavy model only on escalation")
+    parser.add_argument("--screen-imgsz", type=int, default=config.OBJECTS_SCREEN_IMGSZ, help="Screen model image size")
+    parser.add_argument("--screen-conf", type=float, default=config.OBJECTS_SCREEN_CONF, help="Screen confidence needed to escalate")
+    parser.add_argument("--tile-size", type=int, default=config.OBJECTS_TILE_SIZE,
+                        help="Slice frames larger than ROYA_OBJECTS_TILE_MIN_SIDE into tiles of this size (0 disables)")
+    args = parser.parse_args()
+
+    model = load_model()
+    if args.vocabulary and "world" in MODEL_NAME:
+        apply_vocabulary(model, resolve_vocabulary(args.vocabulary))
+    if args.cascade:
+        output = detect_objects_cascade(load_screen_model(), model, args.image_path, output_path=args.output,
+                                        conf=args.conf, imgsz=args.imgsz, screen_imgsz=args.screen_imgsz,
+                                        screen_conf=args.screen_conf, tile_size=args.tile_size,
+                                        vocabulary=resolve_vocabulary(args.vocabulary))
+    else:
+        output = detect_objects(model, args.image_path, output_path=args.output, conf=args.conf, imgsz=args.imgsz,
+                                tile_size=args.tile_size)
+
     print(json.dumps(output, indent=2, ensure_ascii=False))
 
 if __name__ == "__main__":
@@ -0,0 +1,25 @@
+# Vocabulary lists for the open-vocabulary detector. Kept free of model
+# imports so the API can validate profile names without loading torch.
+
+# Custom Vocabulary for YOLO-World
+CUSTOM_VOCABULARY = [
+    # Standard Objects
+    "person", "man", "woman", "child",
+    "bicycle", "car", "motorcycle", "bus", "truck", 
+    "backpack", "handbag", "suitcase", "luggage",
+    
+    # Weapons - High Threat
+    "knife", "kitchen knife", "dagger", "blade", "sharp object",
+    "scissors", "shears",
+    "gun", "pistol", "handgun", "revolver", "rifle", "shotgun", "firearm", "weapon", "assault rifle", "machine gun"
+]
+
+VOCABULARY_PROFILES = {
+    "default": CUSTOM_VOCABULARY,
+    "weapons": [
+        "knife", "kitchen knife", "dagger", "blade", "sharp object", "scissors", "shears",
+        "gun", "pistol", "handgun", "revolver", "rifle", "shotgun", "firearm", "weapon", "assault rifle", "machine gun"
+    ],
+    "vehicles": ["bicycle", "car", "motorcycle", "bus", "truck"],
+    "people": ["person", "man", "woman", "child", "backpack", "handbag", "suitcase", "luggage"],
+}
@@ -0,0 +1,134 @@
+"""
+Synthetic benchmark for OCR post-processing: keyword tagging and line
+grouping against the original loops. Run with
+``python -m backend.app.modules.ocr.benchmark N``.
+"""
+import re
+import json
+import time
+import argparse
+from typing import Any, Dict, List
+
+import numpy as np
+
+from backend.app.core import config
+from backend.app.modules.ocr import main_ocr
+from backend.app.modules.ocr.keywords import KeywordMatcher, load_keywords
+
+
+def _group_detections_reference(detections: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    # The original per-line implementation, kept as the baseline for run_benchmark
+    if not detections:
+        return []
+
+    def get_cy(box):
+        return sum([p[1] for p in box]) / len(box)
+
+    def get_ylims(box):
+        ys = [p[1] for p in box]
+        return min(ys), max(ys)
+
+    sorted_dets = sorted(detections, key=lambda x: get_cy(x['box']))
+    lines = []
+    current_line = []
+    for det in sorted_dets:
+        if not current_line:
+            current_line.append(det)
+            continue
+        y1_min, y1_max = get_ylims(current_line[-1]['box'])
+        y2_min, y2_max = get_ylims(det['box'])
+        min_h = min(y1_max - y1_min, y2_max - y2_min)
+        inter_h = max(0, min(y1_max, y2_max) - max(y1_min, y2_min))
+        if inter_h > 0.5 * min_h or abs(get_cy(current_line[-1]['box']) - get_cy(det['box'])) < 0.5 * min_h:
+            current_line.append(det)
+        else:
+            lines.append(current_line)
+            current_line = [det]
+    if current_line:
+        lines.append(current_line)
+
+    final_detections = []
+    for line in lines:
+        total_chars = sum(len(d['text']) for d in line)
+        arabic_chars = sum(len(re.findall(r'[\u0600-\u06FF]', d['text'])) for d in line)
+        is_arabic = (arabic_chars / total_chars > 0.5) if total_chars > 0 else False
+        line.sort(key=lambda d: sum([p[0] for p in d['box']]) / len(d['box']), reverse=is_arabic)
+        tags = [d['tag'] for d in line]
+        final_tag = "SENSITIVE" if "SENSITIVE" in tags else "LOCATION" if "LOCATION" in tags else "COMMERCIAL"
+        final_detections.append({
+            "text": " ".join([d['text'] for d in line]),
+            "confidence": round(sum([d['confidence'] for d in line]) / len(line), 2),
+            "tag": final_tag
+        })
+    return final_detections
+
+def _synthetic_detections(n: int, seed: int = 0) -> List[Dict[str, Any]]:
+    # Document-like layout: lines of ~10 words with a little vertical jitter
+    rng = np.random.default_rng(seed)
+    words = ["شارع", "الملك", "فهد", "Bank", "Police", "Cafe", "Street", "مطعم", "بنك", "Road", "Pharmacy", "حي"]
+    detections = []
+    for k in range(n):
+        h = rng.uniform(18, 26)
+        x, y = (k % 10) * 320 + rng.uniform(0, 20), (k // 10) * 40 + rng.uniform(-3, 3)
+        w = rng.uniform(60, 280)
+        text = " ".join(rng.choice(words, size=rng.integers(1, 4)))
+        detections.append({
+            "text": text,
+            "confidence": float(rng.uniform(0.7, 1.0)),
+            "box": [[x, y], [x + w, y], [x + w, y + h], [x, y + h]],
+            "tag": main_ocr._determine_tag(text)
+        })
+    return detections
+
+def run_benchmark(n: int = 10000) -> Dict[str, Any]:
+    """Times tagging and line grouping on n synthetic boxes against the original loops."""
+    detections = _synthetic_detections(n)
+    texts = [d['text'] for d in detections]
+    keywords = load_keywords(config.OCR_KEYWORDS_PATH)
+
+    def legacy_tag(text):
+        for category, words in keywords.items():
+            if any(k in text for k in words):
+                return category
+        return "COMMERCIAL"
+
+    def timed(fn, *args):
+        start = time.perf_counter()
+        out = fn(*args)
+        return out, round((time.perf_counter() - start) * 1000, 2)
+
+    tags, tag_ms = timed(lambda: [main_ocr._determine_tag(t) for t in texts])
+    legacy_tags, legacy_tag_ms = timed(lambda: [legacy_tag(t) for t in texts])
+
+    # Same comparison with a large dictionary, where per-keyword scans stop scaling
+    big_keywords = {category: words + [f"{w}{i}" for w in words for i in range(40)] for category, words in keywords.items()}
+    big_matcher = KeywordMatcher(big_keywords)
+    _, big_tag_ms = timed(lambda: [big_matcher.tag(t) for t in texts])
+    _, big_legacy_ms = timed(lambda: [next((c for c, ws in big_keywords.items() if any(k in t for k in ws)), "COMMERCIAL")
+                                      for t in texts])
+    grouped, group_ms = timed(main_ocr.group_detections, [dict(d) for d in detections])
+    reference, reference_ms = timed(_group_detections_reference, [dict(d) for d in detections])
+
+    return {
+        "boxes": n,
+        "keywords": sum(len(v) for v in keywords.values()),
+        "tagging_ms": {"aho_corasick": tag_ms, "substring_loops": legacy_tag_ms},
+        "large_dictionary": {
+            "keywords": sum(len(v) for v in big_keywords.values()),
+            "tagging_ms": {"aho_corasick": big_tag_ms, "substring_loops": big_legacy_ms}
+        },
+        "grouping_ms": {"vectorized": group_ms, "reference": reference_ms},
+        "lines": len(grouped),
+        "results_match": tags == legacy_tags and grouped == reference
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OCR post-processing benchmark")
+    parser.add_argument("boxes", type=int, nargs="?", default=10000, help="Synthetic text boxes to tag and group")
+    args = parser.parse_args()
+    print(json.dumps(run_benchmark(args.boxes), indent=2))
+
+
+if __name__ == "__main__":
+    main()
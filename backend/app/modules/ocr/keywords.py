@@ -0,0 +1,98 @@
+import json
+import logging
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# Category -> substrings. Order matters: when a text matches several categories
+# the first listed wins for tagging (see KeywordMatcher.tag).
+DEFAULT_KEYWORDS = {
+    "LOCATION": ["Street", "St", "Rd", "شارع", "طريق", "حي", "District", "Road"],
+    "SENSITIVE": ["Bank", "Embassy", "بنك", "وزارة", "Ministry", "Police", "شرطة"],
+}
+
+
+class KeywordMatcher:
+    """
+    Aho-Corasick automaton over every keyword of every category, so one
+    pass over a text finds all categories it contains. Matching is
+    case-sensitive substring matching, same as ``keyword in text``.
+    """
+
+    def __init__(self, keywords: Dict[str, Iterable[str]], default_tag: str = "COMMERCIAL"):
+        self.categories = list(keywords)
+        self.default_tag = default_tag
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[Set[str]] = [set()]
+
+        for category, words in keywords.items():
+            for word in words:
+                if word:
+                    self._insert(word, category)
+        self._build_failure_links()
+
+    def _insert(self, word: str, category: str):
+        state = 0
+        for ch in word:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(set())
+            state = nxt
+        self._out[state].add(category)
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(ch, 0)
+                self._out[nxt] |= self._out[self._fail[nxt]]
+
+    def match(self, text: str) -> Set[str]:
+        """Categories with at least one keyword occurring in `text`."""
+        found = set()
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                found |= out[state]
+                if len(found) == len(self.categories):
+                    break
+        return found
+
+    def tag(self, text: str) -> str:
+        found = self.match(text)
+        for category in self.categories:
+            if category in found:
+                return category
+        return self.default_tag
+
+
+def load_keywords(path: Optional[str]) -> Dict[str, List[str]]:
+    """Keyword dictionary from a JSON file of {category: [keywords]}, falling back to the defaults."""
+    if not path:
+        return DEFAULT_KEYWORDS
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            keywords = json.load(f)
+        if not isinstance(keywords, dict) or not all(isinstance(v, list) for v in keywords.values()):
+            raise ValueError("expected an object mapping category to a list of keywords")
+        return keywords
+    except FileNotFoundError:
+        return DEFAULT_KEYWORDS
+    except Exception as e:
+        logger.error(f"Invalid OCR keyword dictionary {path}, using defaults: {e}")
+        return DEFAULT_KEYWORDS
@@ -5,27 +5,40 @@ import datetime
 import logging
 import os
 import re
-from typing import List, Dict, Any
+import time
+from typing import List, Dict, Any, Optional
+import cv2
+import numpy as np
 from paddleocr import PaddleOCR
 
+from backend.app.core import config
+from backend.app.core.shared_image import open_shared_image
+from backend.app.modules.ocr.keywords import KeywordMatcher, load_keywords
+
 logging.basicConfig(stream=sys.stderr, level=logging.ERROR)
 logger = logging.getLogger(__name__)
 
+ARABIC_CHAR_RE = re.compile(r'[\u0600-\u06FF]')
+
+_keyword_matcher = None
+
+def get_keyword_matcher() -> KeywordMatcher:
+    global _keyword_matcher
+    if _keyword_matcher is None:
+        _keyword_matcher = KeywordMatcher(load_keywords(config.OCR_KEYWORDS_PATH))
+    return _keyword_matcher
+
 def analyze_text_context(text_list: List[str]) -> Dict[str, List[str]]:
-    location_keywords = ["Street", "St", "Rd", "شارع", "طريق", "حي", "District", "Road"]
-    sensitive_keywords = ["Bank", "Embassy", "بنك", "وزارة", "Ministry", "Police", "شرطة"]
-    
+    matcher = get_keyword_matcher()
     location_markers = []
     sensitive_areas = []
     
     for text in text_list:
-        if any(keyword in text for keyword in location_keywords):
-            if text not in location_markers:
-                location_markers.append(text)
-        
-        if any(keyword in text for keyword in sensitive_keywords):
-            if text not in sensitive_areas:
-                sensitive_areas.append(text)
+        found = matcher.match(text)
+        if "LOCATION" in found and text not in location_markers:
+            location_markers.append(text)
+        if "SENSITIVE" in found and text not in sensitive_areas:
+            sensitive_areas.append(text)
                 
     return {
         "location_markers": location_markers,
@@ -33,65 +46,63 @@ def analyze_text_context(text_list: List[str]) -> Dict[str, List[str]]:
     }
 
 def group_detections(detections: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Merges word-level detections into text lines. Box geometry is computed
+    once for all detections with numpy; the line sweep then only compares
+    precomputed scalars.
+    """
     if not detections:
         return []
 
-    def get_cy(box):
-        return sum([p[1] for p in box]) / len(box)
+    try:
+        # Common case: every box has the same number of points -> one (n, k, 2) array
+        points = np.array([d['box'] for d in detections], dtype=np.float64)
+    except ValueError:
+        points = None
 
-    def get_ylims(box):
-        ys = [p[1] for p in box]
-        return min(ys), max(ys)
+    if points is not None and points.ndim == 3:
+        cx_all, cy_all = points[:, :, 0].mean(axis=1), points[:, :, 1].mean(axis=1)
+        y_min_all, y_max_all = points[:, :, 1].min(axis=1), points[:, :, 1].max(axis=1)
+    else:
+        boxes = [np.asarray(d['box'], dtype=np.float64).reshape(-1, 2) for d in detections]
+        cx_all = np.array([box[:, 0].mean() for box in boxes])
+        cy_all = np.array([box[:, 1].mean() for box in boxes])
+        y_min_all = np.array([box[:, 1].min() for box in boxes])
+        y_max_all = np.array([box[:, 1].max() for box in boxes])
+
+    order = np.argsort(cy_all, kind="stable").tolist()
+    cy, y_min, y_max = cy_all.tolist(), y_min_all.tolist(), y_max_all.tolist()
 
-    sorted_dets = sorted(detections, key=lambda x: get_cy(x['box']))
-    
     lines = []
-    current_line = []
-    
-    for det in sorted_dets:
-        if not current_line:
-            current_line.append(det)
-            continue
-            
-        last_det = current_line[-1]
-        y1_min, y1_max = get_ylims(last_det['box'])
-        y2_min, y2_max = get_ylims(det['box'])
-        
-        h1 = y1_max - y1_min
-        h2 = y2_max - y2_min
-        min_h = min(h1, h2)
-        
-        inter_min = max(y1_min, y2_min)
-        inter_max = min(y1_max, y2_max)
-        inter_h = max(0, inter_max - inter_min)
-        
-        cy1 = get_cy(last_det['box'])
-        cy2 = get_cy(det['box'])
-        
-        if inter_h > 0.5 * min_h or abs(cy1 - cy2) < 0.5 * min_h:
-            current_line.append(det)
+    current_line = [order[0]]
+    for i in order[1:]:
+        last = current_line[-1]
+        min_h = min(y_max[last] - y_min[last], y_max[i] - y_min[i])
+        inter_h = max(0.0, min(y_max[last], y_max[i]) - max(y_min[last], y_min[i]))
+
+        if inter_h > 0.5 * min_h or abs(cy[last] - cy[i]) < 0.5 * min_h:
+            current_line.append(i)
         else:
             lines.append(current_line)
-            current_line = [det]
-            
-    if current_line:
-        lines.append(current_line)
+            current_line = [i]
+    lines.append(current_line)
+
+    cx = cx_all.tolist()
+    n_chars = [len(d['text']) for d in detections]
+    n_arabic = [len(ARABIC_CHAR_RE.findall(d['text'])) for d in detections]
         
     final_detections = []
     
     for line in lines:
-        total_chars = sum(len(d['text']) for d in line)
-        arabic_chars = sum(len(re.findall(r'[\u0600-\u06FF]', d['text'])) for d in line)
+        total_chars = sum(n_chars[i] for i in line)
+        arabic_chars = sum(n_arabic[i] for i in line)
         is_arabic = (arabic_chars / total_chars > 0.5) if total_chars > 0 else False
         
-        def get_cx(d):
-            return sum([p[0] for p in d['box']]) / len(d['box'])
-            
-        line.sort(key=lambda x: get_cx(x), reverse=is_arabic)
+        line.sort(key=lambda i: cx[i], reverse=is_arabic)
             
-        merged_text = " ".join([d['text'] for d in line])
+        merged_text = " ".join(detections[i]['text'] for i in line)
         
-        tags = [d['tag'] for d in line]
+        tags = {detections[i]['tag'] for i in line}
         if "SENSITIVE" in tags:
             final_tag = "SENSITIVE"
         elif "LOCATION" in tags:
@@ -99,7 +110,7 @@ def group_detections(detections: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         else:
             final_tag = "COMMERCIAL"
             
-        avg_conf = sum([d['confidence'] for d in line]) / len(line)
+        avg_conf = sum(detections[i]['confidence'] for i in line) / len(line)
         
         final_detections.append({
             "text": merged_text,
@@ -109,23 +120,156 @@ def group_detections(detections: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         
     return final_detections
 
-def main():
-    parser = argparse.ArgumentParser(description="OCR Extraction for Scene Text")
-    parser.add_argument("image_path", help="Path to the input image")
-    args = parser.parse_args()
-    
-    image_path = args.image_path
-    
-    if not os.path.exists(image_path):
-        print(json.dumps({"error": f"Image file not found: {image_path}"}, indent=2))
-        sys.exit(1)
+GATE_MAX_SIDE = 800
+# Neighbours must be within this height ratio; regions are bucketed by it so each is only compared with its own
+# and the adjacent buckets, and only within its text line
+GATE_HEIGHT_RATIO = 1.0 / 0.7
+# Regions compared per block, bounding the (block x band) scratch arrays
+GATE_BLOCK_ROWS = 64
 
-    try:
-        ocr = PaddleOCR(use_textline_orientation=True, lang='ar')
-        result = ocr.ocr(image_path)
-    except Exception as e:
-        logger.error(f"OCR processing failed: {e}")
-        sys.exit(1)
+def _count_text_regions(boxes: np.ndarray, stop_at: int) -> int:
+    """
+    Regions with a similar-height neighbour on the same line, horizontally
+    close. Candidates are cut to a band of centre y per height bucket
+    (sorted with searchsorted), so the work grows with regions per line
+    rather than with all pairs; counting stops once `stop_at` is reached.
+    """
+    x, y, w, h = boxes.T
+    cx, cy = x + w / 2, y + h / 2
+    buckets = np.floor(np.log(np.maximum(h, 1)) / np.log(GATE_HEIGHT_RATIO)).astype(np.int64)
+
+    found = 0
+    for bucket in np.unique(buckets):
+        rows = np.flatnonzero(buckets == bucket)
+        candidates = np.flatnonzero(np.abs(buckets - bucket) <= 1)
+        candidates = candidates[np.argsort(cy[candidates], kind="stable")]
+        candidate_cy = cy[candidates]
+        lo = np.searchsorted(candidate_cy, cy[rows] - 0.5 * h[rows], side="left")
+        hi = np.searchsorted(candidate_cy, cy[rows] + 0.5 * h[rows], side="right")
+
+        for start in range(0, len(rows), GATE_BLOCK_ROWS):
+            block = slice(start, start + GATE_BLOCK_ROWS)
+            i = rows[block, None]
+            j = candidates[None, lo[block].min():hi[block].max()]
+            hi_, hj = h[i], h[j]
+            # Similar height, same baseline band, horizontally close (which also excludes the region itself)
+            similar = np.abs(hi_ - hj) <= 0.3 * np.maximum(hi_, hj)
+            same_line = np.abs(cy[i] - cy[j]) <= 0.5 * hi_
+            gap = np.abs(cx[i] - cx[j])
+            close = (gap > 0.3 * hi_) & (gap <= 2.5 * hi_)
+            found += int(np.count_nonzero((similar & same_line & close).any(axis=1)))
+            if found >= stop_at:
+                return found
+    return found
+
+def text_presence(image_bgr: np.ndarray, min_edge_density: float = None, min_text_regions: int = None) -> Dict[str, Any]:
+    """
+    Cheap check for legible text before running PaddleOCR. Frames with
+    almost no edges are rejected outright; otherwise MSER regions are kept
+    if they are character-shaped and have a similar-height neighbour on
+    the same line, since isolated blobs are rarely text. OCR is worth
+    running once `min_text_regions` such regions are found, so
+    `text_regions` is a lower bound when has_text is true.
+    """
+    min_edge_density = config.OCR_GATE_MIN_EDGE_DENSITY if min_edge_density is None else min_edge_density
+    min_text_regions = config.OCR_GATE_MIN_TEXT_REGIONS if min_text_regions is None else min_text_regions
+
+    gray = cv2.cvtColor(image_bgr, cv2.COLOR_BGR2GRAY) if image_bgr.ndim == 3 else image_bgr
+    scale = GATE_MAX_SIDE / max(gray.shape[:2])
+    if scale < 1.0:
+        gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    height = gray.shape[0]
+
+    edge_density = float(np.count_nonzero(cv2.Canny(gray, 100, 200))) / gray.size
+    if edge_density < min_edge_density:
+        return {"has_text": False, "edge_density": round(edge_density, 4), "text_regions": 0}
+
+    _, boxes = cv2.MSER_create(5, 20, 4000).detectRegions(gray)
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+    if len(boxes):
+        x, y, w, h = boxes.T
+        aspect = w / np.maximum(h, 1)
+        keep = (h >= 6) & (h <= height / 4) & (aspect >= 0.1) & (aspect <= 2.5)
+        boxes = boxes[keep]
+
+    text_regions = _count_text_regions(boxes, max(min_text_regions, 1)) if len(boxes) > 1 else 0
+
+    return {
+        "has_text": text_regions >= min_text_regions,
+        "edge_density": round(edge_density, 4),
+        "text_regions": text_regions
+    }
+
+def skipped_result(gate: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "status": "skipped",
+        "message": "No legible text detected",
+        "meta": {
+            "timestamp": datetime.datetime.now().isoformat(),
+            "language_mode": "ar/en",
+            "gate": gate
+        },
+        "environment_data": {"location_markers": [], "sensitive_areas": []},
+        "raw_detections": []
+    }
+
+class GateStats:
+    """Running per-process counters for the OCR text-presence gate."""
+
+    def __init__(self):
+        self.images = 0
+        self.skipped = 0
+        self.gate_ms = 0.0
+        self.ocr_ms = 0.0
+
+    def record(self, skipped: bool, gate_ms: float, ocr_ms: float = 0.0):
+        self.images += 1
+        self.skipped += int(skipped)
+        self.gate_ms += gate_ms
+        self.ocr_ms += ocr_ms
+
+    def snapshot(self) -> Dict[str, Any]:
+        ran = self.images - self.skipped
+        avg_ocr_ms = self.ocr_ms / ran if ran else 0.0
+        return {
+            "images": self.images,
+            "skipped": self.skipped,
+            "skip_rate": round(self.skipped / self.images, 4) if self.images else 0.0,
+            "avg_gate_ms": round(self.gate_ms / self.images, 2) if self.images else 0.0,
+            "avg_ocr_ms": round(avg_ocr_ms, 1),
+            # Estimated from the average cost of the OCR runs that did happen
+            "time_saved_ms": round(self.skipped * avg_ocr_ms - self.gate_ms, 1)
+        }
+
+def gated_extract_text(ocr, image_path: str, image: Optional[np.ndarray] = None, stats: Optional[GateStats] = None,
+                       min_edge_density: float = None, min_text_regions: int = None) -> Dict[str, Any]:
+    """extract_text behind the text-presence gate; returns skipped_result() when no text is likely."""
+    start = time.perf_counter()
+    pixels = image if image is not None else cv2.imread(image_path)
+    if pixels is None:
+        raise FileNotFoundError(f"Could not read image: {image_path}")
+    gate = text_presence(pixels, min_edge_density=min_edge_density, min_text_regions=min_text_regions)
+    gate_ms = (time.perf_counter() - start) * 1000
+    gate["gate_ms"] = round(gate_ms, 2)
+
+    if not gate["has_text"]:
+        if stats is not None:
+            stats.record(True, gate_ms)
+        return skipped_result(gate)
+
+    start = time.perf_counter()
+    output = extract_text(ocr, image_path, image=pixels)
+    if stats is not None:
+        stats.record(False, gate_ms, (time.perf_counter() - start) * 1000)
+    output["meta"]["gate"] = gate
+    return output
+
+def load_ocr():
+    return PaddleOCR(use_textline_orientation=True, lang='ar')
+
+def extract_text(ocr, image_path: str, image=None) -> Dict[str, Any]:
+    # `image` is an already-decoded BGR array; otherwise PaddleOCR reads image_path
+    result = ocr.ocr(image if image is not None else image_path)
 
     raw_detections = []
     
@@ -172,7 +316,7 @@ def main():
 
     environment_data = analyze_text_context([d['text'] for d in final_detections])
 
-    output = {
+    return {
         "meta": {
             "timestamp": datetime.datetime.now().isoformat(),
             "language_mode": "ar/en"
@@ -181,18 +325,77 @@ def main():
         "raw_detections": final_detections
     }
 
+def create_worker():
+    """Entry point for the resident worker pool: loads PaddleOCR once per process."""
+    ocr = load_ocr()
+    stats = GateStats()
+
+    def run(image_path, image=None, gate=None):
+        if gate if gate is not None else config.OCR_GATE:
+            return gated_extract_text(ocr, image_path, image=image, stats=stats)
+        return extract_text(ocr, image_path, image=image)
+
+    def analyze(image_path, image=None, gate=None):
+        if image is not None:
+            with open_shared_image(image, bgr=True) as pixels:
+                return run(image_path, image=pixels, gate=gate)
+        if not os.path.exists(image_path):
+            raise FileNotFoundError(f"Image file not found: {image_path}")
+        return run(image_path, gate=gate)
+
+    def analyze_batch(image_paths):
+        # PaddleOCR takes one image per call; batching here saves the per-image IPC round trip
+        results = []
+        for image_path in image_paths:
+            try:
+                results.append(analyze(image_path))
+            except Exception as e:
+                results.append({"status": "error", "message": f"{type(e).__name__}: {e}", "data": None})
+        return results
+
+    def gate_stats():
+        return {
+            "enabled": config.OCR_GATE,
+            "min_edge_density": config.OCR_GATE_MIN_EDGE_DENSITY,
+            "min_text_regions": config.OCR_GATE_MIN_TEXT_REGIONS,
+            **stats.snapshot()
+        }
+
+    return {"analyze": analyze, "analyze_batch": analyze_batch, "gate_stats": gate_stats}
+
+def main():
+    parser = argparse.ArgumentParser(description="OCR Extraction for Scene Text")
+    parser.add_argument("image_path", help="Path to the input image")
+    parser.add_argument("--gate", action=argparse.BooleanOptionalAction, default=config.OCR_GATE,
+                        help="Skip OCR when the text-presence check finds no likely text")
+    parser.add_argument("--min-text-regions", type=int, default=config.OCR_GATE_MIN_TEXT_REGIONS,
+                        help="Character-like regions needed to run OCR")
+    parser.add_argument("--min-edge-density", type=float, default=config.OCR_GATE_MIN_EDGE_DENSITY,
+                        help="Edge pixel fraction below which a frame is skipped outright")
+    args = parser.parse_args()
+    
+    image_path = args.image_path
+    
+    if not os.path.exists(image_path):
+        print(json.dumps({"error": f"Image file not found: {image_path}"}, indent=2))
+        sys.exit(1)
+
+    try:
+        ocr = load_ocr()
+        if args.gate:
+            output = gated_extract_text(ocr, image_path, min_edge_density=args.min_edge_density,
+                                        min_text_regions=args.min_text_regions)
+        else:
+            output = extract_text(ocr, image_path)
+    except Exception as e:
+        logger.error(f"OCR processing failed: {e}")
+        sys.exit(1)
+
     sys.stdout.reconfigure(encoding='utf-8')
     print(json.dumps(output, indent=2, ensure_ascii=False))
 
 def _determine_tag(text: str) -> str:
-    loc_keys = ["Street", "St", "Rd", "شارع", "طريق", "حي", "District", "Road"]
-    sens_keys = ["Bank", "Embassy", "بنك", "وزارة", "Ministry", "Police", "شرطة"]
-    
-    if any(k in text for k in loc_keys):
-        return "LOCATION"
-    elif any(k in text for k in sens_keys):
-        return "SENSITIVE"
-    return "COMMERCIAL"
+    return get_keyword_matcher().tag(text)
 
 if __name__ == "__main__":
     main()
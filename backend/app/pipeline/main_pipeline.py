@@ -7,8 +7,14 @@ import os
 import sys
 import argparse
 import logging
+import time
+import hashlib
 
 from backend.app.core import config
+from backend.app.core.result_cache import ResultCache, canonical_hash
+from backend.app.core.shared_image import SharedImage, image_io_report
+from backend.app.modules.biometrics.watchlist import read_watchlist_version
+from backend.app.pipeline.workers import WorkerPool
 
 logging.basicConfig(
     level=logging.INFO,
@@ -17,6 +23,34 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+_worker_pool = None
+
+def start_worker_pool(sizes=None, timeout=None):
+    global _worker_pool
+    if _worker_pool is None:
+        _worker_pool = WorkerPool(
+            sizes or config.WORKER_POOL_SIZES,
+            timeout=timeout or config.WORKER_TIMEOUT_SECONDS
+        )
+        _worker_pool.start()
+    return _worker_pool
+
+def stop_worker_pool():
+    global _worker_pool
+    if _worker_pool is not None:
+        _worker_pool.stop()
+        _worker_pool = None
+
+def get_worker_pool():
+    return _worker_pool
+
+def dispatch_module(name, spec):
+    # Warm worker when the pool serves this module, fresh interpreter otherwise
+    pool = _worker_pool
+    if pool is not None and pool.serves(name):
+        return pool.call(name, **spec["kwargs"])
+    return run_module(spec["script"], spec["args"])
+
 def run_module(script_name, args):
     command = [sys.executable, str(script_name)] + args
     logger.info(f"Running module: {script_name} with args: {args}")
@@ -66,11 +100,203 @@ def run_module(script_name, args):
         logger.error(f"Exception running {script_name}: {e}")
         return {"status": "error", "message": str(e), "data": None}
 
-def run_pipeline(image_path):
+def _cctv_spec(modules_dir, lat, lng):
+    return {
+        "script": modules_dir / "cctv" / "main_cctv_retrieval.py",
+        # Ensure lat/lng are strings for command line arguments
+        "args": ["--lat", str(lat), "--lng", str(lng)],
+        "kwargs": {"lat": float(lat), "lng": float(lng)}
+    }
+
+# Object detection labels that count as a person for the face detection cascade
+PERSON_LABELS = {"person", "man", "woman", "child"}
+
+def person_boxes(objects_result):
+    """
+    [x1, y1, x2, y2] of every person detection at or above
+    BIOMETRICS_PERSON_MIN_CONF, or None when object detection produced no
+    usable result (biometrics then scans the full frame).
+    """
+    if not isinstance(objects_result, dict) or not isinstance(objects_result.get("detections"), list):
+        return None
+    return [
+        [det["box"]["x1"], det["box"]["y1"], det["box"]["x2"], det["box"]["y2"]]
+        for det in objects_result["detections"]
+        if det.get("label_en") in PERSON_LABELS and det.get("confidence", 0) >= config.BIOMETRICS_PERSON_MIN_CONF
+    ]
+
+def _restrict_to_persons(spec, boxes):
+    # Adds per-image person boxes (from person_boxes) to a biometrics spec
+    spec["kwargs"]["person_boxes"] = boxes
+    if isinstance(spec["args"][0], list):
+        spec["args"] = [args + ["--person-boxes", json.dumps(b)] if b is not None else args
+                        for args, b in zip(spec["args"], boxes)]
+    elif boxes is not None:
+        spec["args"] = spec["args"] + ["--person-boxes", json.dumps(boxes)]
+    return spec
+
+def build_reasoning_context(results):
+    gps_data = results.get("GPS", {})
+    lat = gps_data.get("lat")
+    lng = gps_data.get("lng")
+
+    biometrics_data = results.get("biometrics", {}).get("matches", [])
+
+    obj_det_data = results.get("object_detection", {})
+    objects_list = []
+    if "detections" in obj_det_data:
+        objects_list = [
+            obj.get("label") or obj.get("class_name") or obj.get("label_en")
+            for obj in obj_det_data["detections"]
+        ]
+
+    ocr_data = results.get("ocr_environment", {}).get("text", [])
+
+    cctv_data = results.get("cctv_retrieval", {}).get("cameras", [])
+
+    return {
+        "biometrics": biometrics_data,
+        "objects": objects_list,
+        "ocr": ocr_data,
+        "location": {"lat": lat, "lng": lng} if lat else None,
+        "cctv": cctv_data
+    }
+
+# Bump a module's entry when its model or output format changes; cached results
+# for older versions are then recomputed for that module (and its dependents) only
+MODULE_VERSIONS = {
+    "GPS": "resnet50-v2",
+    "biometrics": "face-recognition-hog-v5",
+    "object_detection": "yolov8x-worldv2-v3",
+    "ocr_environment": "paddleocr-ar-v2",
+    "cctv_retrieval": "grid-v1",
+}
+
+# Modules whose inputs include other modules' results
+MODULE_DEPENDENCIES = {
+    "cctv_retrieval": ("GPS",),
+    # The face detection cascade only searches object detection's person boxes
+    **({"biometrics": ("object_detection",)} if config.BIOMETRICS_PERSON_CASCADE else {}),
+    "reasoning": ("GPS", "biometrics", "object_detection", "ocr_environment", "cctv_retrieval"),
+}
+
+_pipeline_cache = ResultCache(
+    max_entries=config.PIPELINE_CACHE_SIZE,
+    ttl_seconds=config.PIPELINE_CACHE_TTL,
+    disk_dir=config.PIPELINE_CACHE_DIR
+)
+
+def get_pipeline_cache():
+    return _pipeline_cache
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return 0
+
+def file_sha256(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def module_versions():
+    """
+    Current version of every module's output: the code/model version plus
+    the data it searches, so updating the location database or camera
+    registry invalidates just that module's cached results. The watchlist
+    is versioned per result instead (see watchlist_version).
+    """
+    try:
+        from backend.app.modules.reasoning import main_reasoning
+        reasoning_version = f"{main_reasoning.PROMPT_VERSION}:{main_reasoning.get_reasoning_model().name}"
+    except Exception:
+        reasoning_version = "unavailable"
+
+    location_manifest = config.LOCATION_DB_DIR / "manifest.json"
+    return {
+        "GPS": f"{MODULE_VERSIONS['GPS']}:{config.GPS_INDEX_TYPE}:{_mtime(location_manifest)}",
+        "biometrics": f"{MODULE_VERSIONS['biometrics']}:{config.BIOMETRICS_INDEX_TYPE}:{config.BIOMETRICS_TOLERANCE}:{config.BIOMETRICS_TOP_K}:"
+                      f"{f'persons-{config.BIOMETRICS_PERSON_PADDING}' if config.BIOMETRICS_PERSON_CASCADE else 'full'}",
+        "object_detection": f"{MODULE_VERSIONS['object_detection']}:{'cascade' if config.OBJECTS_CASCADE else 'full'}:"
+                            f"{f'tiled-{config.OBJECTS_TILE_SIZE}-{config.OBJECTS_TILE_OVERLAP}-{config.OBJECTS_TILE_MIN_SIDE}' if config.OBJECTS_TILE_SIZE else 'whole'}",
+        "ocr_environment": f"{MODULE_VERSIONS['ocr_environment']}:{'gated' if config.OCR_GATE else 'full'}",
+        "cctv_retrieval": f"{MODULE_VERSIONS['cctv_retrieval']}:{_mtime(config.CCTV_DIR / 'cctv_registry.json')}",
+        "reasoning": reasoning_version,
+    }
+
+def watchlist_version():
+    """
+    Watchlist snapshot the biometrics workers currently serve, as they
+    published it after their last reload; None without a biometrics pool,
+    when there is nothing to check a cached result against.
+    """
+    pool = _worker_pool
+    if pool is None or not pool.serves("biometrics"):
+        return None
+    return read_watchlist_version(config.BIOMETRIC_DATASET_DIR)
+
+def result_watchlist_version(data):
+    # The snapshot a biometrics result was actually matched against
+    meta = data.get("meta") if isinstance(data, dict) else None
+    watchlist = meta.get("watchlist") if isinstance(meta, dict) else None
+    return watchlist.get("version") if isinstance(watchlist, dict) else None
+
+def module_cache_key(image_hash, module_name, versions):
+    dependency_versions = {name: versions[name] for name in MODULE_DEPENDENCIES.get(module_name, ())}
+    return canonical_hash({
+        "image": image_hash,
+        "module": module_name,
+        "version": versions[module_name],
+        "depends_on": dependency_versions
+    })
+
+# Modules that take OpenCV-convention BGR input get a channel-swapped copy of the shared image
+SHARED_IMAGE_BGR_MODULES = ("object_detection", "ocr_environment")
+
+def _share_image(image_path, modules):
+    """
+    Decodes the upload once into shared memory and adds its descriptor to the
+    pool kwargs of every module, so warm workers map the pixels instead of
+    re-reading the file. Subprocess fallbacks keep using the path.
+    """
+    pool = _worker_pool
+    if pool is None or not any(pool.serves(name) for name in modules):
+        return None
+    try:
+        shared = SharedImage.decode(image_path)
+    except Exception as e:
+        logger.warning(f"Could not decode {image_path} into shared memory, modules will read the file: {e}")
+        return None
+    for name, spec in modules.items():
+        if pool.serves(name):
+            spec["kwargs"]["image"] = shared.descriptor()
+    return shared
+
+def iter_pipeline(image_path, use_cache=True, refresh=None, vocabulary=None, image_hash=None):
+    """
+    Runs the pipeline and yields ``(event, payload)`` tuples as work completes:
+    ``("module", {"module": name, "data": result, "elapsed_ms": ...})`` for each
+    module (reasoning included) in completion order, then ``("report", master_json)``.
+    CCTV retrieval starts as soon as GPS finishes instead of after every module,
+    and with BIOMETRICS_PERSON_CASCADE biometrics starts once object detection
+    has found the person boxes to search for faces.
+
+    Module results are cached per image content hash and module version
+    (see module_versions); cached modules are emitted first and not re-run.
+    `use_cache=False` bypasses the cache, `refresh` re-runs only the named modules.
+    `vocabulary` selects an object detection vocabulary profile.
+    `image_hash` is the file's SHA-256 when the caller already has it (uploads
+    are stored under their digest); otherwise the file is hashed here.
+    """
+    started = time.perf_counter()
     image_path = os.path.abspath(image_path)
     if not os.path.exists(image_path):
         logger.error(f"Image not found: {image_path}")
-        return {"error": "Image not found"}
+        yield "report", {"error": "Image not found"}
+        return
 
     # Define module paths using config
     modules_dir = config.BACKEND_DIR / "app" / "modules"
@@ -78,19 +304,23 @@ def run_pipeline(image_path):
     modules = {
         "GPS": {
             "script": modules_dir / "gps" / "model.py",
-            "args": [image_path]
+            "args": [image_path],
+            "kwargs": {"image_path": image_path}
         },
         "biometrics": {
             "script": modules_dir / "biometrics" / "main_biometrics.py",
-            "args": ["--input", image_path]
+            "args": ["--input", image_path],
+            "kwargs": {"image_path": image_path}
         },
         "object_detection": {
             "script": modules_dir / "objects" / "main_objects.py",
-            "args": [image_path, "--output", os.path.splitext(image_path)[0] + "_annotated.jpg"]
+            "args": [image_path] + (["--vocabulary", vocabulary] if vocabulary else []),
+            "kwargs": {"image_path": image_path, "vocabulary": vocabulary}
         },
         "ocr_environment": {
             "script": modules_dir / "ocr" / "main_ocr.py",
-            "args": [image_path]
+            "args": [image_path],
+            "kwargs": {"image_path": image_path}
         }
     }
 
@@ -98,87 +328,381 @@ def run_pipeline(image_path):
     timestamp = datetime.datetime.now().isoformat()
     
     results = {}
+    module_ms = {}
+    first_result_ms = None
+
+    image_hash = image_hash or file_sha256(image_path)
+    versions = module_versions()
+    versions["object_detection"] += f":{vocabulary or 'default'}"
+    # Biometrics results are looked up under the served snapshot and stored under the one they used
+    biometrics_version = versions["biometrics"]
+    served_watchlist = watchlist_version()
+    versions["biometrics"] = f"{biometrics_version}:{served_watchlist}"
+    refresh = set(refresh or [])
+    cache_hits = []
+
+    def cached(module_name):
+        if not use_cache or module_name in refresh:
+            return None
+        # A result derived from freshly computed inputs is recomputed too
+        if any(dep not in cache_hits for dep in MODULE_DEPENDENCIES.get(module_name, ())):
+            return None
+        if module_name == "biometrics" and served_watchlist is None:
+            return None
+        data = _pipeline_cache.get(module_cache_key(image_hash, module_name, versions))
+        if data is not None:
+            cache_hits.append(module_name)
+        return data
+
+    def remember(module_name, data):
+        # Errors and skips are never cached so the next upload retries them
+        if not (isinstance(data, dict) and data.get("status") not in ("error", "skipped") and "error" not in data):
+            return
+        if module_name == "biometrics":
+            used = result_watchlist_version(data)
+            if used is None:
+                return
+            # Dependents (reasoning) are then keyed on the same snapshot
+            versions["biometrics"] = f"{biometrics_version}:{used}"
+        _pipeline_cache.set(module_cache_key(image_hash, module_name, versions), data)
+
+    def elapsed_ms():
+        return round((time.perf_counter() - started) * 1000, 1)
+
+    def completed(module_name, data):
+        nonlocal first_result_ms
+        results[module_name] = data
+        module_ms[module_name] = elapsed_ms()
+        if first_result_ms is None:
+            first_result_ms = module_ms[module_name]
+        return "module", {"module": module_name, "data": data, "elapsed_ms": module_ms[module_name]}
+
+    # Dependencies are looked up first so a cached dependent can count them as hits
+    hits = {}
+    for name in sorted(modules, key=lambda name: name in MODULE_DEPENDENCIES):
+        hits[name] = cached(name)
+    pending_modules = {name: spec for name, spec in modules.items() if hits[name] is None}
+    # Dispatched when object detection completes, with its person boxes
+    deferred = {"biometrics"} & set(pending_modules) if config.BIOMETRICS_PERSON_CASCADE else set()
+
+    shared_image = _share_image(image_path, pending_modules)
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
+            future_to_module = {
+                executor.submit(dispatch_module, name, spec): name 
+                for name, spec in pending_modules.items() if name not in deferred
+            }
+            pending = set(future_to_module)
+            ready = [(name, data) for name, data in hits.items() if data is not None]
+
+            while ready or pending:
+                if not ready:
+                    done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                    for future in done:
+                        module_name = future_to_module[future]
+                        try:
+                            data = future.result()
+                        except Exception as e:
+                            logger.error(f"Module {module_name} generated an exception: {e}")
+                            data = {"status": "error", "message": str(e)}
+                        remember(module_name, data)
+                        ready.append((module_name, data))
+
+                module_name, data = ready.pop(0)
+                yield completed(module_name, data)
+
+                # Face detection cascade (dependent on object detection)
+                if module_name == "object_detection" and "biometrics" in deferred:
+                    spec = _restrict_to_persons(pending_modules["biometrics"], person_boxes(data))
+                    biometrics_future = executor.submit(dispatch_module, "biometrics", spec)
+                    future_to_module[biometrics_future] = "biometrics"
+                    pending.add(biometrics_future)
+
+                # CCTV Retrieval (Dependent on GPS)
+                if module_name == "GPS":
+                    lat = data.get("lat") if isinstance(data, dict) else None
+                    lng = data.get("lng") if isinstance(data, dict) else None
+                    cctv_hit = cached("cctv_retrieval") if lat is not None and lng is not None else None
+                    if cctv_hit is not None:
+                        ready.append(("cctv_retrieval", cctv_hit))
+                    elif lat is not None and lng is not None:
+                        cctv_future = executor.submit(dispatch_module, "cctv_retrieval", _cctv_spec(modules_dir, lat, lng))
+                        future_to_module[cctv_future] = "cctv_retrieval"
+                        pending.add(cctv_future)
+                    else:
+                        logger.warning("Skipping CCTV retrieval due to missing GPS data")
+                        ready.append(("cctv_retrieval", {"status": "skipped", "message": "Missing GPS data"}))
+    finally:
+        if shared_image is not None:
+            shared_image.release()
+
+    reasoning_result = cached("reasoning")
+    if reasoning_result is None:
+        try:
+            from backend.app.modules.reasoning import main_reasoning
+            
+            context_data = build_reasoning_context(results)
+            
+            logger.info("Running reasoning engine...")
+            reasoning_result = main_reasoning.analyze_incident(context_data)
+            if not any(isinstance(r, dict) and r.get("status") == "error" for r in results.values()):
+                remember("reasoning", reasoning_result)
+            
+        except Exception as e:
+            logger.error(f"Reasoning module failed: {e}")
+            reasoning_result = {"status": "error", "message": str(e)}
+    yield completed("reasoning", reasoning_result)
+
+    timings = {
+        "time_to_first_result_ms": first_result_ms,
+        "modules_ms": module_ms,
+        "total_ms": elapsed_ms()
+    }
+    logger.info(f"Pipeline {pipeline_id}: first result after {first_result_ms} ms, total {timings['total_ms']} ms, "
+                f"{len(cache_hits)} cached module(s)")
+
+    master_json = {
+        "pipeline_id": pipeline_id,
+        "timestamp": timestamp,
+        "target_image": image_path,
+        "modules": results,
+        "timings": timings,
+        "image_io": image_io_report(shared_image, len(pending_modules), bgr_consumers=sum(
+            1 for name in SHARED_IMAGE_BGR_MODULES if "image" in modules[name]["kwargs"]
+        )),
+        "cache": {
+            "image_sha256": image_hash,
+            "hits": cache_hits,
+            "misses": [name for name in results if name not in cache_hits]
+        },
+        "system_status": "READY_FOR_REASONING",
+        "language": "ar"
+    }
     
+    yield "report", master_json
+
+def run_pipeline(image_path, use_cache=True, refresh=None, vocabulary=None, image_hash=None):
+    report = None
+    for event, payload in iter_pipeline(image_path, use_cache=use_cache, refresh=refresh, vocabulary=vocabulary,
+                                        image_hash=image_hash):
+        if event == "report":
+            report = payload
+    return report
+
+def dispatch_batch(name, spec, count):
+    """
+    Batched dispatch: one `analyze_batch` call on a warm worker, or one
+    subprocess per image when the pool does not serve the module. Always
+    returns `count` results.
+    """
+    pool = _worker_pool
+    if pool is not None and pool.serves(name):
+        # The pool timeout is per image; a batch gets proportionally longer
+        data = pool.call(name, op="analyze_batch", timeout=pool.timeout * count if pool.timeout else None, **spec["kwargs"])
+        if isinstance(data, list) and len(data) == count:
+            return data
+        return [data] * count
+    return [run_module(spec["script"], args) for args in spec["args"]]
+
+def merge_incident(per_image):
+    """Folds per-image module results into one reasoning context for the whole incident."""
+    biometrics, objects, ocr, cctv = [], [], [], []
+    seen_cameras = set()
+    best_location = None
+
+    for image_index, modules in enumerate(per_image):
+        context = build_reasoning_context(modules)
+        biometrics.extend({**match, "image_index": image_index} for match in context["biometrics"] if isinstance(match, dict))
+        objects.extend(o for o in context["objects"] if o)
+        ocr.extend(context["ocr"])
+        for camera in context["cctv"]:
+            key = json.dumps(camera, sort_keys=True, default=str)
+            if key not in seen_cameras:
+                seen_cameras.add(key)
+                cctv.append(camera)
+
+        gps = modules.get("GPS", {})
+        if gps.get("lat") is not None and (best_location is None or gps.get("confidence", 0) > best_location[0]):
+            best_location = (gps.get("confidence", 0), {"lat": gps.get("lat"), "lng": gps.get("lng")})
+
+    return {
+        "biometrics": biometrics,
+        # Distinct labels in first-seen order; per-image counts stay in the image results
+        "objects": list(dict.fromkeys(objects)),
+        "ocr": ocr,
+        "location": best_location[1] if best_location else None,
+        "cctv": cctv
+    }
+
+def run_batch_pipeline(image_paths):
+    """
+    Analyses many stills of one incident. Each vision module receives the
+    whole list in a single batched call; CCTV runs once per distinct GPS
+    fix and reasoning once over the merged incident. With
+    BIOMETRICS_PERSON_CASCADE biometrics runs after object detection,
+    searching each image's person boxes for faces.
+    """
+    started = time.perf_counter()
+    image_paths = [os.path.abspath(p) for p in image_paths]
+    missing = [p for p in image_paths if not os.path.exists(p)]
+    if missing:
+        logger.error(f"Images not found: {missing}")
+        return {"error": "Image not found", "missing": missing}
+
+    modules_dir = config.BACKEND_DIR / "app" / "modules"
+
+    modules = {
+        "GPS": {
+            "script": modules_dir / "gps" / "model.py",
+            "args": [[p] for p in image_paths],
+            "kwargs": {"image_paths": image_paths}
+        },
+        "biometrics": {
+            "script": modules_dir / "biometrics" / "main_biometrics.py",
+            "args": [["--input", p] for p in image_paths],
+            "kwargs": {"image_paths": image_paths}
+        },
+        "object_detection": {
+            "script": modules_dir / "objects" / "main_objects.py",
+            "args": [[p] for p in image_paths],
+            "kwargs": {"image_paths": image_paths}
+        },
+        "ocr_environment": {
+            "script": modules_dir / "ocr" / "main_ocr.py",
+            "args": [[p] for p in image_paths],
+            "kwargs": {"image_paths": image_paths}
+        }
+    }
+
+    pipeline_id = str(uuid.uuid4())
+    timestamp = datetime.datetime.now().isoformat()
+    per_image = [{} for _ in image_paths]
+    module_ms = {}
+
+    def elapsed_ms():
+        return round((time.perf_counter() - started) * 1000, 1)
+
+    deferred = {"biometrics"} if config.BIOMETRICS_PERSON_CASCADE else set()
     with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
         future_to_module = {
-            executor.submit(run_module, config["script"], config["args"]): name 
-            for name, config in modules.items()
+            executor.submit(dispatch_batch, name, spec, len(image_paths)): name
+            for name, spec in modules.items() if name not in deferred
         }
-        
-        for future in concurrent.futures.as_completed(future_to_module):
-            module_name = future_to_module[future]
-            try:
-                data = future.result()
-                results[module_name] = data
-            except Exception as e:
-                logger.error(f"Module {module_name} generated an exception: {e}")
-                results[module_name] = {"status": "error", "message": str(e)}
-
-    # CCTV Retrieval (Dependent on GPS)
-    gps_data = results.get("GPS", {})
-    lat = gps_data.get("lat")
-    lng = gps_data.get("lng")
+        pending = set(future_to_module)
 
-    if lat is not None and lng is not None:
-        cctv_script = modules_dir / "cctv" / "main_cctv_retrieval.py"
-        # Ensure lat/lng are strings for command line arguments
-        cctv_args = ["--lat", str(lat), "--lng", str(lng)]
-        cctv_result = run_module(cctv_script, cctv_args)
-        results["cctv_retrieval"] = cctv_result
-    else:
-        logger.warning("Skipping CCTV retrieval due to missing GPS data")
-        results["cctv_retrieval"] = {"status": "skipped", "message": "Missing GPS data"}
+        while pending:
+            done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                module_name = future_to_module[future]
+                try:
+                    batch = future.result()
+                except Exception as e:
+                    logger.error(f"Module {module_name} generated an exception: {e}")
+                    batch = [{"status": "error", "message": str(e)}] * len(image_paths)
+                for modules_result, data in zip(per_image, batch):
+                    modules_result[module_name] = data
+                module_ms[module_name] = elapsed_ms()
 
+                if module_name == "object_detection" and "biometrics" in deferred:
+                    spec = _restrict_to_persons(modules["biometrics"], [person_boxes(data) for data in batch])
+                    biometrics_future = executor.submit(dispatch_batch, "biometrics", spec, len(image_paths))
+                    future_to_module[biometrics_future] = "biometrics"
+                    pending.add(biometrics_future)
+
+    # CCTV Retrieval, once per distinct GPS fix
+    cctv_by_location = {}
+    for modules_result in per_image:
+        gps_data = modules_result.get("GPS", {})
+        lat, lng = gps_data.get("lat"), gps_data.get("lng")
+        if lat is None or lng is None:
+            modules_result["cctv_retrieval"] = {"status": "skipped", "message": "Missing GPS data"}
+            continue
+        key = (float(lat), float(lng))
+        if key not in cctv_by_location:
+            cctv_by_location[key] = dispatch_module("cctv_retrieval", _cctv_spec(modules_dir, lat, lng))
+        modules_result["cctv_retrieval"] = cctv_by_location[key]
+    module_ms["cctv_retrieval"] = elapsed_ms()
+
+    context_data = merge_incident(per_image)
     try:
         from backend.app.modules.reasoning import main_reasoning
-        
-        biometrics_data = results.get("biometrics", {}).get("matches", [])
-        
-        obj_det_data = results.get("object_detection", {})
-        objects_list = []
-        if "detections" in obj_det_data:
-            objects_list = [
-                obj.get("label") or obj.get("class_name") or obj.get("label_en")
-                for obj in obj_det_data["detections"]
-            ]
-        
-        ocr_data = results.get("ocr_environment", {}).get("text", [])
-        
-        cctv_data = results.get("cctv_retrieval", {}).get("cameras", [])
-        
-        context_data = {
-            "biometrics": biometrics_data,
-            "objects": objects_list,
-            "ocr": ocr_data,
-            "location": {"lat": lat, "lng": lng} if lat else None,
-            "cctv": cctv_data
-        }
-        
-        logger.info("Running reasoning engine...")
+
+        logger.info("Running reasoning engine over merged incident...")
         reasoning_result = main_reasoning.analyze_incident(context_data)
-        results["reasoning"] = reasoning_result
-        
     except Exception as e:
         logger.error(f"Reasoning module failed: {e}")
-        results["reasoning"] = {"status": "error", "message": str(e)}
+        reasoning_result = {"status": "error", "message": str(e)}
+    module_ms["reasoning"] = elapsed_ms()
 
-    master_json = {
+    total_ms = elapsed_ms()
+    images_per_second = round(len(image_paths) / (total_ms / 1000), 2) if total_ms else None
+    logger.info(f"Batch {pipeline_id}: {len(image_paths)} images in {total_ms} ms ({images_per_second} images/sec)")
+
+    return {
         "pipeline_id": pipeline_id,
         "timestamp": timestamp,
-        "target_image": image_path,
-        "modules": results,
+        "images": [
+            {"target_image": path, "modules": modules_result}
+            for path, modules_result in zip(image_paths, per_image)
+        ],
+        "incident": {
+            "context": context_data,
+            "reasoning": reasoning_result
+        },
+        "timings": {
+            "images": len(image_paths),
+            "modules_ms": module_ms,
+            "total_ms": total_ms,
+            "images_per_second": images_per_second
+        },
         "system_status": "READY_FOR_REASONING",
         "language": "ar"
     }
-    
-    return master_json
+
+def run_video_pipeline(video_path, keyframe_dir=None):
+    """
+    Samples scene-change keyframes from a clip and analyses only those,
+    as one batch. Each image result carries its frame index and timestamp.
+    """
+    from backend.app.pipeline import video
+
+    video_path = os.path.abspath(video_path)
+    if not os.path.exists(video_path):
+        logger.error(f"Video not found: {video_path}")
+        return {"error": "Video not found"}
+
+    keyframe_dir = keyframe_dir or os.path.splitext(video_path)[0] + "_keyframes"
+    sampled = video.extract_keyframes(video_path, keyframe_dir)
+    keyframes = sampled["keyframes"]
+    if not keyframes:
+        return {"error": "No frames could be decoded", "video": video_path, "sampling": sampled["stats"]}
+
+    result = run_batch_pipeline([frame["path"] for frame in keyframes])
+    if "error" in result:
+        return result
+
+    for image, frame in zip(result["images"], keyframes):
+        image["frame_index"] = frame["frame_index"]
+        image["timestamp_s"] = frame["timestamp_s"]
+        image["change_score"] = frame["change_score"]
+    result["video"] = video_path
+    result["sampling"] = sampled["stats"]
+    return result
 
 def main():
     parser = argparse.ArgumentParser(description="Central Security Pipeline Orchestrator")
-    parser.add_argument("--image", required=True, help="Path to the target image")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--image", help="Path to the target image")
+    group.add_argument("--images", nargs="+", help="Several stills of one incident, analysed as a batch")
+    group.add_argument("--video", help="CCTV clip; only scene-change keyframes are analysed")
     args = parser.parse_args()
     
-    result = run_pipeline(args.image)
+    if args.video:
+        result = run_video_pipeline(args.video)
+    elif args.images:
+        result = run_batch_pipeline(args.images)
+    else:
+        result = run_pipeline(args.image)
 
     sys.stdout.reconfigure(encoding='utf-8')
     print(json.dumps(result, indent=2, ensure_ascii=False))
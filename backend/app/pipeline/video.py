@@ -0,0 +1,177 @@
+import os
+import time
+import logging
+from typing import Dict, List, Optional
+
+import cv2
+import numpy as np
+
+from backend.app.core import config
+
+logger = logging.getLogger(__name__)
+
+THUMB_SIZE = (64, 36)
+HIST_BINS = 32
+# A thumbnail pixel counts as changed when it moves by more than this (0..255);
+# area averaging into the thumbnail already absorbs sensor noise
+PIXEL_DELTA = 20
+# Window (width, height in thumbnail pixels) over which changed pixels are counted
+CHANGE_BLOCK = (8, 6)
+
+
+def frame_signature(frame: np.ndarray):
+    """Cheap content signature: a small grayscale thumbnail and its normalised histogram."""
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+    thumb = cv2.resize(gray, THUMB_SIZE, interpolation=cv2.INTER_AREA).astype(np.float32)
+    hist = np.histogram(thumb, bins=HIST_BINS, range=(0, 256))[0].astype(np.float32)
+    return thumb, hist / max(hist.sum(), 1.0)
+
+
+def change_score(previous, current) -> float:
+    """
+    0..1 distance between two frame signatures: the larger of the histogram
+    total-variation distance (global lighting/content shifts) and the
+    densest block of changed thumbnail pixels, i.e. the largest fraction of
+    any CHANGE_BLOCK window that moved by more than PIXEL_DELTA. A local
+    change such as a person entering a static scene scores by how much of
+    its neighbourhood it covers, not by its share of the whole frame.
+    """
+    prev_thumb, prev_hist = previous
+    thumb, hist = current
+    hist_distance = 0.5 * float(np.abs(hist - prev_hist).sum())
+    changed = (np.abs(thumb - prev_thumb) > PIXEL_DELTA).astype(np.float32)
+    block_distance = float(cv2.blur(changed, CHANGE_BLOCK, borderType=cv2.BORDER_CONSTANT).max())
+    return max(hist_distance, block_distance)
+
+
+class KeyframeSampler:
+    """
+    Adaptive scene-change gate over a decoded frame stream.
+
+    Frames are inspected every `stride` source frames. A frame becomes a
+    keyframe when it differs from the last keyframe by more than
+    `threshold`, or when `max_gap_s` has passed without one. While the
+    scene stays static the stride doubles (up to `max_stride`) so long
+    idle stretches cost few decodes; any change snaps it back.
+    """
+
+    def __init__(self, fps: float, sample_fps: float = 2.0, threshold: float = 0.08,
+                 max_gap_s: float = 30.0, max_stride_s: float = 4.0):
+        self.fps = fps if fps and fps > 0 else 25.0
+        self.base_stride = max(1, int(round(self.fps / sample_fps)))
+        self.max_stride = max(self.base_stride, int(round(self.fps * max_stride_s)))
+        self.threshold = threshold
+        self.max_gap_frames = int(self.fps * max_gap_s)
+        self.stride = self.base_stride
+        self._last_signature = None
+        self._last_keyframe = None
+
+    def consider(self, frame_index: int, frame: np.ndarray) -> Optional[float]:
+        """Returns the change score if `frame` is a keyframe, otherwise None. Updates the stride."""
+        signature = frame_signature(frame)
+        if self._last_signature is None:
+            score = 1.0
+        else:
+            score = change_score(self._last_signature, signature)
+
+        overdue = self._last_keyframe is not None and frame_index - self._last_keyframe >= self.max_gap_frames
+        if score > self.threshold or overdue:
+            self._last_signature = signature
+            self._last_keyframe = frame_index
+            self.stride = self.base_stride
+            return score
+
+        self.stride = min(self.stride * 2, self.max_stride)
+        return None
+
+
+def extract_keyframes(video_path: str, output_dir: str, sample_fps: float = None, threshold: float = None,
+                      max_gap_s: float = None, max_keyframes: int = None) -> Dict:
+    """
+    Decodes `video_path` and writes the keyframes chosen by KeyframeSampler
+    to `output_dir` as JPEGs. Skipped frames are only grabbed, not decoded
+    into images. Returns the keyframe list and sampling statistics.
+    """
+    sample_fps = sample_fps or config.VIDEO_SAMPLE_FPS
+    threshold = config.VIDEO_CHANGE_THRESHOLD if threshold is None else threshold
+    max_gap_s = max_gap_s or config.VIDEO_MAX_GAP_SECONDS
+    max_keyframes = max_keyframes or config.VIDEO_MAX_KEYFRAMES
+
+    capture = cv2.VideoCapture(video_path)
+    if not capture.isOpened():
+        raise ValueError(f"Could not open video: {video_path}")
+
+    os.makedirs(output_dir, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(video_path))[0]
+    fps = capture.get(cv2.CAP_PROP_FPS)
+    # Container frame count, only needed when sampling stops early (may be 0 or approximate)
+    container_frames = int(capture.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+    sampler = KeyframeSampler(fps, sample_fps=sample_fps, threshold=threshold, max_gap_s=max_gap_s)
+
+    keyframes = []
+    frame_index = -1
+    next_check = 0
+    inspected = 0
+    truncated = False
+    start = time.perf_counter()
+
+    try:
+        while True:
+            # grab() advances without the colour conversion retrieve() pays for
+            if not capture.grab():
+                break
+            frame_index += 1
+            if frame_index < next_check:
+                continue
+
+            ok, frame = capture.retrieve()
+            if not ok:
+                break
+            inspected += 1
+
+            score = sampler.consider(frame_index, frame)
+            next_check = frame_index + sampler.stride
+            if score is None:
+                continue
+
+            if len(keyframes) >= max_keyframes:
+                truncated = True
+                break
+
+            path = os.path.join(output_dir, f"{stem}_f{frame_index:07d}.jpg")
+            cv2.imwrite(path, frame)
+            keyframes.append({
+                "frame_index": frame_index,
+                "timestamp_s": round(frame_index / sampler.fps, 3),
+                "change_score": round(score, 4),
+                "path": path
+            })
+    finally:
+        capture.release()
+
+    frames_read = frame_index + 1
+    # After truncation the clip's length comes from the container; without it the stats cover only what was read
+    total_frames = max(frames_read, container_frames) if truncated else frames_read
+    elapsed = time.perf_counter() - start
+    if truncated:
+        logger.warning(f"Stopped sampling {video_path} at {max_keyframes} keyframes "
+                       f"({frames_read} of {container_frames or 'unknown'} frames read)")
+    logger.info(f"Sampled {len(keyframes)} keyframes from {frames_read} frames "
+                f"({inspected} inspected) in {elapsed:.1f}s")
+
+    return {
+        "keyframes": keyframes,
+        "stats": {
+            "fps": round(sampler.fps, 3),
+            "duration_s": round(total_frames / sampler.fps, 3),
+            "total_frames": total_frames,
+            "frames_read": frames_read,
+            "inspected_frames": inspected,
+            "keyframes": len(keyframes),
+            # Over the frames actually read, which is the whole clip unless truncated
+            "keyframe_ratio": round(len(keyframes) / frames_read, 5) if frames_read else 0.0,
+            "truncated": truncated,
+            "partial_stats": truncated and container_frames <= frames_read,
+            "sampling_ms": round(elapsed * 1000, 1)
+        }
+    }
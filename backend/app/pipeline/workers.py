@@ -0,0 +1,228 @@
+import importlib
+import json
+import logging
+import multiprocessing
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Each entry module exposes create_worker(), which loads its models once and
+# returns a dict of operation name -> callable producing the module's JSON dict.
+MODULE_ENTRYPOINTS = {
+    "GPS": "backend.app.modules.gps.model",
+    "biometrics": "backend.app.modules.biometrics.main_biometrics",
+    "object_detection": "backend.app.modules.objects.main_objects",
+    "ocr_environment": "backend.app.modules.ocr.main_ocr",
+    "cctv_retrieval": "backend.app.modules.cctv.main_cctv_retrieval",
+}
+
+POLL_INTERVAL_SECONDS = 0.5
+
+
+def _json_default(obj):
+    # numpy scalars/arrays expose item()/tolist(); everything else is stringified
+    if hasattr(obj, "tolist"):
+        return obj.tolist()
+    if hasattr(obj, "item"):
+        return obj.item()
+    return str(obj)
+
+
+def _worker_main(module_path, conn):
+    try:
+        handlers = importlib.import_module(module_path).create_worker()
+    except Exception as e:
+        conn.send(("ready", f"Failed to initialise {module_path}: {e}"))
+        conn.close()
+        # Exit so the parent restarts the worker (and retries the load) on next use
+        raise SystemExit(1)
+
+    conn.send(("ready", None))
+
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+
+        if message is None:
+            break
+
+        op, kwargs = message
+        try:
+            data = handlers[op](**kwargs)
+            conn.send(("ok", json.dumps(data, ensure_ascii=False, default=_json_default)))
+        except Exception as e:
+            conn.send(("error", f"{type(e).__name__}: {e}"))
+
+    conn.close()
+
+
+def _error(message):
+    return {"status": "error", "message": message, "data": None}
+
+
+class ModuleWorker:
+    """A single warm process serving one pipeline module over a pipe."""
+
+    def __init__(self, name, module_path, index, ctx):
+        self.name = name
+        self.module_path = module_path
+        self.index = index
+        self.ctx = ctx
+        self.process = None
+        self.conn = None
+        self.restarts = 0
+
+    def start(self):
+        parent_conn, child_conn = self.ctx.Pipe()
+        self.process = self.ctx.Process(
+            target=_worker_main,
+            args=(self.module_path, child_conn),
+            name=f"roya-{self.name}-{self.index}",
+        )
+        self.process.start()
+        child_conn.close()
+        self.conn = parent_conn
+
+    def stop(self, timeout=5.0):
+        if self.process is None:
+            return
+        try:
+            if self.process.is_alive():
+                self.conn.send(None)
+                self.process.join(timeout)
+        except (BrokenPipeError, OSError):
+            pass
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+        self.process = None
+
+    def restart(self, reason):
+        logger.warning(f"Restarting worker {self.process.name if self.process else self.name}: {reason}")
+        self.stop(timeout=0)
+        self.restarts += 1
+        self.start()
+
+    def is_alive(self):
+        return self.process is not None and self.process.is_alive()
+
+    def call(self, op, kwargs, timeout=None):
+        if not self.is_alive():
+            self.restart("process not running")
+
+        try:
+            self.conn.send((op, kwargs))
+        except (BrokenPipeError, OSError) as e:
+            self.restart(f"send failed: {e}")
+            return _error(f"Worker for {self.name} unavailable")
+
+        deadline = time.monotonic() + timeout if timeout else None
+
+        while True:
+            if self.conn.poll(POLL_INTERVAL_SECONDS):
+                try:
+                    status, payload = self.conn.recv()
+                except (EOFError, OSError):
+                    self.restart("connection closed")
+                    return _error(f"Worker for {self.name} crashed")
+
+                if status == "ready":
+                    if payload:
+                        logger.error(payload)
+                        self.process.join(POLL_INTERVAL_SECONDS)
+                        return _error(payload)
+                    continue
+
+                if status == "ok":
+                    return json.loads(payload)
+
+                logger.error(f"Module {self.name} raised: {payload}")
+                return _error(payload)
+
+            if not self.process.is_alive():
+                exitcode = self.process.exitcode
+                self.restart(f"exited with code {exitcode}")
+                return _error(f"Worker for {self.name} crashed with exit code {exitcode}")
+
+            if deadline is not None and time.monotonic() > deadline:
+                self.restart(f"timed out after {timeout}s")
+                return _error(f"Module {self.name} timed out")
+
+
+class WorkerPool:
+    """
+    Long-lived processes with each pipeline module's models kept warm.
+
+    `sizes` maps module name (see MODULE_ENTRYPOINTS) to the number of
+    workers for that module. Calls block until a worker of that module is
+    free; crashed or hung workers are restarted transparently.
+    """
+
+    def __init__(self, sizes, timeout=None):
+        self.timeout = timeout
+        self._ctx = multiprocessing.get_context("spawn")
+        self._workers = {}
+        self._idle = {}
+        self._lock = threading.Lock()
+        self._started = False
+
+        for name, count in sizes.items():
+            if name not in MODULE_ENTRYPOINTS:
+                raise ValueError(f"Unknown pipeline module: {name}")
+            if count <= 0:
+                continue
+            self._workers[name] = [
+                ModuleWorker(name, MODULE_ENTRYPOINTS[name], i, self._ctx)
+                for i in range(count)
+            ]
+            self._idle[name] = queue.Queue()
+
+    def start(self):
+        with self._lock:
+            if self._started:
+                return
+            for name, workers in self._workers.items():
+                for worker in workers:
+                    worker.start()
+                    self._idle[name].put(worker)
+                logger.info(f"Started {len(workers)} worker(s) for {name}")
+            self._started = True
+
+    def stop(self):
+        with self._lock:
+            if not self._started:
+                return
+            for name, workers in self._workers.items():
+                for worker in workers:
+                    worker.stop()
+                self._idle[name] = queue.Queue()
+            self._started = False
+
+    def serves(self, module_name):
+        return self._started and module_name in self._workers
+
+    def call(self, module_name, op="analyze", timeout=None, **kwargs):
+        """Runs `op` on a free worker; `timeout` overrides the pool default for this call."""
+        if not self.serves(module_name):
+            return _error(f"No workers configured for {module_name}")
+
+        worker = self._idle[module_name].get()
+        try:
+            return worker.call(op, kwargs, timeout or self.timeout)
+        finally:
+            self._idle[module_name].put(worker)
+
+    def stats(self):
+        return {
+            name: {
+                "workers": len(workers),
+                "alive": sum(1 for w in workers if w.is_alive()),
+                "restarts": sum(w.restarts for w in workers),
+            }
+            for name, workers in self._workers.items()
+        }
@@ -53,7 +53,7 @@ interface AnalysisResult {
       confidence: number;
     };
     object_detection: {
-      meta: { timestamp: string; model: string; output_image: string; imgsz: number };
+      meta: { timestamp: string; model: string; output_image: string | null; imgsz: number };
       summary: { total_objects: number; threat_level: string; threat_level_label?: string };
       detections: Array<{
         label: string;
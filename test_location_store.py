@@ -0,0 +1,85 @@
+import os
+
+import numpy as np
+
+from backend.app.modules.gps.location_store import LOCK_NAME, LocationStore
+
+DIM = 8
+
+
+def rows(*names):
+    return [{'filename': name, 'lat': float(i), 'lng': -float(i)} for i, name in enumerate(names)]
+
+
+def vectors(n, seed=0):
+    return np.random.default_rng(seed).normal(size=(n, DIM)).astype(np.float32)
+
+
+def live_filenames(store):
+    manifest = store.read_manifest()
+    names = []
+    for segment in manifest["segments"]:
+        _, metadata = store.read_segment(segment)
+        alive = store.alive_mask(segment, metadata, manifest["tombstones"])
+        names.extend(row['filename'] for row, keep in zip(metadata, alive) if keep)
+    return names
+
+
+def test_append_tombstone_compact_reload(tmp_path):
+    store = LocationStore(str(tmp_path))
+    store.replace_all(vectors(3), rows("a.jpg", "b.jpg", "c.jpg"))
+    store.append(vectors(2, seed=1), rows("d.jpg", "b.jpg"))
+    store.tombstone(["c.jpg"])
+    # Re-adding a removed image makes it visible again
+    store.append(vectors(1, seed=2), rows("c.jpg"))
+    store.tombstone(["a.jpg"])
+
+    assert sorted(live_filenames(store)) == ["b.jpg", "c.jpg", "d.jpg"]
+    assert len(store.read_manifest()["segments"]) == 3
+
+    assert store.compact()
+    manifest = store.read_manifest()
+    assert len(manifest["segments"]) == 1 and manifest["tombstones"] == {}
+    assert manifest["segments"][0]["rows"] == 3
+    assert sorted(f for f in os.listdir(tmp_path) if f.startswith("segment-")) == [manifest["segments"][0]["file"]]
+
+    reloaded = LocationStore(str(tmp_path))
+    assert sorted(live_filenames(reloaded)) == ["b.jpg", "c.jpg", "d.jpg"]
+    base_vectors, base_metadata = reloaded.read_segment(reloaded.read_manifest()["segments"][0])
+    # The newest copy of b.jpg survives
+    b = [row['filename'] for row in base_metadata].index("b.jpg")
+    expected = vectors(2, seed=1)[1]
+    np.testing.assert_allclose(base_vectors[b], expected / np.linalg.norm(expected), rtol=1e-5)
+
+
+def test_writes_during_compaction_are_kept(tmp_path):
+    store = LocationStore(str(tmp_path))
+    store.replace_all(vectors(3), rows("a.jpg", "b.jpg", "c.jpg"))
+    store.append(vectors(1, seed=1), rows("d.jpg"))
+    built = []
+
+    def on_segment(segment, segment_vectors):
+        # The index build runs without the writer lock, so writers are not blocked
+        assert not os.path.exists(tmp_path / LOCK_NAME)
+        store.append(vectors(1, seed=2), rows("e.jpg"))
+        store.tombstone(["b.jpg"])
+        built.append(len(segment_vectors))
+
+    assert store.compact(on_segment=on_segment)
+    assert built == [4]
+    manifest = store.read_manifest()
+    assert [s["rows"] for s in manifest["segments"]] == [4, 1]
+    assert sorted(live_filenames(LocationStore(str(tmp_path)))) == ["a.jpg", "c.jpg", "d.jpg", "e.jpg"]
+
+
+def test_compacting_to_empty_skips_index_build(tmp_path):
+    store = LocationStore(str(tmp_path))
+    store.replace_all(vectors(2), rows("a.jpg", "b.jpg"))
+    store.tombstone(["a.jpg", "b.jpg"])
+    built = []
+
+    assert store.compact(min_segments=1, on_segment=lambda segment, v: built.append(segment))
+    assert built == []
+    manifest = store.read_manifest()
+    assert [s["rows"] for s in manifest["segments"]] == [0] and manifest["tombstones"] == {}
+    assert live_filenames(store) == []
@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+
+# main_objects loads torch / ultralytics at import time
+pytest.importorskip("ultralytics")
+from backend.app.modules.objects.main_objects import merge_tile_detections, tile_windows
+
+
+def test_tile_windows_cover_the_frame():
+    windows = tile_windows(1920, 1080, 640, 0.2)
+    covered = np.zeros((1080, 1920), dtype=bool)
+    for x1, y1, x2, y2 in windows:
+        assert x2 - x1 <= 640 and y2 - y1 <= 640
+        covered[y1:y2, x1:x2] = True
+    assert covered.all()
+    # Last column and row aligned to the frame edge
+    assert max(x2 for _, _, x2, _ in windows) == 1920 and max(y2 for _, _, _, y2 in windows) == 1080
+    assert tile_windows(500, 300, 640, 0.2) == [(0, 0, 500, 300)]
+
+
+def test_merge_drops_duplicates_and_cut_copies():
+    boxes = np.array([
+        [100, 100, 200, 300],   # whole person
+        [102, 101, 201, 298],   # same person from the overlapping tile
+        [150, 100, 200, 300],   # right half of the person, cut by a tile border
+        [170, 100, 200, 200],   # cut box inside the person, different class: kept
+        [600, 100, 700, 200],   # unrelated object
+    ], dtype=np.float32)
+    scores = np.array([0.8, 0.9, 0.95, 0.7, 0.5])
+    classes = np.array([0, 0, 0, 1, 0])
+    cut = np.array([False, False, True, True, False])
+
+    keep = merge_tile_detections(boxes, scores, classes, cut)
+    # Uncut boxes first, so the higher-scoring cut fragment never wins
+    assert sorted(keep.tolist()) == [1, 3, 4]
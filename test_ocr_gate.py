@@ -0,0 +1,35 @@
+import cv2
+import numpy as np
+
+from backend.app.modules.ocr.main_ocr import _count_text_regions, text_presence
+
+
+def pairwise_text_regions(boxes):
+    # Every pair compared densely: the reference the banded search must agree with
+    x, y, w, h = boxes.T
+    cx, cy = x + w / 2, y + h / 2
+    similar = np.abs(h[:, None] - h[None, :]) <= 0.3 * np.maximum(h[:, None], h[None, :])
+    same_line = np.abs(cy[:, None] - cy[None, :]) <= 0.5 * h[:, None]
+    gap = np.abs(cx[:, None] - cx[None, :])
+    close = (gap > 0.3 * h[:, None]) & (gap <= 2.5 * h[:, None])
+    return int(np.count_nonzero((similar & same_line & close).any(axis=1)))
+
+
+def test_banded_count_matches_pairwise():
+    rng = np.random.default_rng(0)
+    for n in (2, 50, 700):
+        boxes = np.column_stack([
+            rng.uniform(0, 800, n), rng.uniform(0, 450, n), rng.uniform(2, 30, n), rng.uniform(6, 60, n)
+        ]).astype(np.float32)
+        assert _count_text_regions(boxes, stop_at=n + 1) == pairwise_text_regions(boxes)
+
+
+def test_gate_separates_text_from_plain_frames():
+    page = np.full((1080, 1920, 3), 255, dtype=np.uint8)
+    for row in range(10):
+        cv2.putText(page, "Exit 12 King Fahd Road", (40, 80 + row * 90), cv2.FONT_HERSHEY_SIMPLEX, 1.5, (0, 0, 0), 3)
+    plain = np.full((1080, 1920, 3), 90, dtype=np.uint8)
+    cv2.circle(plain, (900, 500), 200, (10, 10, 10), -1)
+
+    assert text_presence(page, min_edge_density=0.002, min_text_regions=6)["has_text"]
+    assert not text_presence(plain, min_edge_density=0.002, min_text_regions=6)["has_text"]
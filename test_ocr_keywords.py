@@ -0,0 +1,36 @@
+import json
+
+from backend.app.modules.ocr.keywords import DEFAULT_KEYWORDS, KeywordMatcher, load_keywords
+
+
+def substring_categories(keywords, text):
+    return {category for category, words in keywords.items() if any(word and word in text for word in words)}
+
+
+def test_matcher_agrees_with_substring_search():
+    keywords = {"A": ["he", "she", "hers"], "B": ["his", "ers"], "C": ["شارع", "x"]}
+    matcher = KeywordMatcher(keywords)
+    texts = ["ushers", "this", "hishe", "شارع الملك", "xylophone", "HE SHE", "", "h"]
+    for text in texts:
+        assert matcher.match(text) == substring_categories(keywords, text), text
+
+
+def test_tag_prefers_the_first_listed_category():
+    matcher = KeywordMatcher(DEFAULT_KEYWORDS)
+    assert matcher.tag("Police Street") == "LOCATION"
+    assert matcher.tag("National Bank") == "SENSITIVE"
+    assert matcher.tag("Coffee") == "COMMERCIAL"
+    # Case-sensitive like `in`
+    assert matcher.tag("national bank") == "COMMERCIAL"
+
+
+def test_load_keywords_falls_back_to_defaults(tmp_path):
+    custom = tmp_path / "keywords.json"
+    custom.write_text(json.dumps({"VEHICLE": ["Toyota"]}), encoding="utf-8")
+    broken = tmp_path / "broken.json"
+    broken.write_text(json.dumps({"VEHICLE": "Toyota"}), encoding="utf-8")
+
+    assert load_keywords(str(custom)) == {"VEHICLE": ["Toyota"]}
+    assert load_keywords(str(broken)) == DEFAULT_KEYWORDS
+    assert load_keywords(str(tmp_path / "missing.json")) == DEFAULT_KEYWORDS
+    assert load_keywords(None) == DEFAULT_KEYWORDS
@@ -0,0 +1,54 @@
+import pytest
+
+from backend.app.core.report_store import ReportStore, encode_cursor
+
+
+def report(n, priority):
+    return {
+        "report_id": f"r{n}",
+        "processed_at": f"2025-01-01T00:00:{n:02d}",
+        "modules": {"reasoning": {"classification": {"priority": priority}}}
+    }
+
+
+def pages(store, **kwargs):
+    seen, cursor = [], None
+    while True:
+        reports, cursor = store.query(cursor=cursor, **kwargs)
+        seen.append([r["report_id"] for r in reports])
+        if cursor is None:
+            return seen
+
+
+def test_keyset_pages_cover_every_report_once(tmp_path):
+    store = ReportStore(str(tmp_path / "reports.db"))
+    priorities = ["LOW", "CRITICAL", "HIGH", "LOW", "CRITICAL", "MEDIUM", "HIGH"]
+    for n, priority in enumerate(priorities):
+        store.add(report(n, priority))
+
+    assert pages(store, limit=3) == [["r0", "r1", "r2"], ["r3", "r4", "r5"], ["r6"]]
+    assert pages(store, limit=2, sort_by="priority") == [["r1", "r4"], ["r2", "r6"], ["r5", "r0"], ["r3"]]
+    assert pages(store, limit=7) == [[f"r{n}" for n in range(7)]]
+
+
+def test_cursor_survives_inserts_between_pages(tmp_path):
+    store = ReportStore(str(tmp_path / "reports.db"))
+    for n in range(4):
+        store.add(report(n, "HIGH"))
+    first, cursor = store.query(limit=2, sort_by="priority")
+    # A more urgent report arriving mid-listing lands before the cursor and is not repeated
+    store.add(report(4, "CRITICAL"))
+    store.add(report(5, "HIGH"))
+    rest, cursor = store.query(limit=10, sort_by="priority", cursor=cursor)
+    assert [r["report_id"] for r in first + rest] == ["r0", "r1", "r2", "r3", "r5"]
+    assert cursor is None
+
+
+def test_cursor_must_match_sort_order(tmp_path):
+    store = ReportStore(str(tmp_path / "reports.db"))
+    with pytest.raises(ValueError):
+        store.query(sort_by="priority", cursor=encode_cursor([5]))
+    with pytest.raises(ValueError):
+        store.query(cursor=encode_cursor([1, 5]))
+    with pytest.raises(ValueError):
+        store.query(cursor="not a cursor")
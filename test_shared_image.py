@@ -0,0 +1,31 @@
+import cv2
+import numpy as np
+from PIL import Image
+
+from backend.app.core.shared_image import SharedImage, load_rgb, open_shared_image
+
+
+def rotated_jpeg(path):
+    # A 100x200 portrait tagged "rotate 90 CW" (EXIF orientation 6), as phones save them
+    pixels = np.zeros((200, 100, 3), dtype=np.uint8)
+    pixels[:20] = (255, 0, 0)
+    image = Image.fromarray(pixels)
+    exif = image.getexif()
+    exif[0x0112] = 6
+    image.save(path, exif=exif)
+    return path
+
+
+def test_shared_decode_matches_opencv_orientation(tmp_path):
+    path = rotated_jpeg(str(tmp_path / "phone.jpg"))
+    bgr = cv2.imread(path)
+
+    shared = SharedImage.decode(path)
+    try:
+        assert shared.shape == bgr.shape == (100, 200, 3)
+        with open_shared_image(shared.descriptor(), bgr=True) as pixels:
+            assert np.array_equal(pixels, bgr)
+    finally:
+        shared.release()
+
+    assert np.array_equal(np.asarray(load_rgb(path))[..., ::-1], bgr)
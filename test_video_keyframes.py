@@ -0,0 +1,74 @@
+import cv2
+import numpy as np
+
+from backend.app.pipeline.video import KeyframeSampler, change_score, extract_keyframes, frame_signature
+
+FPS = 25.0
+SIZE = (1080, 1920)
+
+
+def static_scene(seed=0):
+    # Textured background: smooth gradient plus fixed-pattern detail
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:SIZE[0], 0:SIZE[1]]
+    base = 60 + 80 * (x / SIZE[1]) + 30 * (y / SIZE[0]) + rng.normal(0, 12, SIZE)
+    return np.repeat(np.clip(base, 0, 255)[..., None], 3, axis=2).astype(np.uint8)
+
+
+def with_sensor_noise(frame, rng):
+    return np.clip(frame.astype(np.int16) + rng.integers(-6, 7, frame.shape), 0, 255).astype(np.uint8)
+
+
+def with_person(frame, x, y, width, height, shade=20):
+    frame = frame.copy()
+    frame[y:y + height, x:x + width] = shade
+    return frame
+
+
+def test_small_object_scores_above_threshold():
+    scene = static_scene()
+    rng = np.random.default_rng(1)
+    empty = frame_signature(scene)
+
+    assert change_score(empty, frame_signature(with_sensor_noise(scene, rng))) < 0.08
+    assert change_score(empty, frame_signature(with_person(scene, 900, 500, 150, 400))) > 0.08
+    assert change_score(empty, frame_signature(with_person(scene, 1203, 611, 80, 200))) > 0.08
+
+
+def test_small_object_entering_static_scene_is_a_keyframe():
+    scene = static_scene()
+    rng = np.random.default_rng(2)
+    sampler = KeyframeSampler(FPS)
+    keyframes = []
+
+    # 40 s static scene; an 80x200 person stands in it from t=12 s to t=22 s
+    frame_index = 0
+    while frame_index < int(40 * FPS):
+        t = frame_index / FPS
+        frame = with_sensor_noise(scene, rng)
+        if 12 <= t < 22:
+            frame = with_person(frame, 1203, 611, 80, 200)
+        if sampler.consider(frame_index, frame) is not None:
+            keyframes.append(t)
+        frame_index += sampler.stride
+
+    assert keyframes[0] == 0
+    assert any(12 <= t < 22 for t in keyframes)
+    # Its departure is a scene change too, well before the 30 s max gap
+    assert any(22 <= t < 30 for t in keyframes)
+
+
+def test_truncated_clip_reports_whole_clip_length(tmp_path):
+    clip = str(tmp_path / "clip.avi")
+    writer = cv2.VideoWriter(clip, cv2.VideoWriter_fourcc(*"MJPG"), FPS, (320, 180))
+    for i in range(100):
+        # Every frame is a scene change
+        writer.write(np.full((180, 320, 3), (i * 37) % 256, dtype=np.uint8))
+    writer.release()
+
+    stats = extract_keyframes(clip, str(tmp_path / "keyframes"), sample_fps=FPS, max_keyframes=5)["stats"]
+
+    assert stats["truncated"] and stats["keyframes"] == 5
+    assert stats["frames_read"] < 100
+    assert stats["total_frames"] == 100 and stats["duration_s"] == 4.0
+    assert not stats["partial_stats"]
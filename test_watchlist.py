@@ -0,0 +1,67 @@
+import numpy as np
+
+from backend.app.modules.biometrics.face_index import ENCODING_DIM
+from backend.app.modules.biometrics.watchlist import Watchlist
+
+
+def gallery(n_identities, per_identity, seed=0):
+    # Identities spread apart, each with a few nearby images
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(0, 0.1, size=(n_identities, ENCODING_DIM))
+    encodings = np.repeat(centres, per_identity, axis=0) + rng.normal(0, 0.02, size=(n_identities * per_identity, ENCODING_DIM))
+    identities = [f"person_{i}" for i in range(n_identities) for _ in range(per_identity)]
+    names = [f"{identity}_{j}.jpg" for j, identity in enumerate(identities)]
+    watchlist = Watchlist(encodings, names, identities)
+    # Brute force scores the float32 rows the watchlist actually stores
+    return watchlist, watchlist.matrix.astype(np.float64)
+
+
+def brute_force(encodings, row_identity, queries, k):
+    # Every row scored: an identity's distance is the distance to its nearest row
+    distances = np.linalg.norm(encodings[None, :, :] - queries[:, None, :], axis=2)
+    per_identity = np.full((len(queries), row_identity.max() + 1), np.inf)
+    np.minimum.at(per_identity, (slice(None), row_identity), distances)
+    order = np.argsort(per_identity, axis=1, kind="stable")[:, :k]
+    return order, np.take_along_axis(per_identity, order, axis=1)
+
+
+def test_search_identities_matches_brute_force():
+    watchlist, encodings = gallery(40, 5)
+    rng = np.random.default_rng(1)
+    queries = encodings[rng.choice(len(encodings), 12)] + rng.normal(0, 0.02, size=(12, ENCODING_DIM))
+
+    for k in (1, 3):
+        # Small chunks exercise the multi-block bound passes
+        identities, distances, rows, rows_checked = watchlist.search_identities(queries, k=k, chunk_rows=7)
+        expected_ids, expected_dist = brute_force(encodings, watchlist.row_identity, queries, k)
+        assert np.array_equal(identities, expected_ids)
+        np.testing.assert_allclose(distances, expected_dist, rtol=1e-9)
+        assert np.all(watchlist.row_identity[rows] == identities)
+        if k == 1:
+            # Far identities are skipped on the centroid bound alone
+            assert rows_checked < len(queries) * len(encodings)
+
+
+def test_bounded_identities_keep_the_true_neighbours():
+    watchlist, encodings = gallery(30, 4, seed=2)
+    queries = np.random.default_rng(3).normal(0, 0.1, size=(8, ENCODING_DIM))
+    expected_ids, expected_dist = brute_force(encodings, watchlist.row_identity, queries, 2)
+
+    candidates = watchlist._bounded_identities(queries.astype(np.float32), 2, chunk_rows=64)
+    for q, candidate_ids in enumerate(candidates):
+        assert set(expected_ids[q]) <= set(candidate_ids.tolist())
+
+    # With a tolerance every identity within it, and the nearest one, must survive
+    tolerance = float(np.median(expected_dist[:, 0]))
+    candidates = watchlist._bounded_identities(queries.astype(np.float32), 2, chunk_rows=64, tolerance=tolerance)
+    per_row = np.linalg.norm(encodings[None] - queries[:, None], axis=2)
+    for q, candidate_ids in enumerate(candidates):
+        within = set(watchlist.row_identity[per_row[q] <= tolerance].tolist())
+        assert ({int(expected_ids[q, 0])} | within) <= set(candidate_ids.tolist())
+
+
+def test_fewer_identities_than_k():
+    watchlist, encodings = gallery(2, 3)
+    identities, distances, rows, _ = watchlist.search_identities(encodings[:1], k=4)
+    assert identities[0, 0] == 0 and list(identities[0, 2:]) == [-1, -1]
+    assert np.isinf(distances[0, 2:]).all() and list(rows[0, 2:]) == [-1, -1]